@@ -0,0 +1,104 @@
+#!/usr/bin/python
+"""
+Generates progress.db with a synthetic tree of items.
+
+Usage: python benchmarks/generate.py SHAPE SIZE [DIRECTORY]
+
+Shapes:
+
+    wide         100 projects with all other items directly under them
+    deep         chains of 1000 nested items
+    mostly_done  random tree where 9 of 10 items are done
+    history      random tree added during 3 years, half of it done
+"""
+
+import os
+import sys
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from progressio.progressio import (
+    get_store, _create_db_if_needed, DATE_FORMAT, BULK_BATCH_SIZE, ITEM_COLUMNS)
+
+INSERT_SQL = 'INSERT INTO item({}) VALUES(?, ?, ?, ?, ?, ?, ?)'.format(', '.join(ITEM_COLUMNS))
+
+SHAPES = ('wide', 'deep', 'mostly_done', 'history')
+
+WORDS = ('fix', 'write', 'review', 'parser', 'release', 'tests', 'docs',
+         'server', 'report', 'design', 'plan', 'budget', 'call', 'email')
+
+DEEP_CHAIN_LENGTH = 1000
+WIDE_PROJECTS = 100
+HISTORY_DAYS = 3 * 365
+
+
+def _parents(shape, size, rnd):
+    """
+    Yields parent pk for items 1 to `size`.
+    """
+    for pk in range(1, size + 1):
+        if shape == 'wide':
+            yield 0 if pk <= WIDE_PROJECTS else rnd.randint(1, WIDE_PROJECTS)
+        elif shape == 'deep':
+            yield 0 if pk % DEEP_CHAIN_LENGTH == 1 else pk - 1
+        else:
+            # new items go mostly to recent projects
+            yield 0 if pk < 10 or rnd.random() < 0.01 else rnd.randint(max(1, pk - 1000), pk - 1)
+
+
+def generate_records(shape, size, seed=0):
+    """
+    Yields (pk, title, added_at, is_done, done_at, parent_pk) of `size` items.
+    """
+    rnd = random.Random(seed)
+    now = datetime.now()
+    done_share = {'mostly_done': 0.9, 'history': 0.5}.get(shape, 0.2)
+    for pk, parent_pk in enumerate(_parents(shape, size, rnd), 1):
+        title = '{} {} {}'.format(rnd.choice(WORDS), rnd.choice(WORDS), pk)
+        if shape == 'history':
+            added = now - timedelta(days=HISTORY_DAYS * (1 - float(pk) / size), hours=rnd.random())
+        else:
+            added = now - timedelta(minutes=size - pk)
+        if rnd.random() < done_share:
+            done_at = min(now, added + timedelta(days=rnd.random() * 30)).strftime(DATE_FORMAT)
+            is_done = 'TRUE'
+        else:
+            done_at, is_done = None, 'FALSE'
+        yield pk, title, added.strftime(DATE_FORMAT), is_done, done_at, parent_pk
+
+
+def generate(shape, size, seed=0):
+    """
+    Creates progress.db in the current directory with `size` items of `shape`.
+    """
+    if shape not in SHAPES:
+        raise ValueError('unknown shape {}'.format(shape))
+    _create_db_if_needed()
+    store = get_store()
+    positions = {}
+    batch = []
+    with store.transaction():
+        for pk, title, added_at, is_done, done_at, parent_pk in generate_records(shape, size, seed):
+            position = positions.get(parent_pk, 0)
+            positions[parent_pk] = position + 1
+            batch.append((pk, title, added_at, is_done, done_at, parent_pk, position))
+            if len(batch) == BULK_BATCH_SIZE:
+                store.executemany(INSERT_SQL, batch)
+                batch = []
+        if batch:
+            store.executemany(INSERT_SQL, batch)
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in SHAPES or not sys.argv[2].isdigit():
+        sys.stderr.write(__doc__)
+        exit(1)
+    if len(sys.argv) > 3:
+        os.chdir(sys.argv[3])
+    generate(sys.argv[1], int(sys.argv[2]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/python
+"""
+Times functions and commands of progressio on generated trees.
+
+Usage: python benchmarks/run.py [--sizes 10000,100000] [--shapes wide,deep]
+                                [--only NAME,...] [--save] [--tolerance 1.5]
+
+Each measurement runs in a new process on a fresh copy of the generated
+database, its time and peak memory (maximal resident set size of the
+process) are reported together with time per item of the database.
+
+Results are compared with benchmarks/baseline.json, the exit status is 1
+if something became slower than `tolerance` times its baseline
+(and by more than MIN_DIFFERENCE). The baseline depends on the machine,
+save it again before comparing changes on another one.
+--save replaces the baseline with the results of this run.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+# `p` imports the module, so it starts from compiled bytecode
+SCRIPT = os.path.join(ROOT_DIR, 'progressio', 'p')
+MODULE = os.path.join(ROOT_DIR, 'progressio', 'progressio.py')
+BASELINE_FILE_NAME = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+# differences smaller than this are noise and are never regressions
+MIN_DIFFERENCE = 0.005
+
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from generate import SHAPES
+
+# name: statement run with the names of the progressio module,
+# the connection is opened before it is timed
+FUNCTIONS = [
+    ('count_items', "count_items()"),
+    ('count_done_between', "count_done_between()"),
+    ('load_items', "load_items(is_done=True)"),
+    ('iter_items', "for _ in iter_items(True, read_only=True): pass"),
+    ('show_items', "show_items()"),
+    ('show_items_subtree', "show_items(root_pk=1)"),
+    ('search_items', "for _ in search_items('parser review', read_only=True): pass"),
+    ('subtree_progress', "subtree_progress()"),
+    ('count_by_period', "count_by_period(by='week')"),
+    ('export_items', "export_items(open(os.devnull, 'w'))"),
+    ('check_items', "check_items()"),
+    ('add', "add('benchmark item', parent_pk=1)"),
+    ('move', "move(['2-101'], 0)"),
+    ('done', "done(['2-101'])"),
+    ('done_recursive', "done(['1'], recursive=True)"),
+    ('delete', "delete(['2-101'], confirmed=True)"),
+]
+
+# name: arguments of `p`
+COMMANDS = [
+    ('p', []),
+    ('p tree --progress', ['tree', '--progress']),
+    ('p count', ['count']),
+    ('p count --all', ['count', '--all', '.']),
+    ('p log', ['log', '-d']),
+    ('p log --all', ['log', '-d', '--all', '.']),
+    ('p show', ['show', '1']),
+    ('p search', ['search', 'parser']),
+    ('p stats', ['stats', '--by', 'week']),
+    ('p export', ['export', '-o', 'export.jsonl']),
+    ('p export todotxt', ['export', '-f', 'todotxt', '-o', 'export.txt']),
+    ('p fsck', ['fsck']),
+    ('p add', ['add', '-t', 'benchmark item']),
+    ('p edit', ['edit', '1', '-t', 'renamed item']),
+    ('p done', ['done', '2-101']),
+    ('p active', ['active', '2-101']),
+    ('p move', ['move', '2-101', '-p', '0']),
+    ('p delete', ['delete', '-y', '2-101']),
+    ('p import', ['import', 'import.txt']),
+    ('p help', ['help']),
+    ('p version', ['version']),
+]
+# lines of the todo.txt file imported by `p import`, every tenth is a project
+IMPORT_LINES = 1000
+
+FUNCTION_SCRIPT = """
+import os
+import sys
+import time
+sys.path.insert(0, {root!r})
+from progressio import progressio
+progressio.get_store()
+stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+start = time.time()
+exec {statement!r} in vars(progressio)
+stdout.write(repr(time.time() - start))
+"""
+
+
+def _wait(args):
+    """
+    Runs `args` in the current directory.
+
+    :returns: (output, seconds from start to exit, peak memory in KiB).
+    """
+    start = time.time()
+    p = subprocess.Popen(args, stdout=subprocess.PIPE, stdin=open(os.devnull))
+    output = p.stdout.read()
+    status, rusage = os.wait4(p.pid, 0)[1:]
+    seconds = time.time() - start
+    if status:
+        raise RuntimeError('{} failed with status {}'.format(' '.join(args), status))
+    return output, seconds, rusage.ru_maxrss
+
+
+def measure_function(statement):
+    """
+    :returns: (seconds, peak memory in KiB) of `statement`.
+    """
+    output, _, maxrss = _wait([
+        sys.executable, '-c', FUNCTION_SCRIPT.format(root=ROOT_DIR, statement=statement)])
+    return float(output), maxrss
+
+
+def measure_command(args):
+    """
+    :returns: (seconds, peak memory in KiB) of `p args`.
+    """
+    return _wait([sys.executable, SCRIPT] + args)[1:]
+
+
+def run(shapes, sizes, only=None):
+    """
+    :returns: list of results {name, shape, size, seconds, maxrss}.
+    """
+    import py_compile
+    # as installation does, bytecode is not written with PYTHONDONTWRITEBYTECODE
+    py_compile.compile(MODULE)
+    results = []
+    directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        for shape in shapes:
+            for size in sizes:
+                source = os.path.join(directory, 'source')
+                os.mkdir(source)
+                os.chdir(source)
+                start = time.time()
+                # in a new process, the connection of this one would be reused
+                subprocess.check_call([
+                    sys.executable, os.path.join(BENCHMARKS_DIR, 'generate.py'), shape, str(size)])
+                sys.stderr.write('generated {} {} in {:.1f} s\n'.format(
+                    shape, size, time.time() - start))
+                with open('import.txt', 'w') as f:
+                    for i in range(IMPORT_LINES):
+                        f.write('{}imported item {}\n'.format('    ' if i % 10 else '', i))
+                benchmarks = [(name, measure_function, statement) for name, statement in FUNCTIONS]
+                benchmarks += [(name, measure_command, args) for name, args in COMMANDS]
+                for name, measure, argument in benchmarks:
+                    if only and name not in only:
+                        continue
+                    work = os.path.join(directory, 'work')
+                    shutil.copytree(source, work)
+                    os.chdir(work)
+                    seconds, maxrss = measure(argument)
+                    os.chdir(directory)
+                    shutil.rmtree(work)
+                    results.append({'name': name, 'shape': shape, 'size': size,
+                                    'seconds': seconds, 'maxrss': maxrss})
+                os.chdir(directory)
+                shutil.rmtree(source)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+    return results
+
+
+def _key(result):
+    return '{name} {shape} {size}'.format(**result)
+
+
+def report(results, baseline, tolerance):
+    """
+    Prints `results` compared with `baseline`.
+
+    :returns: number of results slower than `tolerance` times their baseline.
+    """
+    regressions = 0
+    print '{:<20} {:<12} {:>8} {:>10} {:>10} {:>8} {:>8}'.format(
+        'name', 'shape', 'size', 'ms', 'us/item', 'MiB', 'baseline')
+    for result in results:
+        ratio = ''
+        previous = baseline.get(_key(result))
+        if previous:
+            value = result['seconds'] / previous['seconds']
+            ratio = '{:.2f}x'.format(value)
+            if value > tolerance and result['seconds'] - previous['seconds'] > MIN_DIFFERENCE:
+                ratio += ' !'
+                regressions += 1
+        print '{:<20} {:<12} {:>8} {:>10.1f} {:>10.2f} {:>8.1f} {:>8}'.format(
+            result['name'], result['shape'], result['size'],
+            result['seconds'] * 1000, result['seconds'] * 1e6 / result['size'],
+            result['maxrss'] / 1024.0, ratio)
+    return regressions
+
+
+def main():
+    parser = OptionParser(usage=__doc__.strip())
+    parser.add_option('--sizes', dest='sizes', default='10000')
+    parser.add_option('--shapes', dest='shapes', default=','.join(SHAPES))
+    parser.add_option('--only', dest='only')
+    parser.add_option('--save', dest='save', default=False, action='store_true')
+    parser.add_option('--tolerance', dest='tolerance', type='float', default=1.5)
+    (opts, args) = parser.parse_args()
+    shapes = opts.shapes.split(',')
+    for shape in shapes:
+        if shape not in SHAPES:
+            parser.error('unknown shape {}'.format(shape))
+    sizes = [int(size) for size in opts.sizes.split(',')]
+    only = opts.only and opts.only.split(',')
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE_NAME):
+        with open(BASELINE_FILE_NAME) as f:
+            baseline = json.load(f)
+    results = run(shapes, sizes, only)
+    regressions = report(results, baseline, opts.tolerance)
+    if opts.save:
+        baseline.update((_key(result), result) for result in results)
+        with open(BASELINE_FILE_NAME, 'w') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True, separators=(',', ': '))
+            f.write('\n')
+        return
+    if regressions:
+        sys.stderr.write('{} benchmarks are slower than {} times the baseline\n'.format(
+            regressions, opts.tolerance))
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
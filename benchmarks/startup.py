@@ -0,0 +1,104 @@
+#!/usr/bin/python
+"""
+Measures time from start to exit of `p help`, `p version` and `p`
+and shows which heavy modules each of them imports.
+
+Usage: python benchmarks/startup.py [RUNS]
+
+The exit status is 1 if a command takes longer than STARTUP_BUDGET
+milliseconds more than the interpreter started with `python -c pass`.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+PACKAGE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'progressio'))
+# `p` imports the module, so it starts from compiled bytecode
+SCRIPT = os.path.join(PACKAGE_DIR, 'p')
+MODULE = os.path.join(PACKAGE_DIR, 'progressio.py')
+
+# milliseconds a command may take over the start of the interpreter,
+# compiling the module instead of loading its bytecode takes longer
+STARTUP_BUDGET = 15
+
+COMMANDS = [['help'], ['version'], []]
+
+# modules that a command should import only if it needs them,
+# re is not listed because site imports it on start of the interpreter
+HEAVY_MODULES = ['sqlite3', 'datetime', 'optparse', 'json', 'socket']
+
+# runs main() of the script and prints names of imported modules
+MODULES_SCRIPT = """
+import os
+import sys
+sys.argv = ['p'] + sys.argv[1:]
+sys.path.insert(0, %r)
+import progressio
+stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+progressio.main()
+stdout.write(' '.join(sys.modules))
+""" % PACKAGE_DIR
+
+
+def run_time(args, runs):
+    """
+    :returns: median time in ms of `runs` runs of `p args`,
+    of `python -c pass` if `args` is None.
+    """
+    command = [sys.executable, '-c', 'pass'] if args is None else [sys.executable, SCRIPT] + args
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(runs):
+            start = time.time()
+            subprocess.check_call(command, stdout=devnull)
+            times.append((time.time() - start) * 1000)
+    times.sort()
+    return times[len(times) // 2]
+
+
+def heavy_modules(args):
+    """
+    :returns: HEAVY_MODULES imported by `p args`.
+    """
+    output = subprocess.check_output([sys.executable, '-c', MODULES_SCRIPT] + args)
+    loaded = set(output.split())
+    return [m for m in HEAVY_MODULES if m in loaded]
+
+
+def main():
+    import py_compile
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    # as installation does, bytecode is not written with PYTHONDONTWRITEBYTECODE
+    py_compile.compile(MODULE)
+    over_budget = 0
+    directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        create = subprocess.Popen(
+            [sys.executable, SCRIPT, 'add', '-t', 'item'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        create.communicate('y\n')
+        interpreter = run_time(None, runs)
+        print 'python -c pass {:6.1f} ms'.format(interpreter)
+        for args in COMMANDS:
+            command_time = run_time(args, runs)
+            mark = ''
+            if command_time - interpreter > STARTUP_BUDGET:
+                mark = '  over budget of {} ms !'.format(STARTUP_BUDGET)
+                over_budget += 1
+            print 'p {:<8} {:6.1f} ms  imports: {}{}'.format(
+                ' '.join(args), command_time, ', '.join(heavy_modules(args)) or '-', mark)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,13 +9,18 @@ Each item may have one parent and several children nodes.
 
 import os
 import sys
-import time
-import re
-import sqlite3
-from datetime import datetime
+from collections import namedtuple
+from contextlib import contextmanager
 
+# sqlite3, re, time and datetime are imported by the functions that use them,
+# so commands like help and version start without loading them
 
-DATE_FORMAT = '%a %b %d %H:%M:%S %Y %Z'
+
+# local time, sorts in the same order as the time itself
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+DAY_FORMAT = '%Y-%m-%d'
+# format used by version 0.3, its first 24 characters do not depend on time zone
+OLD_DATE_FORMAT = '%a %b %d %H:%M:%S %Y'
 
 
 __version__ = '0.3.0'
@@ -23,6 +28,158 @@ __author__ = "Artem Dudarev"
 __url__ = 'https://github.com/dudarev/progressio'
 
 PROGRESS_DB_FILE_NAME = 'progress.db'
+# extension of files kept by JournalProgressStore, see open_progress_store()
+JOURNAL_EXTENSION = '.journal'
+# lines of the journal after which it is compacted into its snapshot
+JOURNAL_COMPACT_EVENTS = 10000
+# Unix socket of the server started with `p serve`
+SOCKET_FILE_NAME = 'progress.sock'
+# commands whose output depends only on the arguments and items,
+# the server keeps their output until the database changes
+CACHED_COMMANDS = ('log', 'search', 'show', 'tree')
+# bytes of output kept by the server, it forgets all of it when they are
+# exceeded; larger outputs of one command are not kept at all
+SERVER_CACHE_SIZE = 16 * 1024 * 1024
+SERVER_CACHE_OUTPUT_SIZE = 1024 * 1024
+# rendered tree of items to do of the database with this base name,
+# only the last shown view is kept
+RENDER_CACHE_FILE_NAME = '{}.tree.cache'
+
+# environment variable that turns on --profile, its value may be
+# a file name for cProfile statistics
+PROFILE_ENVIRONMENT_VARIABLE = 'PROGRESSIO_PROFILE'
+# number of the slowest statements shown by --profile
+PROFILE_STATEMENTS = 10
+
+# number of compiled statements kept by the sqlite3 module per connection
+STATEMENT_CACHE_SIZE = 100
+
+# seconds to wait for a lock held by another process before an error,
+# may be changed with the environment variable
+BUSY_TIMEOUT = 10.0
+BUSY_TIMEOUT_ENVIRONMENT_VARIABLE = 'PROGRESSIO_BUSY_TIMEOUT'
+# attempts to start a transaction when the database stays locked longer
+# than the timeout, with a delay doubled after each one
+TRANSACTION_ATTEMPTS = 3
+TRANSACTION_RETRY_DELAY = 0.1
+
+ITEM_TABLE_SQL = (
+    "CREATE TABLE {table}(" +
+    "pk INTEGER PRIMARY KEY, title, added_at, is_done DEFAULT 'FALSE', done_at, " +
+    "parent_pk INTEGER, position INTEGER)")
+ITEM_PARENT_INDEX_SQL = "CREATE INDEX item_parent ON item(parent_pk, position)"
+ITEM_DONE_AT_INDEX_SQL = "CREATE INDEX item_done_at ON item(done_at)"
+ITEM_IS_DONE_INDEX_SQL = "CREATE INDEX item_is_done ON item(is_done)"
+ITEM_ADDED_AT_INDEX_SQL = "CREATE INDEX item_added_at ON item(added_at)"
+
+# version of the schema created by this version of the program,
+# older databases are brought to it by MIGRATIONS
+SCHEMA_VERSION = 7
+
+# settings of every connection, cache_size is in KiB when negative
+CONNECTION_PRAGMAS = [
+    # with WAL it is durable except for the last commits on power loss
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8192",
+    "PRAGMA temp_store=MEMORY",
+]
+# full-text index of titles, it is kept in sync with table item by triggers
+SEARCH_INDEX_SQL = [
+    "CREATE VIRTUAL TABLE item_fts USING fts5(title, content='item', content_rowid='pk')",
+    "CREATE TRIGGER item_fts_insert AFTER INSERT ON item BEGIN " +
+    "INSERT INTO item_fts(rowid, title) VALUES (new.pk, new.title); END",
+    "CREATE TRIGGER item_fts_delete AFTER DELETE ON item BEGIN " +
+    "INSERT INTO item_fts(item_fts, rowid, title) VALUES ('delete', old.pk, old.title); END",
+    "CREATE TRIGGER item_fts_update AFTER UPDATE OF title ON item BEGIN " +
+    "INSERT INTO item_fts(item_fts, rowid, title) VALUES ('delete', old.pk, old.title); " +
+    "INSERT INTO item_fts(rowid, title) VALUES (new.pk, new.title); END",
+    "INSERT INTO item_fts(item_fts) VALUES ('rebuild')",
+]
+# change of item_per_day for {row} (old or new) item in a trigger,
+# the row of the day is created if it does not exist
+_PER_DAY_CHANGE_SQL = (
+    "INSERT OR IGNORE INTO item_per_day(day) SELECT substr({row}.{column}, 1, 10) WHERE {condition}; " +
+    "UPDATE item_per_day SET {field}={field}{sign}1 " +
+    "WHERE day=substr({row}.{column}, 1, 10) AND {condition}; ")
+
+
+def _per_day_change_sql(row, sign):
+    """
+    :returns: statements of a trigger that add (`sign` '+') or subtract
+    (`sign` '-') `row` item to counts of items added and done per day.
+    """
+    return (
+        _PER_DAY_CHANGE_SQL.format(
+            row=row, sign=sign, column='added_at', field='added',
+            condition='{}.added_at IS NOT NULL'.format(row)) +
+        _PER_DAY_CHANGE_SQL.format(
+            row=row, sign=sign, column='done_at', field='done',
+            condition="{0}.is_done='TRUE' AND {0}.done_at IS NOT NULL".format(row)))
+
+
+# numbers of items (without root) in `counters` and of items added and done
+# in each day in `item_per_day`, kept by triggers in the same transaction
+# as the change of items
+COUNTERS_SQL = [
+    "CREATE TABLE counters(name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    "CREATE TABLE item_per_day(day TEXT PRIMARY KEY, " +
+    "added INTEGER NOT NULL DEFAULT 0, done INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID",
+    "CREATE TRIGGER item_counters_insert AFTER INSERT ON item WHEN new.pk<>0 BEGIN " +
+    "UPDATE counters SET value=value+1 WHERE name='total'; " +
+    "UPDATE counters SET value=value+1 WHERE name='done' AND new.is_done='TRUE'; " +
+    _per_day_change_sql('new', '+') + "END",
+    "CREATE TRIGGER item_counters_delete AFTER DELETE ON item WHEN old.pk<>0 BEGIN " +
+    "UPDATE counters SET value=value-1 WHERE name='total'; " +
+    "UPDATE counters SET value=value-1 WHERE name='done' AND old.is_done='TRUE'; " +
+    _per_day_change_sql('old', '-') + "END",
+    "CREATE TRIGGER item_counters_update AFTER UPDATE OF added_at, is_done, done_at ON item " +
+    "WHEN old.pk<>0 BEGIN " +
+    "UPDATE counters SET value=value+(new.is_done='TRUE')-(old.is_done='TRUE') WHERE name='done'; " +
+    _per_day_change_sql('old', '-') + _per_day_change_sql('new', '+') + "END",
+]
+REBUILD_COUNTERS_SQL = [
+    "DELETE FROM counters WHERE name IN ('total', 'done')",
+    "INSERT INTO counters(name, value) " +
+    "SELECT 'total', COUNT(*) FROM item WHERE pk<>0 UNION ALL " +
+    "SELECT 'done', COUNT(*) FROM item WHERE pk<>0 AND is_done='TRUE'",
+    "DELETE FROM item_per_day",
+    "INSERT INTO item_per_day(day, added) SELECT substr(added_at, 1, 10), COUNT(*) FROM item " +
+    "WHERE pk<>0 AND added_at IS NOT NULL GROUP BY 1",
+    "INSERT INTO item_per_day(day, done) SELECT substr(done_at, 1, 10), COUNT(*) FROM item " +
+    "WHERE pk<>0 AND is_done='TRUE' AND done_at IS NOT NULL GROUP BY 1 " +
+    "ON CONFLICT(day) DO UPDATE SET done=excluded.done",
+]
+# counter 'revision' is changed by every change of items, unlike PRAGMA data_version
+# it is kept in the database, so other processes can compare it
+REVISION_SQL = [
+    "CREATE TRIGGER item_revision_insert AFTER INSERT ON item BEGIN " +
+    "UPDATE counters SET value=value+1 WHERE name='revision'; END",
+    "CREATE TRIGGER item_revision_delete AFTER DELETE ON item BEGIN " +
+    "UPDATE counters SET value=value+1 WHERE name='revision'; END",
+    "CREATE TRIGGER item_revision_update AFTER UPDATE ON item BEGIN " +
+    "UPDATE counters SET value=value+1 WHERE name='revision'; END",
+]
+# prefix of a query with table `subtree` of items that match the anchor
+# condition and all their descendants, UNION makes it safe for cycles
+SUBTREE_SQL = (
+    "WITH RECURSIVE subtree(pk) AS (" +
+    "SELECT pk FROM item WHERE {anchor} " +
+    "UNION SELECT item.pk FROM item JOIN subtree ON item.parent_pk=subtree.pk) ")
+# prefix of a query with table `ancestors` of the item bound to the
+# parameter: its parent, the parent of the parent and so on up to root
+ANCESTORS_SQL = (
+    "WITH RECURSIVE ancestors(pk) AS (" +
+    "SELECT parent_pk FROM item WHERE pk=? " +
+    "UNION SELECT item.parent_pk FROM item JOIN ancestors USING(pk)) ")
+# number of rows passed to one executemany() call by bulk commands
+BULK_BATCH_SIZE = 1000
+# position after the last child of the parent bound to the parameter
+NEXT_POSITION_SQL = "(SELECT COALESCE(MAX(position) + 1, 0) FROM item WHERE parent_pk=?)"
+
+
+# columns of table item in the order of arguments of Item
+ITEM_COLUMNS = ('pk', 'title', 'added_at', 'is_done', 'done_at', 'parent_pk', 'position')
+ITEM_COLUMNS_SQL = ', '.join('item.' + column for column in ITEM_COLUMNS)
 
 
 class Item(object):
@@ -30,23 +187,31 @@ class Item(object):
     The following fields are stored in the database:
 
     pk (id)     - int
-    children    - str - a list of children ids, order is important
     title       - str - title
-    added_at    - datetime
+    added_at    - str - local time in DATE_FORMAT
     is_done     - boolean
-    done_at     - datetime
+    done_at     - str - local time in DATE_FORMAT
+    parent_pk   - int - pk of the parent item, root items have parent 0
+    position    - int - order of the item among children of its parent
+
+    `children` is a list of children pks ordered by position.
+    If it is not given it is read on first access from `store`,
+    the database of the process if the item has no store.
     """
 
-    def __init__(self, pk, children=None, title=None, added_at=None, is_done=False, done_at=None):
+    __slots__ = ITEM_COLUMNS + ('_children', '_store')
+
+    def __init__(self, pk, title=None, added_at=None, is_done=False, done_at=None,
+                 parent_pk=None, position=None, children=None, store=None):
         self.pk = int(pk)
-        if children is not None:
-            self.children = map(int, filter(None, children.split(',')))
-        else:
-            self.children = []
         self.title = title
         self.added_at = added_at
         self.is_done = is_done
         self.done_at = done_at
+        self.parent_pk = parent_pk
+        self.position = position
+        self._children = children
+        self._store = store
 
     def __str__(self):
         return self.__unicode__()
@@ -60,54 +225,641 @@ class Item(object):
     def __cmp__(self, other):
         return cmp(int(self.pk), int(other.pk))
 
+    @property
+    def children(self):
+        if self._children is None:
+            self._children = get_children_pks(self.pk, self._store)
+        return self._children
+
+    @children.setter
+    def children(self, children):
+        self._children = children
+
     @property
     def children_str(self):
-        return ','.join(set(map(str, self.children)))
+        # keeps order of children, duplicates are dropped
+        seen = set()
+        return ','.join(
+            str(pk) for pk in self.children if not (pk in seen or seen.add(pk)))
+
+
+class ItemRow(namedtuple('ItemRow', ITEM_COLUMNS)):
+    """
+    Read-only item that is a plain tuple of ITEM_COLUMNS.
+
+    It is cheaper to build and to keep than Item and is used by
+    commands that only print or count many items. It has no children.
+    """
+
+    __slots__ = ()
+
+    def __str__(self):
+        return '{} - {}'.format(self.pk, self.title)
+
+
+def _file_id(file_name):
+    """
+    :returns: (device, inode) of `file_name` or None if it does not exist.
+    """
+    try:
+        st = os.stat(file_name)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+class Store(object):
+    """
+    Owns the single database connection used by a process.
+
+    All statements are executed with bound parameters, so the sqlite3
+    module reuses compiled statements from its cache instead of parsing
+    the SQL again on every call.
+
+    Transactions are managed explicitly with `transaction()`,
+    one per command. They take the write lock when they start, so
+    statements of concurrent commands are never interleaved.
+    """
+
+    def __init__(self, file_name=PROGRESS_DB_FILE_NAME, timeout=None):
+        import sqlite3
+        if timeout is None:
+            timeout = float(os.environ.get(BUSY_TIMEOUT_ENVIRONMENT_VARIABLE, BUSY_TIMEOUT))
+        self.file_name = file_name
+        self.con = sqlite3.connect(
+            file_name,
+            timeout=timeout,
+            isolation_level=None,
+            cached_statements=STATEMENT_CACHE_SIZE)
+        self.file_id = _file_id(file_name)
+        self._transaction_depth = 0
+        for pragma in CONNECTION_PRAGMAS:
+            self.con.execute(pragma)
+
+    def is_stale(self):
+        """
+        :returns: True if the db file was removed or replaced after connecting.
+        """
+        return _file_id(self.file_name) != self.file_id
+
+    def execute(self, query, params=()):
+        if _profiler is not None:
+            return _profiler.execute(self.con, query, params)
+        return self.con.execute(query, params)
+
+    def executemany(self, query, seq_of_params):
+        if _profiler is not None:
+            return _profiler.executemany(self.con, query, seq_of_params)
+        return self.con.executemany(query, seq_of_params)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the enclosed statements in one transaction.
+        Nested calls join the outer transaction.
+        """
+        if self._transaction_depth:
+            self._transaction_depth += 1
+            try:
+                yield self
+            finally:
+                self._transaction_depth -= 1
+            return
+        self._begin()
+        self._transaction_depth = 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth = 0
+            self.con.execute('ROLLBACK')
+            raise
+        self._transaction_depth = 0
+        self.con.execute('COMMIT')
+
+    def _begin(self):
+        """
+        Starts a transaction that holds the write lock until it ends.
+
+        Waiting for the lock is limited by the busy timeout of the
+        connection, after it the attempt is repeated TRANSACTION_ATTEMPTS times.
+        """
+        import sqlite3
+        import time
+        delay = TRANSACTION_RETRY_DELAY
+        for attempt in range(TRANSACTION_ATTEMPTS):
+            try:
+                self.con.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError, e:
+                if 'locked' not in str(e) or attempt + 1 == TRANSACTION_ATTEMPTS:
+                    raise
+            time.sleep(delay)
+            delay *= 2
+
+    def close(self):
+        self.con.close()
+
+
+class _ProfiledCursor(object):
+    """
+    Cursor that adds time and number of fetched rows to its statement.
+    """
+
+    def __init__(self, cur, stats, clock):
+        self.cur = cur
+        self.stats = stats
+        self.clock = clock
+
+    def _fetch(self, method, *args):
+        start = self.clock()
+        result = method(*args)
+        self.stats[1] += self.clock() - start
+        return result
+
+    def fetchone(self):
+        row = self._fetch(self.cur.fetchone)
+        if row is not None:
+            self.stats[2] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._fetch(self.cur.fetchmany, size or self.cur.arraysize)
+        self.stats[2] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(self.cur.fetchall)
+        self.stats[2] += len(rows)
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def __getattr__(self, name):
+        return getattr(self.cur, name)
+
+
+class _Profiler(object):
+    """
+    Collects time of statements and phases of a command for --profile.
+
+    Statements are kept as {query: [calls, seconds, rows]}, rows are
+    fetched rows or rows changed by the statement. Phases are kept as
+    {name: [seconds, seconds of statements in the phase]}.
+    """
+
+    def __init__(self):
+        import time
+        self.clock = time.time
+        self.statements = {}
+        self.phases = {}
+
+    def sql_time(self):
+        return sum(stats[1] for stats in self.statements.itervalues())
+
+    @contextmanager
+    def phase(self, name):
+        start, start_sql = self.clock(), self.sql_time()
+        try:
+            yield
+        finally:
+            times = self.phases.setdefault(name, [0.0, 0.0])
+            times[0] += self.clock() - start
+            times[1] += self.sql_time() - start_sql
+
+    def _record(self, query, method, *args):
+        stats = self.statements.setdefault(query, [0, 0.0, 0])
+        start = self.clock()
+        cur = method(query, *args)
+        stats[0] += 1
+        stats[1] += self.clock() - start
+        if cur.rowcount > 0:
+            stats[2] += cur.rowcount
+        return _ProfiledCursor(cur, stats, self.clock)
+
+    def execute(self, con, query, params):
+        return self._record(query, con.execute, params)
+
+    def executemany(self, con, query, seq_of_params):
+        return self._record(query, con.executemany, seq_of_params)
+
+    def report(self, stream):
+        """
+        Writes time of phases and the slowest statements to `stream`.
+        """
+        sql = self.sql_time()
+        total = self.phases.get('total', [0.0])[0]
+        # time of other phases without their statements
+        phases = dict((name, seconds - phase_sql) for name, (seconds, phase_sql)
+                      in self.phases.iteritems() if name != 'total')
+        stream.write(
+            'profile: total {:.1f} ms, sql {:.1f} ms, open {:.1f} ms, '
+            'output {:.1f} ms, python {:.1f} ms\n'.format(
+                total * 1000, sql * 1000, phases.get('open', 0) * 1000,
+                phases.get('output', 0) * 1000, (total - sql - sum(phases.values())) * 1000))
+        statements = sorted(
+            self.statements.iteritems(), key=lambda (query, stats): -stats[1])
+        stream.write('{:>10} {:>6} {:>8}  statement\n'.format('ms', 'calls', 'rows'))
+        for query, (calls, seconds, rows) in statements[:PROFILE_STATEMENTS]:
+            query = ' '.join(query.replace(ITEM_COLUMNS_SQL, 'item.*').split())
+            if len(query) > 100:
+                query = query[:97] + '...'
+            stream.write('{:>10.2f} {:>6} {:>8}  {}\n'.format(seconds * 1000, calls, rows, query))
+
+
+class _TimedOutput(object):
+    """
+    Stream that adds time of writing to `stream` to phase output of `profiler`.
+    """
+
+    def __init__(self, stream, profiler):
+        self.stream = stream
+        self.profiler = profiler
+
+    def write(self, s):
+        with self.profiler.phase('output'):
+            self.stream.write(s)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+# databases that commands with --all query at the same time
+ALL_DATABASES_THREADS = 8
+
+
+def find_databases(root):
+    """
+    :returns: sorted paths of files named like PROGRESS_DB_FILE_NAME
+    under directory `root`, hidden directories like .git are skipped.
+    """
+    name = os.path.basename(PROGRESS_DB_FILE_NAME)
+    found = []
+    for directory, directories, files in os.walk(root):
+        directories[:] = [d for d in directories if not d.startswith('.')]
+        if name in files:
+            found.append(os.path.join(directory, name))
+    return sorted(found)
+
+
+def map_databases(function, file_names, threads=ALL_DATABASES_THREADS):
+    """
+    Calls `function(store)` for every database in `file_names` in a pool
+    of `threads` threads. Each call opens its own Store in its thread,
+    sqlite3 lets other threads run while a query is executed.
+
+    The databases are only read: they are not created or upgraded, ones
+    with an older schema are skipped with an error message.
+
+    :returns: list of (file name, result, error message or None)
+    in the order of `file_names`.
+    """
+    import sqlite3
+    from multiprocessing.pool import ThreadPool
+
+    def call(file_name):
+        if not os.path.exists(file_name):
+            return file_name, None, 'database does not exist'
+        try:
+            store = Store(file_name)
+            try:
+                if _schema_version(store) < SCHEMA_VERSION:
+                    return file_name, None, (
+                        'skipped, the schema is older than the one of this version, ' +
+                        'run p next to it to upgrade it')
+                return file_name, function(store), None
+            finally:
+                store.close()
+        except sqlite3.Error, e:
+            return file_name, None, str(e)
+
+    if not file_names:
+        return []
+    pool = ThreadPool(min(threads, len(file_names)))
+    try:
+        return pool.map(call, file_names)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _query_all(root, function):
+    """
+    Runs `function(store)` on databases under `root` for commands
+    with --all, errors of single databases are written to stderr.
+
+    :returns: list of (directory relative to `root`, result).
+    """
+    file_names = find_databases(root)
+    if not file_names:
+        sys.stderr.write('Error: no {} under {}\n'.format(
+            os.path.basename(PROGRESS_DB_FILE_NAME), root))
+        sys.exit(1)
+    results = []
+    for file_name, result, error in map_databases(function, file_names):
+        if error is not None:
+            sys.stderr.write('Error: {}: {}\n'.format(file_name, error))
+        else:
+            results.append((os.path.relpath(os.path.dirname(file_name), root), result))
+    return results
+
+
+# _Profiler of the running command if it is profiled
+_profiler = None
+
+_store = None
+
+
+def get_store():
+    """
+    :returns: Store connected to PROGRESS_DB_FILE_NAME.
+
+    The connection is opened on first use and kept for the whole process.
+    It is reopened if the file name changes or the file is replaced.
+    """
+    global _store
+    if _store is not None and (
+            _store.file_name != PROGRESS_DB_FILE_NAME or _store.is_stale()):
+        _store.close()
+        _store = None
+    if _store is None:
+        if _profiler is not None:
+            with _profiler.phase('open'):
+                _store = Store(PROGRESS_DB_FILE_NAME)
+                _upgrade_db(_store)
+        else:
+            _store = Store(PROGRESS_DB_FILE_NAME)
+            _upgrade_db(_store)
+    return _store
+
+
+def _schema_version(store):
+    """
+    :returns: version of the schema of the database, 0 if it is not created yet.
+
+    Version 0.3 has no table schema_version, its layout is version 1.
+
+    :raises sqlite3.DatabaseError: for other layouts without the version.
+    """
+    import sqlite3
+    try:
+        return store.execute("SELECT version FROM schema_version").fetchone()[0]
+    except sqlite3.OperationalError:
+        pass
+    columns = [row[1] for row in store.execute("PRAGMA table_info(item)")]
+    if not columns:
+        return 0
+    if 'children' in columns:
+        return 1
+    raise sqlite3.DatabaseError('table item has unknown layout and no schema version')
+
+
+def _set_schema_version(store, version):
+    store.execute("CREATE TABLE IF NOT EXISTS schema_version(version INTEGER NOT NULL)")
+    store.execute("DELETE FROM schema_version")
+    store.execute("INSERT INTO schema_version(version) values(?)", (version,))
+
+
+def _upgrade_db(store):
+    """
+    Brings a database created by an older version to SCHEMA_VERSION.
+
+    Each migration runs in its own transaction together with the update
+    of the version, so an interrupted upgrade continues where it stopped.
+    """
+    version = _schema_version(store)
+    if version == 0 or version >= SCHEMA_VERSION:
+        return
+    for migration_version, migration in MIGRATIONS:
+        if migration_version > version:
+            with store.transaction():
+                # another process may have upgraded the database meanwhile
+                if _schema_version(store) >= migration_version:
+                    continue
+                migration(store)
+                _set_schema_version(store, migration_version)
+    _enable_wal(store)
+
+
+def _enable_wal(store):
+    """
+    Switches the database to write-ahead log, so readers do not wait
+    for a command that writes. The mode is kept in the database file.
+    """
+    store.execute("PRAGMA journal_mode=WAL")
+
+
+def _has_search_index(store):
+    return store.execute(
+        "SELECT 1 FROM sqlite_master WHERE name='item_fts'").fetchone() is not None
+
+
+def _create_search_index(store):
+    """
+    Creates full-text index of titles if sqlite is built with FTS5.
+    Without it `search` falls back to scanning titles.
+    """
+    import sqlite3
+    try:
+        with store.transaction():
+            for query in SEARCH_INDEX_SQL:
+                store.execute(query)
+    except sqlite3.OperationalError:
+        pass
+
+
+def _upgrade_children(store):
+    """
+    Older versions kept the hierarchy in a comma-separated `children`
+    column of the parent. It is replaced by `parent_pk` and `position`
+    columns of the child that are indexed together.
+    """
+    with store.transaction():
+        # the first parent that lists an item wins, the rest of items go to root
+        parents = {}
+        for pk, children in store.execute(
+                "SELECT pk, children FROM item WHERE children<>'' ORDER BY pk"):
+            for position, child_pk in enumerate(
+                    map(int, filter(None, children.split(',')))):
+                if child_pk not in parents and child_pk != pk:
+                    parents[child_pk] = (pk, position)
+        root_position = 1 + max(
+            [position for parent_pk, position in parents.values() if parent_pk == 0] or [-1])
+        for (pk,) in store.execute("SELECT pk FROM item WHERE pk<>0 ORDER BY pk").fetchall():
+            if pk not in parents:
+                parents[pk] = (0, root_position)
+                root_position += 1
+        store.execute(ITEM_TABLE_SQL.format(table='item_new'))
+        store.execute(
+            "INSERT INTO item_new(pk, title, added_at, is_done, done_at) " +
+            "SELECT pk, title, added_at, is_done, done_at FROM item")
+        store.executemany(
+            "UPDATE item_new SET parent_pk=?, position=? WHERE pk=?",
+            ((parent_pk, position, pk) for pk, (parent_pk, position) in parents.iteritems()))
+        store.execute("DROP TABLE item")
+        store.execute("ALTER TABLE item_new RENAME TO item")
+        store.execute(ITEM_PARENT_INDEX_SQL)
+
+
+def _convert_old_date(value):
+    """
+    :returns: `value` in OLD_DATE_FORMAT converted to DATE_FORMAT.
+    Other values are returned as they are.
+    """
+    from datetime import datetime
+    try:
+        return datetime.strptime(value[:24], OLD_DATE_FORMAT).strftime(DATE_FORMAT)
+    except (TypeError, ValueError):
+        return value
+
+
+def _upgrade_dates(store):
+    """
+    Version 0.3 stored times as 'Sun Oct 18 15:00:00 2026 EEST' which
+    do not sort. They are converted to DATE_FORMAT and `done_at` is indexed.
+    """
+    with store.transaction():
+        rows = store.execute(
+            "SELECT pk, added_at, done_at FROM item " +
+            "WHERE added_at GLOB '[A-Z]*' OR done_at GLOB '[A-Z]*'").fetchall()
+        store.executemany(
+            "UPDATE item SET added_at=?, done_at=? WHERE pk=?",
+            ((_convert_old_date(added_at), _convert_old_date(done_at), pk)
+             for pk, added_at, done_at in rows))
+        store.execute(ITEM_DONE_AT_INDEX_SQL)
+
+
+def _add_indexes(store):
+    """
+    Indexes that make filtering by state and ordering by time of adding faster.
+    """
+    store.execute(ITEM_IS_DONE_INDEX_SQL)
+    store.execute(ITEM_ADDED_AT_INDEX_SQL)
+
+
+def _create_counters(store):
+    """
+    Creates tables with numbers of items that are kept by triggers
+    and fills them.
+    """
+    with store.transaction():
+        for query in COUNTERS_SQL:
+            store.execute(query)
+        rebuild_counters(store)
+
+
+def rebuild_counters(store=None):
+    """
+    Counts items again for tables counters and item_per_day.
+    """
+    store = store or get_store()
+    with store.transaction():
+        for query in REBUILD_COUNTERS_SQL:
+            store.execute(query)
+
+
+def _add_revision(store):
+    """
+    Adds counter 'revision' and triggers that change it.
+
+    It starts from a random number, so a database created again
+    in place of a removed one does not match caches of the old one.
+    """
+    import random
+    with store.transaction():
+        store.execute(
+            "INSERT INTO counters(name, value) values('revision', ?)",
+            (random.randint(0, 2 ** 31),))
+        for query in REVISION_SQL:
+            store.execute(query)
+
+
+def get_revision(store=None):
+    """
+    :returns: number that changes with every change of items.
+    """
+    store = store or get_store()
+    return store.execute("SELECT value FROM counters WHERE name='revision'").fetchone()[0]
+
+
+# (version, function that brings the schema from the previous version to it)
+MIGRATIONS = [
+    (2, _upgrade_children),
+    (3, _upgrade_dates),
+    (4, _create_search_index),
+    (5, _add_indexes),
+    (6, _create_counters),
+    (7, _add_revision),
+]
 
 
-def _create_db_if_needed():
+def _create_db_if_needed(store=None):
     """
     Checks if db file exists. Creates it if it does not exist.
+    If `store` is given its database is created if it has no tables.
 
     :returns: a string with message describing what happened.
     """
 
-    if not os.path.exists(PROGRESS_DB_FILE_NAME):
-        con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
-        cur = con.cursor()
-        # root item that has pk=0 is always considered done
-        cur.execute(
-            "CREATE TABLE item(" +
-            "pk INTEGER PRIMARY KEY, children, title, added_at, is_done DEFAULT FALSE, done_at)")
-        cur.execute("INSERT INTO item(pk, children, title, is_done) values(0, '', 'root', 1)")
-        con.commit()
-        con.close()
+    if store is not None or not os.path.exists(PROGRESS_DB_FILE_NAME):
+        store = store or get_store()
+        with store.transaction():
+            # another process may have created it meanwhile
+            if _schema_version(store):
+                return 'DB file exists'
+            # root item that has pk=0 is always considered done
+            store.execute(ITEM_TABLE_SQL.format(table='item'))
+            store.execute(ITEM_PARENT_INDEX_SQL)
+            store.execute(ITEM_DONE_AT_INDEX_SQL)
+            _add_indexes(store)
+            store.execute("INSERT INTO item(pk, title, is_done) values(0, 'root', 1)")
+            _create_search_index(store)
+            _create_counters(store)
+            _add_revision(store)
+            _set_schema_version(store, SCHEMA_VERSION)
+        _enable_wal(store)
         return 'DB file did not exist and was created.'
 
     return 'DB file exists'
 
 
-def count_items():
-    """
-    :returns: a dictionary with counts in fields 'total', 'done'.
-    """
-    con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
-    cur = con.cursor()
-    # do not count root
-    cur.execute("SELECT COUNT(*) FROM item WHERE pk<>0")
-    total = cur.fetchone()[0]
-    cur.execute("SELECT COUNT(*) FROM item WHERE is_done='TRUE' AND pk<>0")
-    done = cur.fetchone()[0]
-    done_items = load_items(is_done=True)
-    done_today = 0
-    done_yesterday = 0
-    for i in done_items:
-        date_item = datetime.strptime(i.done_at, DATE_FORMAT)
-        date_now = datetime.now()
-        if date_now.date() == date_item.date():
-            done_today += 1
-        if (date_now.date() - date_item.date()).days == 1:
-            done_yesterday += 1
+def count_items(root_pk=None, store=None):
+    """
+    :param root_pk: if given only this item and its descendants are counted.
+
+    :returns: a dictionary with counts in fields 'total', 'done',
+    'done_today', 'done_yesterday'.
+    """
+    from datetime import datetime, timedelta
+    store = store or get_store()
+    today = datetime.now().date()
+    days = {
+        'yesterday': (today - timedelta(days=1)).strftime(DAY_FORMAT),
+        'today': today.strftime(DAY_FORMAT),
+        'tomorrow': (today + timedelta(days=1)).strftime(DAY_FORMAT),
+    }
+    if root_pk is not None:
+        days['root_pk'] = root_pk
+        total, done, done_yesterday, done_today = store.execute(
+            SUBTREE_SQL.format(anchor='pk=:root_pk') +
+            "SELECT COUNT(*), COALESCE(SUM(is_done='TRUE'), 0), " +
+            "COALESCE(SUM(is_done='TRUE' AND done_at>=:yesterday AND done_at<:today), 0), " +
+            "COALESCE(SUM(is_done='TRUE' AND done_at>=:today AND done_at<:tomorrow), 0) " +
+            "FROM item JOIN subtree USING(pk) WHERE pk<>0", days).fetchone()
+    else:
+        # counters kept by triggers, root is not counted
+        counters = dict(store.execute("SELECT name, value FROM counters"))
+        total, done = counters['total'], counters['done']
+        per_day = dict(store.execute(
+            "SELECT day, done FROM item_per_day WHERE day IN (:yesterday, :today)", days))
+        done_yesterday = per_day.get(days['yesterday'], 0)
+        done_today = per_day.get(days['today'], 0)
     return {
         'done': done,
         'total': total,
@@ -116,21 +868,210 @@ def count_items():
     }
 
 
+def count_done_between(since=None, until=None, root_pk=None, store=None):
+    """
+    :param since: first day (date) to count, if None count from the start.
+    :param until: last day (date) to count, if None count to the end.
+    :param root_pk: if given only this item and its descendants are counted.
+
+    :returns: number of items done in the range of days.
+    """
+    from datetime import timedelta
+    store = store or get_store()
+    if root_pk is None:
+        query = "SELECT COALESCE(SUM(done), 0) FROM item_per_day WHERE 1"
+        if since is not None:
+            query += " AND day>=:since"
+        if until is not None:
+            query += " AND day<=:until"
+        return store.execute(query, {
+            'since': since and since.strftime(DAY_FORMAT),
+            'until': until and until.strftime(DAY_FORMAT)}).fetchone()[0]
+    query = (SUBTREE_SQL.format(anchor='pk=?') +
+             "SELECT COUNT(*) FROM item WHERE is_done='TRUE' AND pk<>0 " +
+             "AND pk IN (SELECT pk FROM subtree)")
+    params = [root_pk]
+    if since is not None:
+        query += " AND done_at>=?"
+        params.append(since.strftime(DAY_FORMAT))
+    if until is not None:
+        query += " AND done_at<?"
+        params.append((until + timedelta(days=1)).strftime(DAY_FORMAT))
+    return store.execute(query, params).fetchone()[0]
+
+
+# SQL expressions of the first day of a period that contains time `column`,
+# weeks start on Monday
+PERIOD_SQL = {
+    'day': "substr({column}, 1, 10)",
+    'week': "date({column}, '-6 days', 'weekday 1')",
+    'month': "substr({column}, 1, 7) || '-01'",
+}
+
+STATS_FORMATS = ('table', 'csv', 'png')
+STATS_PNG_FILE_NAME = 'progress.png'
+
+
+def count_by_period(since=None, until=None, by='day', store=None):
+    """
+    :param since: first day (date) to count, if None count from the start.
+    :param until: last day (date) to count, if None count to the end.
+    :param by: 'day', 'week' or 'month'.
+
+    :returns: list of (first day of period, items added, items done)
+    ordered by period, periods when nothing was added or done are skipped.
+
+    Days are grouped from table item_per_day, so the time does not
+    depend on the number of items.
+    """
+    query = ("SELECT " + PERIOD_SQL[by].format(column='day') + ", SUM(added), SUM(done) " +
+             "FROM item_per_day WHERE 1")
+    if since is not None:
+        query += " AND day>=:since"
+    if until is not None:
+        query += " AND day<=:until"
+    query += " GROUP BY 1 HAVING SUM(added) OR SUM(done) ORDER BY 1"
+    return (store or get_store()).execute(query, {
+        'since': since and since.strftime(DAY_FORMAT),
+        'until': until and until.strftime(DAY_FORMAT)}).fetchall()
+
+
+def plot_counts(rows, by='day', ax=None):
+    """
+    Draws bars of items added (up) and done (down) for `rows`
+    returned by count_by_period() on matplotlib axes `ax`,
+    the current axes by default.
+    """
+    from datetime import datetime
+    import matplotlib.pyplot as plt
+    ax = ax or plt.gca()
+    width = {'day': 1, 'week': 7, 'month': 28}[by]
+    days = [datetime.strptime(period, DAY_FORMAT) for period, added, done in rows]
+    ax.bar(days, [added for period, added, done in rows], width=width)
+    ax.bar(days, [-done for period, added, done in rows], width=width, color='r')
+    ax.axhline(0, color='k')
+    ax.xaxis_date()
+    return ax
+
+
+def _write_png(rows, by, file_name):
+    """
+    Saves a chart of `rows` to `file_name` without a display.
+    """
+    try:
+        import matplotlib
+    except ImportError:
+        sys.stderr.write('Error: matplotlib is required for png format\n')
+        sys.exit(1)
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    figure = plt.figure(figsize=(10, 4))
+    plot_counts(rows, by, figure.add_subplot(111))
+    figure.autofmt_xdate()
+    figure.savefig(file_name)
+    plt.close(figure)
+
+
+def _parse_day(value):
+    """
+    :returns: date from string in DAY_FORMAT, exits with error if it is incorrect.
+    """
+    from datetime import datetime
+    try:
+        return datetime.strptime(value, DAY_FORMAT).date()
+    except ValueError:
+        sys.stderr.write('Error: incorrect date {}, use YYYY-MM-DD\n'.format(value))
+        sys.exit(1)
+
+
 def load_items(is_done=False):
     """
     :returns: a list with Item instances that are NOT done.
     """
-    con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
-    cur = con.cursor()
-    if is_done:
-        query = "SELECT * FROM item WHERE is_done='TRUE'"
+    return list(iter_items(is_done))
+
+
+# columns that items may be ordered by
+ORDER_COLUMNS = ('pk', 'added_at', 'done_at')
+
+
+def iter_items(is_done=False, order='pk', reverse=False, after=None, limit=None,
+               read_only=False, store=None):
+    """
+    Yields Item instances reading them from the cursor in batches,
+    or ItemRow tuples if `read_only`.
+
+    :param order: one of ORDER_COLUMNS.
+    :param after: pk of the last item of the previous page, only items
+    that follow it in the given order are returned.
+    :param limit: maximal number of items.
+    """
+    if order not in ORDER_COLUMNS:
+        raise ValueError('items can not be ordered by {}'.format(order))
+    # items keep only a given store, the one of the process may be reopened
+    item_store = store
+    store = store or get_store()
+    query = "SELECT " + ITEM_COLUMNS_SQL + " FROM item WHERE is_done=?"
+    params = ['TRUE' if is_done else 'FALSE']
+    if after is not None:
+        key = store.execute(
+            "SELECT {} FROM item WHERE pk=?".format(order), (after,)).fetchone()
+        if key is None:
+            raise ValueError('item {} does not exist'.format(after))
+        key = key[0]
+        # keyset pagination on (order, pk), NULL goes first in ascending order
+        op = '<' if reverse else '>'
+        if order == 'pk':
+            query += " AND pk{}?".format(op)
+            params.append(key)
+        elif key is None:
+            query += " AND ({col} IS NULL AND pk{op}?{rest})".format(
+                col=order, op=op, rest='' if reverse else ' OR {} IS NOT NULL'.format(order))
+            params.append(after)
+        else:
+            query += " AND ({col}{op}? OR {col}=? AND pk{op}?{rest})".format(
+                col=order, op=op, rest=' OR {} IS NULL'.format(order) if reverse else '')
+            params.extend([key, key, after])
+    direction = ' DESC' if reverse else ''
+    if order == 'pk':
+        query += " ORDER BY pk" + direction
     else:
-        query = "SELECT * FROM item WHERE is_done='FALSE'"
-    cur.execute(query)
-    items = cur.fetchall()
-    item_instances = [Item(*i) for i in items]
-    con.close()
-    return item_instances
+        query += " ORDER BY {col}{dir}, pk{dir}".format(col=order, dir=direction)
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    for item in _fetch_in_batches(store.execute(query, params), read_only, item_store):
+        yield item
+
+
+def _make_item(row, store=None):
+    return Item(*row, store=store)
+
+
+def _make_item_row(row, new=tuple.__new__):
+    # skips the length check of ItemRow._make, rows always have ITEM_COLUMNS
+    return new(ItemRow, row)
+
+
+def _fetch_in_batches(cur, read_only=None, store=None):
+    """
+    Yields rows of cursor `cur` fetching BULK_BATCH_SIZE rows at a time.
+
+    :param read_only: if None rows are yielded as they are, otherwise
+    they are converted to ItemRow if it is True or to Item if it is False.
+    :param store: Store that Item reads its children from.
+    """
+    make = None if read_only is None else _make_item_row if read_only else _make_item
+    if make is _make_item and store is not None:
+        make = lambda row: _make_item(row, store)
+    while True:
+        rows = cur.fetchmany(BULK_BATCH_SIZE)
+        if not rows:
+            break
+        if make is not None:
+            rows = map(make, rows)
+        for row in rows:
+            yield row
 
 
 def parse_item_from_string(line):
@@ -139,55 +1080,187 @@ def parse_item_from_string(line):
 
     :returns: Item with such pk and title.
     """
+    import re
 
     item_re = re.compile('(\w+) - (.+)')
     pk, title = item_re.findall(line)[0]
     return Item(pk, title)
 
 
-def get_item(pk):
+def get_item(pk, store=None):
     """
     :returns: Item for a given :param pk:, primary key.
     :returns: None if such item does not exist.
     """
-    con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
-    cur = con.cursor()
-    cur.execute('SELECT * FROM item WHERE pk={}'.format(pk))
-    item_data = cur.fetchone()
+    item_data = (store or get_store()).execute(
+        'SELECT ' + ITEM_COLUMNS_SQL + ' FROM item WHERE pk=?', (pk,)).fetchone()
     if item_data is None:
         return None
-    item = Item(*item_data)
-    con.close()
-    return item
+    return Item(*item_data, store=store)
+
+
+def get_children_pks(pk, store=None):
+    """
+    :returns: a list of pks of children of item `pk` ordered by position.
+    """
+    rows = (store or get_store()).execute(
+        'SELECT pk FROM item WHERE parent_pk=? ORDER BY position', (pk,))
+    return [row[0] for row in rows]
+
+
+def parse_pks(values):
+    """
+    :param values: pks as ints or strings like '12', '12,15' or '20-40'.
+
+    :returns: a list of (first, last) ranges of pks.
+    :raises ValueError: if a value is not a pk or a range of pks.
+    """
+    ranges = []
+    for value in values:
+        for part in str(value).split(','):
+            if not part:
+                continue
+            first, _, last = part.partition('-')
+            first = int(first)
+            last = int(last) if last else first
+            if first > last:
+                raise ValueError('incorrect range {}'.format(part))
+            ranges.append((first, last))
+    return ranges
+
+
+def _parse_pks_or_raise(values):
+    """
+    :param values: a pk, a string like in parse_pks() or a list of them.
+
+    :returns: ranges of pks from `values`.
+    :raises ValueError: if there are no pks or they are incorrect.
+    """
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+    ranges = parse_pks(values)
+    if not ranges:
+        raise ValueError('no items are specified')
+    return ranges
+
+
+def _parse_pks_or_exit(values):
+    """
+    :returns: ranges of pks from `values`, exits with error if they are incorrect.
+    """
+    try:
+        return _parse_pks_or_raise(values)
+    except ValueError:
+        print "Incorrect item value"
+        sys.exit(1)
+
+
+def _describe_pks(ranges):
+    """
+    :returns: 'item 12' or 'items 12, 15, 20-40' for `ranges` of pks.
+    """
+    if len(ranges) == 1 and ranges[0][0] == ranges[0][1]:
+        return 'item {}'.format(ranges[0][0])
+    return 'items ' + ', '.join(
+        str(first) if first == last else '{}-{}'.format(first, last)
+        for first, last in ranges)
+
+
+def _pks_condition(ranges):
+    """
+    :returns: SQL condition that selects items with pks in `ranges` and its
+    parameters. Root is never selected.
+    """
+    singles = [first for first, last in ranges if first == last]
+    terms = []
+    params = []
+    if singles:
+        terms.append('pk IN ({})'.format(','.join('?' * len(singles))))
+        params.extend(singles)
+    for first, last in ranges:
+        if first != last:
+            terms.append('pk BETWEEN ? AND ?')
+            params.extend((first, last))
+    return '(' + ' OR '.join(terms) + ') AND pk<>0', params
+
+
+def _select_condition(ranges, recursive):
+    """
+    :returns: SQL condition and its parameters that select items
+    with pks in `ranges` and, if `recursive`, all their descendants.
+    """
+    condition, params = _pks_condition(ranges)
+    if recursive:
+        condition = "pk IN (" + SUBTREE_SQL.format(anchor=condition) + \
+            "SELECT pk FROM subtree) AND pk<>0"
+    return condition, params
 
 
-def active(pk_active=None):
+def mark_active(ranges, recursive=False, store=None):
     """
-    Mark an item `pk_active` as active.
-    If item is not specified as a variable get it from stdin.
+    Marks items with pks in `ranges` (and their subitems if `recursive`) as not done.
+
+    :returns: number of changed items.
     """
+    condition, params = _select_condition(ranges, recursive)
+    store = store or get_store()
+    with store.transaction():
+        return store.execute(
+            "UPDATE item SET is_done='FALSE' WHERE " + condition, params).rowcount
 
-    _create_db_if_needed()
+
+def active(pk_active=None, recursive=False):
+    """
+    Mark items `pk_active` as active.
+    `pk_active` may be a pk or a list of pks and ranges like '20-40'.
+    If `recursive` (flag -r) all their descendants are marked too.
+    If items are not specified as a variable get them from sys.argv.
+    """
+    import sqlite3
 
     try:
         if pk_active is None:
-            if len(sys.argv) > 2:
-                pk_active = sys.argv[2]
-            else:
+            (opts, pk_active) = _parse_args('active')
+            recursive = opts.recursive
+            if not pk_active:
                 print "Specify item to make active."
                 return
-        con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
-        cur = con.cursor()
-        query = "UPDATE item SET is_done='FALSE' WHERE pk={pk_active}".format(
-            pk_active=pk_active)
-        cur.execute(query)
-        con.commit()
-        con.close()
-        print "Item {} is marked as active.".format(pk_active)
+        ranges = _parse_pks_or_exit(pk_active)
+        changed = get_progress_store().active(pk_active, recursive)
+        description = _describe_pks(ranges)
+        if recursive:
+            print "{} and subitems are marked as active ({} changed).".format(
+                description.capitalize(), changed)
+        elif description.startswith('item '):
+            print "Item {} is marked as active.".format(ranges[0][0])
+        else:
+            print "{} are marked as active ({} changed).".format(
+                description.capitalize(), changed)
     except sqlite3.OperationalError, e:
         print "Database error:", e
 
 
+def insert_item(title, parent_pk=0, store=None):
+    """
+    Adds item `title` after the last child of `parent_pk`.
+
+    :returns: the new Item.
+    :raises ValueError: if the parent does not exist.
+    """
+    import time
+    store = store or get_store()
+    added_at = time.strftime(DATE_FORMAT)
+    with store.transaction():
+        if get_item(parent_pk, store) is None:
+            raise ValueError('parent item {} does not exist'.format(parent_pk))
+        cur = store.execute(
+            "INSERT INTO item(title, added_at, is_done, parent_pk, position) " +
+            "values(?, ?, 'FALSE', ?, " + NEXT_POSITION_SQL + ")",
+            (title, added_at, parent_pk, parent_pk))
+    return Item(cur.lastrowid, title=title, added_at=added_at, parent_pk=int(parent_pk),
+                children=[])
+
+
 def add(item_title=None, parent_pk=0):
     """
     Adds a item - step/task/goal...
@@ -196,218 +1269,1268 @@ def add(item_title=None, parent_pk=0):
     
     If no parent_pk is specified item is added to root (pk=0).
     """
-
     if not item_title:
-        from optparse import OptionParser
-        parser = OptionParser()
-        parser.add_option("-t", "--title", dest="title")
-        parser.add_option("-p", "--parent", dest="parent_pk")
-        (opts, args) = parser.parse_args(sys.argv[2:])
+        (opts, args) = _parse_args('add')
         if not getattr(opts, "title"):
             sys.stderr.write('Error: no title is specified (use flag -t)\n')
-            exit(1)
+            sys.exit(1)
         item_title = opts.title
         if opts.parent_pk:
             parent_pk = opts.parent_pk
 
     # save new item and update its parent in database
 
-    _create_db_if_needed()
-
-    parent = get_item(parent_pk)
-
-    con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
-    cur = con.cursor()
-    added_at = time.strftime(DATE_FORMAT)
-    query = "INSERT INTO item(title, added_at) values('{title}', '{added_at}')".format(
-        title=item_title,
-        added_at=added_at)
-    cur.execute(query)
-    con.commit()
-    pk = cur.lastrowid
-    parent.children.append(pk)
-    children = ','.join(map(str, parent.children))
-    query = "UPDATE item SET children='{children}' WHERE pk={parent_pk}".format(
-        children=children, parent_pk=parent_pk)
-    cur.execute(query)
-    con.commit()
-    con.close()
+    try:
+        item = get_progress_store().add(item_title, parent_pk)
+    except ValueError, e:
+        sys.stderr.write('Error: {}\n'.format(e))
+        sys.exit(1)
 
     print "Added item:"
-    item = get_item(pk)
     print item
 
 
 def count():
-    counts = count_items()
+    """
+    count [-r id | --all DIR] [--since YYYY-MM-DD] [--until YYYY-MM-DD] [--rebuild]
+    """
+    (opts, args) = _parse_args('count')
+    if opts.all_root is not None:
+        if opts.root_pk is not None:
+            sys.stderr.write('Error: -r can not be used with --all\n')
+            sys.exit(1)
+        count_all(opts.all_root, opts.since and _parse_day(opts.since),
+                  opts.until and _parse_day(opts.until), opts.rebuild)
+        return
+    if opts.rebuild:
+        _exit_if_journal('count --rebuild')
+        rebuild_counters()
+    progress = get_progress_store()
+    counts = progress.count(opts.root_pk)
     print "done: {}".format(counts['done'])
     print "total items: {}".format(counts['total'])
     print ""
     print "done today: {}".format(counts['done_today'])
     print "done yesterday: {}".format(counts['done_yesterday'])
+    if opts.since or opts.until:
+        since = opts.since and _parse_day(opts.since)
+        until = opts.until and _parse_day(opts.until)
+        print "done from {} to {}: {}".format(
+            opts.since or 'start', opts.until or 'now',
+            progress.count_done_between(since, until, opts.root_pk))
 
 
-def done(pk_done=None):
+def count_all(root, since=None, until=None, rebuild=False):
+    """
+    Prints counts of every database under `root` and their sums,
+    the databases are counted in parallel.
     """
-    Mark an item `pk_done` as done.
-    If item is not specified as a variable get it from stdin.
+    def count_database(store):
+        if rebuild:
+            rebuild_counters(store)
+        counts = count_items(store=store)
+        if since or until:
+            counts['done_between'] = count_done_between(since, until, store=store)
+        return counts
+
+    columns = ['done', 'total', 'done_today', 'done_yesterday']
+    headers = ['done', 'total', 'today', 'yesterday']
+    if since or until:
+        columns.append('done_between')
+        headers.append('{}..{}'.format(since or '', until or ''))
+    row_format = ''.join('{:>%d}' % max(10, len(header) + 2) for header in headers) + '  {}'
+    lines = [row_format.format(*(headers + ['database']))]
+    sums = dict.fromkeys(columns, 0)
+    for name, counts in _query_all(root, count_database):
+        lines.append(row_format.format(*([counts[column] for column in columns] + [name])))
+        for column in columns:
+            sums[column] += counts[column]
+    lines.append(row_format.format(*([sums[column] for column in columns] + ['total'])))
+    _write_lines(lines)
+
+
+def mark_done(ranges, recursive=False, store=None):
     """
+    Marks items with pks in `ranges` (and their subitems that are not
+    done yet if `recursive`) as done now.
 
-    _create_db_if_needed()
+    :returns: number of changed items.
+    """
+    import time
+    condition, params = _select_condition(ranges, recursive)
+    if recursive:
+        # keep the time when descendants were done before
+        condition += " AND is_done<>'TRUE'"
+    store = store or get_store()
+    done_at = time.strftime(DATE_FORMAT)
+    with store.transaction():
+        return store.execute(
+            "UPDATE item SET done_at=?, is_done='TRUE' WHERE " + condition,
+            [done_at] + params).rowcount
+
+
+def done(pk_done=None, recursive=False):
+    """
+    Mark items `pk_done` as done.
+    `pk_done` may be a pk or a list of pks and ranges like '20-40'.
+    If `recursive` (flag -r) all their descendants that are not done yet
+    are marked too.
+    If items are not specified as a variable get them from sys.argv.
+    """
+    import sqlite3
 
     try:
         if pk_done is None:
-            if len(sys.argv) > 2:
-                pk_done = sys.argv[2]
-            else:
+            (opts, pk_done) = _parse_args('done')
+            recursive = opts.recursive
+            if not pk_done:
                 print "Specify item done."
                 return
-        print "Marking item %s as done." % pk_done
-        con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
-        cur = con.cursor()
-        done_at = time.strftime(DATE_FORMAT)
-        query = "UPDATE item SET done_at='{done_at}', is_done='TRUE' WHERE pk={pk_done}".format(
-            done_at=done_at, pk_done=pk_done)
-        cur.execute(query)
-        con.commit()
-        con.close()
+        ranges = _parse_pks_or_exit(pk_done)
+        if recursive:
+            print "Marking %s and subitems as done." % _describe_pks(ranges)
+        else:
+            print "Marking %s as done." % _describe_pks(ranges)
+        get_progress_store().done(pk_done, recursive)
     except sqlite3.OperationalError, e:
         print "Database error:", e
 
 
-def delete(pk_delete=None):
+def _keep_children(condition, params, store):
+    """
+    Moves children of items selected by `condition` that are not selected
+    themselves after the last child of their nearest ancestor that is kept.
+    """
+    parents = dict(store.execute("SELECT pk, parent_pk FROM item WHERE " + condition, params))
+    children = store.execute(
+        "SELECT pk, parent_pk FROM item WHERE parent_pk IN " +
+        "(SELECT pk FROM item WHERE " + condition + ") AND NOT (" + condition + ") " +
+        "ORDER BY parent_pk, position", params + params)
+    positions = {}
+    updates = []
+    for pk, parent_pk in children:
+        seen = set()
+        while parent_pk in parents and parent_pk not in seen:
+            seen.add(parent_pk)
+            parent_pk = parents[parent_pk]
+        if parent_pk in parents:
+            # all ancestors are removed items in a cycle
+            parent_pk = 0
+        if parent_pk not in positions:
+            positions[parent_pk] = store.execute(
+                "SELECT " + NEXT_POSITION_SQL, (parent_pk,)).fetchone()[0]
+        updates.append((parent_pk, positions[parent_pk], pk))
+        positions[parent_pk] += 1
+    store.executemany("UPDATE item SET parent_pk=?, position=? WHERE pk=?", updates)
+
+
+def delete_items(ranges, store=None):
+    """
+    Removes items with pks in `ranges`. Their subitems are kept, they are
+    moved to the nearest ancestor that is not removed.
+
+    :returns: number of removed items.
+    """
+    condition, params = _pks_condition(ranges)
+    store = store or get_store()
+    with store.transaction():
+        _keep_children(condition, params, store)
+        return store.execute("DELETE FROM item WHERE " + condition, params).rowcount
+
+
+def delete(pk_delete=None, confirmed=False):
     """
-    Remove item with `pk_delete` from database.
+    Remove items `pk_delete` from database after one confirmation.
+    `pk_delete` may be a pk or a list of pks and ranges like '20-40'.
+    If `confirmed` (flag -y) the confirmation is not asked.
     """
+    import sqlite3
 
     try:
         if pk_delete is None:
-            if len(sys.argv) > 2:
-                pk_delete = sys.argv[2]
-            else:
+            (opts, args) = _parse_args('delete')
+            if not args:
                 print "Specify item to delete."
                 return
-        sys.stdout.write(
-            "Do you really want to delete item {}? y/n [n] ".format(pk_delete)
-        )
-        choice = raw_input().lower().strip()
-        if choice == 'y':
-            con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
-            cur = con.cursor()
-            query = "DELETE FROM item WHERE pk='{pk_delete}'".format(
-                pk_delete=pk_delete)
-            cur.execute(query)
-            con.commit()
-            con.close()
-            print 'Deleted item {}'.format(pk_delete)
+            pk_delete, confirmed = args, opts.confirmed
+        ranges = _parse_pks_or_exit(pk_delete)
+        description = _describe_pks(ranges)
+        progress = get_progress_store()
+        if description.startswith('items '):
+            description += ' ({} found)'.format(progress.count_existing(pk_delete))
+        if not confirmed:
+            sys.stdout.write(
+                "Do you really want to delete {}? y/n [n] ".format(description)
+            )
+            confirmed = raw_input().lower().strip() == 'y'
+        if confirmed:
+            progress.delete(pk_delete)
+            print 'Deleted {}'.format(description)
     except sqlite3.OperationalError, e:
         print "Database error:", e
 
 
-def help():
+def edit_item(pk, title, store=None):
     """
-    Prints help.
+    Changes title of item `pk`.
+
+    :raises ValueError: if the item does not exist.
     """
-    print "usage: p [COMMAND [ARGS]]"
-    print ""
-    print "  add    [-p id] -t TITLE  - add an item with TITLE, flag -p points to parent id"
-    print "  count                    - count items done and to be done"
-    print "  delete n                 - delete item with id n"
-    print "  done   n                 - mark item with id n as done"
-    print "  help                     - print help"
-    print "  log    [-d]              - log items, flag -d for done"
-    print "  move   n -p m            - move item n to parent m"
-    print "  version                  - version of the program (-v and --version also work)"
+    store = store or get_store()
+    with store.transaction():
+        cur = store.execute("UPDATE item SET title=? WHERE pk=? AND pk<>0", (title, pk))
+    if not cur.rowcount:
+        raise ValueError('item {} does not exist'.format(pk))
+
+
+def edit(pk=None, item_title=None):
+    """
+    Changes title of item `pk`.
+    If it is not specified as a variable get it from sys.argv: edit id -t TITLE.
+    """
+    if pk is None:
+        (opts, args) = _parse_args('edit')
+        if len(args) != 1:
+            sys.stderr.write('Error: specify one item to edit\n')
+            sys.exit(1)
+        if not opts.title:
+            sys.stderr.write('Error: no title is specified (use flag -t)\n')
+            sys.exit(1)
+        pk, item_title = args[0], opts.title
+
+    try:
+        get_progress_store().edit(pk, item_title)
+    except ValueError, e:
+        sys.stderr.write('Error: {}\n'.format(e))
+        sys.exit(1)
+    print "Edited item:"
+    print Item(pk, title=item_title)
+
+
+def _find_detached(parents, children):
+    """
+    :param parents: {pk: parent pk} of all items.
+    :param children: {pk: list of pks of children}.
+
+    :returns: list of (pk, problem) for items that can not be reached from
+    root: the first item of a chain whose parent does not exist and the
+    smallest pk of each cycle.
+
+    Each item is visited once when walking down from root and at most
+    once when walking up from items that were not reached.
+    """
+    reached = set([0])
+    stack = [0]
+    while stack:
+        for child in children.get(stack.pop(), ()):
+            if child not in reached:
+                reached.add(child)
+                stack.append(child)
+    detached = []
+    seen = set()
+    for pk in parents:
+        if pk in reached or pk in seen:
+            continue
+        path = []
+        in_path = {}
+        node = pk
+        while node in parents and node not in seen and node not in in_path:
+            in_path[node] = len(path)
+            path.append(node)
+            node = parents[node]
+        if node in in_path:
+            cycle = sorted(path[in_path[node]:])
+            detached.append((cycle[0], 'items {} form a cycle'.format(
+                ', '.join(str(i) for i in cycle))))
+        elif node is None:
+            detached.append((path[-1], 'item {} has no parent'.format(path[-1])))
+        elif node not in seen:
+            detached.append((path[-1], 'item {}: parent {} does not exist'.format(path[-1], node)))
+        seen.update(path)
+    return sorted(detached)
+
+
+def _counters_snapshot(store):
+    return (sorted(store.execute(
+                "SELECT name, value FROM counters WHERE name IN ('total', 'done')")),
+            store.execute("SELECT day, added, done FROM item_per_day " +
+                          "WHERE added OR done ORDER BY day").fetchall())
+
+
+def check_items(repair=False, store=None):
+    """
+    Checks that all items can be reached from root, that children of
+    each item have different positions and that counters and the search
+    index match the items.
+
+    :returns: list of problems, they are fixed if `repair`. Detached items
+    are moved to root, positions of children are numbered again in their order.
+    """
+    import sqlite3
+    store = store or get_store()
+    problems = []
+    with store.transaction():
+        parents = {}
+        children = {}
+        duplicates = set()
+        previous = None
+        for pk, parent_pk, position in store.execute(
+                "SELECT pk, parent_pk, position FROM item ORDER BY parent_pk, position"):
+            if pk != 0:
+                parents[pk] = parent_pk
+                children.setdefault(parent_pk, []).append(pk)
+                if previous == (parent_pk, position):
+                    duplicates.add(parent_pk)
+                previous = (parent_pk, position)
+        detached = _find_detached(parents, children)
+        problems.extend(problem for pk, problem in detached)
+        problems.extend(
+            'item {}: children have the same positions'.format(parent_pk)
+            for parent_pk in sorted(duplicates))
+        if repair:
+            start = store.execute("SELECT " + NEXT_POSITION_SQL, (0,)).fetchone()[0]
+            store.executemany(
+                "UPDATE item SET parent_pk=0, position=? WHERE pk=?",
+                [(start + i, pk) for i, (pk, problem) in enumerate(sorted(detached))])
+            for parent_pk in duplicates:
+                pks = store.execute(
+                    "SELECT pk FROM item WHERE parent_pk=? ORDER BY position, pk",
+                    (parent_pk,)).fetchall()
+                store.executemany(
+                    "UPDATE item SET position=? WHERE pk=?",
+                    [(position, pk) for position, (pk,) in enumerate(pks)])
+
+        # counters are counted again, the change is kept only if `repair`
+        store.execute("SAVEPOINT check_counters")
+        kept = _counters_snapshot(store)
+        rebuild_counters(store)
+        if _counters_snapshot(store) != kept:
+            problems.append('counters of items are out of date')
+        if not repair:
+            store.execute("ROLLBACK TO check_counters")
+        store.execute("RELEASE check_counters")
+
+        if _has_search_index(store):
+            try:
+                store.execute("INSERT INTO item_fts(item_fts, rank) VALUES('integrity-check', 1)")
+            except sqlite3.DatabaseError:
+                problems.append('search index does not match titles')
+                if repair:
+                    store.execute("INSERT INTO item_fts(item_fts) VALUES('rebuild')")
+    return problems
+
+
+def fsck():
+    """
+    fsck [--repair]
+    """
+    (opts, args) = _parse_args('fsck')
+    _exit_if_journal('fsck')
+    problems = check_items(opts.repair)
+    for problem in problems:
+        print problem
+    if not problems:
+        print "No problems found."
+    elif opts.repair:
+        print "Repaired {} problems.".format(len(problems))
+    else:
+        print "Found {} problems, run `p fsck --repair` to fix them.".format(len(problems))
+        sys.exit(1)
+
+
+def help():
+    """
+    Prints help.
+    """
+    print "usage: p [COMMAND [ARGS]]"
+    print ""
+    print "  typing just 'p' [--depth N] [--root id] will output all items to do"
+    print ""
+    print "  active [-r] n [m-k ...]  - mark items with ids n and m to k as active (not done),"
+    print "                           flag -r marks their subitems too"
+    print "  add    [-p id] -t TITLE  - add an item with TITLE, flag -p points to parent id"
+    print "  count  [-r id | --all DIR] [--since DATE] [--until DATE] [--rebuild]"
+    print "                           - count items done and to be done, flag -r counts item id"
+    print "                           and its subitems, --rebuild recounts stored totals,"
+    print "                           --all counts every progress.db under DIR and sums them"
+    print "  delete [-y] n [m-k ...]  - delete items with ids n and m to k"
+    print "  done   [-r] n [m-k ...]  - mark items with ids n and m to k as done,"
+    print "                           flag -r marks their subitems too"
+    print "  edit   id -t TITLE       - change title of item id"
+    print "  export [-f jsonl|csv|todotxt] [--root id] [-d | --open] [--since DATE] [--until DATE]"
+    print "         [-o FILE]         - write items (added or done with -d in the range) to FILE"
+    print "                           or stdout in a format that import reads"
+    print "  fsck   [--repair]        - check that all items are in the tree and counters"
+    print "                           are up to date, --repair fixes the problems found"
+    print "  help                     - print help"
+    print "  import [-f FORMAT] [-p id] FILE"
+    print "                           - import items from todotxt, csv or jsonl FILE"
+    print "  log    [-d] [--order FIELD] [-r] [--limit N] [--after id | --all DIR]"
+    print "                           - log items, flag -d for done, pages start after item id,"
+    print "                           --all merges items of every progress.db under DIR"
+    print "  move   n [k ...] -p m    - move items n, k to parent m"
+    print "  search [-d | -o] [--order rank|pk] [--limit N] QUERY"
+    print "                           - search titles of done (-d) or open (-o) items"
+    print "  serve                    - run commands of 'p' in this process through"
+    print "                           progress.sock until Ctrl-C, so they start faster"
+    print "  show   id [--depth N] [--progress]"
+    print "                           - show item id and its subitems to do"
+    print "  stats  [--since DATE] [--until DATE] [--by day|week|month] [--format table|csv|png]"
+    print "         [-o FILE]         - numbers of items added and done in each period"
+    print "  tree   [--depth N] [--root id] [--progress]"
+    print "                           - show items to do, N levels deep, under item id,"
+    print "                           --progress adds done/all subitems and percentage"
+    print "  version                  - version of the program (-v and --version also work)"
+    print ""
+    print "  --db PATH before or after any command uses database PATH instead of ./progress.db"
+    print "  PATH ending with .journal keeps items in an append-only journal"
+    print "  --profile[=FILE] before or after any command prints time of its SQL statements"
+    print "  to stderr and saves cProfile statistics to FILE, PROGRESSIO_PROFILE=1|FILE does the same"
+    print "  PROGRESSIO_BUSY_TIMEOUT=SECONDS sets how long to wait for a database locked by another p"
+
+
+def _normalize_date(value):
+    """
+    :returns: date from an imported file in DATE_FORMAT, None if it is empty.
+    Days are extended with midnight, dates of version 0.3 are converted.
+
+    :raises ValueError: for other formats, they would not sort with the dates of items.
+    """
+    from datetime import datetime
+    if not value:
+        return None
+    for date_format in (DATE_FORMAT, DAY_FORMAT):
+        try:
+            return datetime.strptime(value, date_format).strftime(DATE_FORMAT)
+        except (TypeError, ValueError):
+            pass
+    converted = _convert_old_date(value)
+    if converted == value:
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        raise ValueError('unknown date "{}", expected YYYY-MM-DD or YYYY-MM-DD HH:MM:SS'.format(
+            value))
+    return converted
+
+
+def _record_dates(record, number):
+    """
+    :returns: (added_at, done_at) of an imported `record` in DATE_FORMAT.
+
+    :raises ValueError: with the line of the record (or its `number`
+    if readers do not know lines) if a date has an unknown format.
+    """
+    try:
+        return _normalize_date(record.get('added_at')), _normalize_date(record.get('done_at'))
+    except ValueError, e:
+        raise ValueError('line {}: {}'.format(record.get('line', number), e))
+
+
+def _is_done_value(value):
+    """
+    :returns: 'TRUE' or 'FALSE' for a done flag from an imported file.
+    """
+    if isinstance(value, basestring):
+        value = value.strip().lower() in ('true', '1', 'x', 'yes', 'y', 'done')
+    return 'TRUE' if value else 'FALSE'
+
+
+def _decode(value):
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return value
+
+
+def read_todotxt(lines):
+    """
+    Yields item records from lines in todo.txt format.
+
+    Each indentation level of 4 spaces (or a tab) makes an item a child of
+    the previous less indented one. Completed tasks start with `x` that may
+    be followed by completion and creation dates. Lines `pk - title`,
+    as printed by `p`, keep their pk as an id.
+    """
+    import re
+    todo_re = re.compile(
+        r'^(?P<done>x )?(?P<first>\d{4}-\d{2}-\d{2} )?(?P<second>\d{4}-\d{2}-\d{2} )?(?P<title>.*)$')
+    # ids of the last item on each indentation level
+    stack = []
+    for line_number, line in enumerate(lines, 1):
+        line = _decode(line).rstrip('\r\n')
+        text = line.lstrip()
+        if not text:
+            continue
+        indent = line[:len(line) - len(text)].replace('\t', '    ')
+        depth = len(indent) // 4
+        del stack[depth:]
+        record = {'id': line_number, 'parent': stack[-1] if stack else None,
+                  'line': line_number}
+        if re.match(r'^\d+ - ', text):
+            item = parse_item_from_string(text)
+            record['id'], record['title'] = item.pk, item.title
+        else:
+            match = todo_re.match(text).groupdict()
+            record['title'] = match['title']
+            if match['done']:
+                record['is_done'] = True
+                record['done_at'] = match['first'] and match['first'].strip()
+                record['added_at'] = match['second'] and match['second'].strip()
+            else:
+                record['added_at'] = match['first'] and match['first'].strip()
+                if match['second']:
+                    record['title'] = match['second'] + record['title']
+        stack.append(record['id'])
+        yield record
+
+
+def read_csv(lines):
+    """
+    Yields item records from CSV with a header.
+
+    Known columns: id, parent, title, is_done, added_at, done_at.
+    """
+    import csv
+    reader = csv.DictReader(lines)
+    for row in reader:
+        record = dict((key, _decode(value)) for key, value in row.iteritems())
+        record['line'] = reader.line_num
+        yield record
+
+
+def read_jsonl(lines):
+    """
+    Yields item records from lines with one JSON object each.
+    """
+    import json
+    for line_number, line in enumerate(lines, 1):
+        if line.strip():
+            record = json.loads(line)
+            record['line'] = line_number
+            yield record
+
+
+IMPORT_READERS = {
+    'todotxt': read_todotxt,
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+def insert_items(records, parent_pk=0, store=None):
+    """
+    Inserts item records in one transaction.
+
+    :param records: iterable of dictionaries with keys `title` and optional
+    `id`, `parent`, `is_done`, `added_at`, `done_at`, `line` (shown in errors).
+    `parent` refers to an `id` of another record, records without it are
+    added to `parent_pk`.
+
+    :returns: a dictionary with counts in fields 'added', 'done', 'skipped',
+    'unresolved' (parents that were not found and were replaced by `parent_pk`).
+
+    :raises ValueError: nothing is imported if a date has an unknown format
+    or parents of records form a cycle.
+    """
+    import time
+    _create_db_if_needed(store)
+    store = store or get_store()
+    now = time.strftime(DATE_FORMAT)
+    counts = {'added': 0, 'done': 0, 'skipped': 0, 'unresolved': 0}
+    insert_query = (
+        "INSERT INTO item(pk, title, added_at, is_done, done_at, parent_pk, position) " +
+        "values(?, ?, ?, ?, ?, ?, ?)")
+    with store.transaction():
+        if get_item(parent_pk, store) is None:
+            raise ValueError('parent item {} does not exist'.format(parent_pk))
+        next_pk = store.execute("SELECT MAX(pk) + 1 FROM item").fetchone()[0]
+        # file ids mapped to pks and next positions of children for each parent
+        pks = {}
+        positions = {parent_pk: store.execute(
+            "SELECT " + NEXT_POSITION_SQL, (parent_pk,)).fetchone()[0]}
+        # children that appear before their parents
+        forward = []
+        batch = []
+        for number, record in enumerate(records, 1):
+            title = record.get('title')
+            if not title:
+                counts['skipped'] += 1
+                continue
+            added_at, done_at = _record_dates(record, number)
+            pk = next_pk
+            next_pk += 1
+            parent = record.get('parent')
+            if parent in (None, ''):
+                item_parent_pk = parent_pk
+            elif unicode(parent) in pks:
+                item_parent_pk = pks[unicode(parent)]
+            else:
+                # also a record that is its own parent
+                forward.append((pk, unicode(parent), record.get('line', number)))
+                item_parent_pk = None
+            if record.get('id') not in (None, ''):
+                pks[unicode(record['id'])] = pk
+            position = None
+            if item_parent_pk is not None:
+                position = positions.get(item_parent_pk, 0)
+                positions[item_parent_pk] = position + 1
+            is_done = _is_done_value(record.get('is_done'))
+            if is_done == 'TRUE':
+                counts['done'] += 1
+                done_at = done_at or now
+            batch.append((pk, title, added_at or now, is_done, done_at, item_parent_pk, position))
+            counts['added'] += 1
+            if len(batch) >= BULK_BATCH_SIZE:
+                store.executemany(insert_query, batch)
+                batch = []
+        store.executemany(insert_query, batch)
+        updates = []
+        for pk, parent, line in forward:
+            if parent in pks:
+                item_parent_pk = pks[parent]
+            else:
+                counts['unresolved'] += 1
+                item_parent_pk = parent_pk
+            position = positions.get(item_parent_pk, 0)
+            positions[item_parent_pk] = position + 1
+            updates.append((item_parent_pk, position, pk))
+        store.executemany("UPDATE item SET parent_pk=?, position=? WHERE pk=?", updates)
+        # only parents that follow their children can make a cycle
+        for pk, parent, line in forward:
+            if store.execute(ANCESTORS_SQL + "SELECT 1 FROM ancestors WHERE pk=?",
+                             (pk, pk)).fetchone():
+                raise ValueError('line {}: parent {} makes a cycle'.format(line, parent))
+    return counts
+
+
+def _guess_format(file_name, default):
+    """
+    :returns: format of import or export file by its extension.
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    return {'.csv': 'csv', '.jsonl': 'jsonl', '.json': 'jsonl', '.txt': 'todotxt'}.get(
+        extension, default)
+
+
+def import_file(file_name=None, file_format=None, parent_pk=0):
+    """
+    import [-f todotxt|csv|jsonl] [-p id] FILE
+
+    Imports items from FILE ('-' for stdin) in one transaction.
+    The format is guessed from the file extension if it is not given.
+    """
+    if file_name is None:
+        (opts, args) = _parse_args('import')
+        if not args:
+            sys.stderr.write('Error: no file to import is specified\n')
+            sys.exit(1)
+        file_name, file_format, parent_pk = args[0], opts.file_format, opts.parent_pk
+
+    if file_format is None:
+        file_format = _guess_format(file_name, 'todotxt')
+
+    input_file = sys.stdin if file_name == '-' else open(file_name, 'rb')
+    try:
+        counts = get_progress_store().import_items(
+            IMPORT_READERS[file_format](input_file), parent_pk)
+    except ValueError, e:
+        sys.stderr.write('Error: {}\n'.format(e))
+        sys.exit(1)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+
+    print "Imported {added} items ({done} done) from {file_name}.".format(
+        file_name=file_name, **counts)
+    if counts['skipped']:
+        print "Skipped {} records without title.".format(counts['skipped'])
+    if counts['unresolved']:
+        print "{} items with unknown parent were added to {}.".format(
+            counts['unresolved'], parent_pk)
+
+
+# columns of exported items, in the order of EXPORT_FIELDS
+EXPORT_COLUMNS_SQL = 'pk, parent_pk, title, is_done, added_at, done_at'
+# fields of exported records, the same as the ones read by import
+EXPORT_FIELDS = ('id', 'parent', 'title', 'is_done', 'added_at', 'done_at')
+
+# depth-first walk of subitems of items that match {anchor}: the queue of
+# the recursive query is ordered by depth, so subitems of an item are taken
+# before its next sibling; the depth is limited in case of a cycle;
+# the last column is 1 for items that pass the {exported} condition
+EXPORT_TREE_SQL = (
+    "WITH RECURSIVE tree(depth, position, " + EXPORT_COLUMNS_SQL + ") AS (" +
+    "SELECT 0, position, " + EXPORT_COLUMNS_SQL + " FROM item WHERE {anchor} " +
+    "UNION ALL SELECT tree.depth + 1, item.position, " +
+    ', '.join('item.' + column for column in EXPORT_COLUMNS_SQL.split(', ')) +
+    " FROM tree JOIN item ON item.parent_pk=tree.pk " +
+    "WHERE tree.depth < (SELECT COUNT(*) FROM item) " +
+    "ORDER BY 1 DESC, 2, 3) " +
+    "SELECT depth, " + EXPORT_COLUMNS_SQL + ", {exported} FROM tree")
+# first level items of the whole tree, items with missing parents are among them
+EXPORT_FIRST_LEVEL_SQL = (
+    "pk<>0 AND (parent_pk=0 OR NOT EXISTS " +
+    "(SELECT 1 FROM item AS parent WHERE parent.pk=item.parent_pk))")
+
+
+def _exported_depths(rows):
+    """
+    Yields exported rows of a depth-first walk without their last column,
+    which tells if a row is exported. Depth of a row counts only exported
+    ancestors, so a subitem of an item that is left out is indented under
+    the nearest ancestor that is written.
+    """
+    depths = []
+    for row in rows:
+        while depths and depths[-1] >= row[0]:
+            depths.pop()
+        if row[-1]:
+            yield (len(depths),) + tuple(row[1:-1])
+            depths.append(row[0])
+
+
+def _export_rows(file_format, root_pk=None, is_done=None, since=None, until=None,
+                 store=None):
+    """
+    :returns: iterator of rows (depth, pk, parent_pk, title, is_done, added_at, done_at).
+
+    Items are in depth-first order of the tree for todotxt, otherwise in
+    order of pks, which does not need sorting. Depth is 0 for other formats.
+    """
+    from datetime import timedelta
+    params = []
+    condition = "1"
+    column = 'done_at' if is_done else 'added_at'
+    if is_done is not None:
+        condition += " AND is_done=?"
+        params.append('TRUE' if is_done else 'FALSE')
+    if since is not None:
+        condition += " AND {}>=?".format(column)
+        params.append(since.strftime(DAY_FORMAT))
+    if until is not None:
+        condition += " AND {}<?".format(column)
+        params.append((until + timedelta(days=1)).strftime(DAY_FORMAT))
+    store = store or get_store()
+    if file_format == 'todotxt':
+        # items that are left out are walked too, their subitems may be written
+        query = EXPORT_TREE_SQL.format(
+            anchor='pk=?' if root_pk is not None else EXPORT_FIRST_LEVEL_SQL,
+            exported=condition)
+        if root_pk is not None:
+            params.insert(0, root_pk)
+        return _exported_depths(store.execute(query, params))
+    if root_pk is not None:
+        query = (SUBTREE_SQL.format(anchor='pk=?') +
+                 "SELECT 0, " + EXPORT_COLUMNS_SQL + " FROM item " +
+                 "WHERE pk IN (SELECT pk FROM subtree)")
+        params.insert(0, root_pk)
+    else:
+        query = "SELECT 0, " + EXPORT_COLUMNS_SQL + " FROM item WHERE pk<>0"
+    return store.execute(query + " AND " + condition + " ORDER BY pk", params)
+
+
+def _export_record(row, root_pk):
+    depth, pk, parent_pk, title, is_done, added_at, done_at = row
+    if parent_pk == 0 or pk == root_pk:
+        parent_pk = None
+    return pk, parent_pk, title, is_done == 'TRUE', added_at, done_at
+
+
+def write_jsonl(rows, stream, root_pk=None):
+    import json
+    _write_lines((json.dumps(dict(zip(EXPORT_FIELDS, _export_record(row, root_pk))))
+                  for row in rows), stream)
+
+
+def write_csv(rows, stream, root_pk=None):
+    import csv
+    writer = csv.writer(stream)
+    writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow([
+            ('true' if value else 'false') if isinstance(value, bool) else
+            value.encode('utf-8') if isinstance(value, unicode) else value
+            for value in _export_record(row, root_pk)])
+
+
+def write_todotxt(rows, stream, root_pk=None):
+    """
+    Writes items as todo.txt lines indented by 4 spaces per level,
+    done items start with `x` and the day they were done.
+    """
+    def lines():
+        for depth, pk, parent_pk, title, is_done, added_at, done_at in rows:
+            line = '    ' * depth
+            if is_done == 'TRUE':
+                line += 'x '
+                if done_at:
+                    line += done_at[:10] + ' '
+            if added_at:
+                line += added_at[:10] + ' '
+            yield (line + title).encode('utf-8')
+    _write_lines(lines(), stream)
+
+
+EXPORT_WRITERS = {
+    'todotxt': write_todotxt,
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+}
+
+
+def export_items(stream, file_format='jsonl', root_pk=None, is_done=None, since=None,
+                 until=None, store=None):
+    """
+    Writes items to `stream` in `file_format` (jsonl, csv or todotxt) that
+    import reads. Rows are streamed from the cursor, so memory does not
+    depend on the number of items.
+
+    :param root_pk: only this item and its subitems are written.
+    :param is_done: if True or False only done or not done items are written.
+    :param since: first day (date) when items were added (done if `is_done`).
+    :param until: last day (date) when items were added (done if `is_done`).
+    """
+    rows = _export_rows(file_format, root_pk, is_done, since, until, store)
+    EXPORT_WRITERS[file_format](rows, stream, root_pk)
+
+
+def export():
+    """
+    export [-f jsonl|csv|todotxt] [--root id] [-d | --open] [--since YYYY-MM-DD]
+           [--until YYYY-MM-DD] [-o FILE]
+    """
+    (opts, args) = _parse_args('export')
+    file_format = opts.file_format
+    if file_format is None:
+        file_format = _guess_format(opts.output, 'jsonl') if opts.output else 'jsonl'
+    since = opts.since and _parse_day(opts.since)
+    until = opts.until and _parse_day(opts.until)
+    progress = get_progress_store()
+    if opts.root_pk is not None and progress.get(opts.root_pk) is None:
+        sys.stderr.write('Error: item {} does not exist\n'.format(opts.root_pk))
+        sys.exit(1)
+    output = open(opts.output, 'wb') if opts.output else sys.stdout
+    try:
+        progress.export(output, file_format, opts.root_pk, opts.is_done, since, until)
+    finally:
+        if output is not sys.stdout:
+            output.close()
 
 
 def log():
     """
-    log [-d]
+    log [-d] [--order pk|added_at|done_at] [-r] [--limit N] [--after id | --all DIR]
     """
-    from optparse import OptionParser
-    parser = OptionParser()
-    parser.add_option('-d', dest='print_done', default=False, action='store_true')
-    (opts, args) = parser.parse_args(sys.argv[2:])
+    (opts, args) = _parse_args('log')
     print "print done:", opts.print_done
-    for i in load_items(opts.print_done):
-        print str(i)
+    if opts.all_root is not None:
+        if opts.after is not None:
+            sys.stderr.write('Error: --after can not be used with --all\n')
+            sys.exit(1)
+        log_all(opts.all_root, opts.print_done, opts.order, opts.reverse, opts.limit)
+        return
+    printed = 0
+    last = None
+    try:
+        for last in get_progress_store().items(
+                opts.print_done, order=opts.order, reverse=opts.reverse,
+                after=opts.after, limit=opts.limit):
+            print str(last)
+            printed += 1
+    except ValueError, e:
+        sys.stderr.write('Error: {}\n'.format(e))
+        sys.exit(1)
+    if opts.limit and printed == opts.limit:
+        print "next page: --after {}".format(last.pk)
+
+
+def log_all(root, is_done=False, order='pk', reverse=False, limit=None):
+    """
+    Prints items of every database under `root` as `directory: pk - title`.
+    Items are read in parallel and merged by `order`, with order 'pk'
+    items of each database follow each other.
+    """
+    def read_items(store):
+        return list(iter_items(is_done, order, reverse, limit=limit, read_only=True,
+                               store=store))
+
+    items = [(name, item) for name, database_items in _query_all(root, read_items)
+             for item in database_items]
+    if order != 'pk':
+        # NULL is first in ascending order like in SQL
+        items.sort(key=lambda (name, item): getattr(item, order), reverse=reverse)
+    _write_lines('{}: {}'.format(name, item) for name, item in items[:limit])
+
+
+def move_items(ranges, new_parent_pk, store=None):
+    """
+    Moves items with pks in `ranges` after the last child of `new_parent_pk`
+    keeping their order.
+
+    :returns: number of moved items.
+    :raises ValueError: if the parent does not exist or is among moved
+    items or their subitems.
+    """
+    condition, params = _pks_condition(ranges)
+    store = store or get_store()
+    with store.transaction():
+        if get_item(new_parent_pk, store) is None:
+            raise ValueError('parent item {} does not exist'.format(new_parent_pk))
+        # an item can not become a subitem of itself: none of the ancestors
+        # of the new parent may be moved, there are fewer of them than subitems
+        cycle = store.execute(
+            ANCESTORS_SQL + "SELECT 1 FROM ancestors WHERE pk<>? AND " + condition,
+            [new_parent_pk, new_parent_pk] + params).fetchone()
+        if cycle:
+            raise ValueError('item {} is a subitem of moved items'.format(new_parent_pk))
+        # moved items keep their order after the last child of the new parent,
+        # positions do not have to be consecutive
+        start = store.execute("SELECT " + NEXT_POSITION_SQL, (new_parent_pk,)).fetchone()[0]
+        first_pk = min(first for first, last in ranges)
+        return store.execute(
+            "UPDATE item SET parent_pk=?, position=? + pk - ? WHERE pk<>? AND " + condition,
+            [new_parent_pk, start, first_pk, new_parent_pk] + params).rowcount
 
 
 def move(item_pk=None, new_parent_pk=None):
     """
-    Move item with `item_pk` to new parent with `new_parent_pk`.
+    Move items `item_pk` to new parent with `new_parent_pk`.
+    `item_pk` may be a pk or a list of pks and ranges like '20-40'.
     """
 
     if item_pk is None:
-        if len(sys.argv) > 2:
-            try:
-                item_pk = int(sys.argv[2])
-            except ValueError:
-                print "Incorrect item value"
-                exit(1)
-        else:
+        (opts, args) = _parse_args('move')
+        if not args:
             print "Specify item to move."
-            exit(1)
-        from optparse import OptionParser
-        parser = OptionParser()
-        parser.add_option("-p", "--parent", dest="new_parent_pk")
-        (opts, args) = parser.parse_args(sys.argv[2:])
+            sys.exit(1)
+        item_pk = args
         new_parent_pk = getattr(opts, "new_parent_pk")
         if new_parent_pk is None:
             sys.stderr.write('Error: no new parent is specified (use flag -p)\n')
-            exit(1)
+            sys.exit(1)
+    ranges = _parse_pks_or_exit(item_pk)
+    try:
+        moved = get_progress_store().move(item_pk, new_parent_pk)
+    except ValueError, e:
+        sys.stderr.write('Error: {}\n'.format(e))
+        sys.exit(1)
+    description = _describe_pks(ranges)
+    if not moved:
+        sys.stderr.write('Error: {} not found or the same as the new parent\n'.format(
+            description))
+        sys.exit(1)
+    if description.startswith('item '):
+        print "Item {} moved to {}.".format(ranges[0][0], new_parent_pk)
+    else:
+        print "{} moved to {} ({} moved).".format(description.capitalize(), new_parent_pk, moved)
 
-    items = load_items()
-    queries = []
-    for i in items:
-        if item_pk in i.children:
-            i.children.remove(item_pk)
-            queries.append("UPDATE item SET children='{children}' WHERE pk={old_parent_pk}".format(
-                children=i.children_str, old_parent_pk=i.pk
-            ))
-            break
-    print 'new_parent_pk', new_parent_pk
-    new_parent_item = get_item(new_parent_pk)
-    new_parent_item.children.append(item_pk)
-    print 'new_parent_imtem.children_str=', new_parent_item.children_str
-    queries.append("UPDATE item SET children='{children}' WHERE pk={new_parent_pk}".format(
-        children=new_parent_item.children_str, new_parent_pk=new_parent_pk
-    ))
-    con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
-    cur = con.cursor()
-    for q in queries:
-        print 'q=', q
-        cur.execute(q)
-    con.commit()
-    con.close()
-    return
 
+# (file id, revision) and progress of subtrees computed for them
+_subtree_progress = {}
 
-def show_one_item(item, items_dict={}, tab=''):
-    """
-    Prints `item` and all its subitems that are in `items_dict`.
-    The item is tabulated with `tab` characters.
+
+def subtree_progress(store=None):
     """
-    print tab + str(item)
-    for pk in item.children:
-        if pk in items_dict:
-            show_one_item(items_dict[pk], items_dict, tab=tab + '    ')
+    :returns: (done, total) arrays indexed by pk with numbers of done and
+    all subitems of each item on any level, done items are counted too.
 
+    Items are counted from leaves up in one pass: an item is taken when all
+    its children were added to it. Items in cycles are never taken.
+    The arrays are kept until the revision of items changes.
+    """
+    store = store or get_store()
+    key = (store.file_id, get_revision(store))
+    if key not in _subtree_progress:
+        size = store.execute(
+            "SELECT MAX(MAX(pk), MAX(parent_pk)) + 1 FROM item").fetchone()[0]
+        _subtree_progress.clear()
+        _subtree_progress[key] = _count_subtrees(size, store.execute(
+            "SELECT pk, parent_pk, is_done='TRUE' FROM item WHERE pk<>0"))
+    return _subtree_progress[key]
+
+
+def _count_subtrees(size, rows):
+    """
+    :param size: a number larger than all pks and parent pks.
+    :param rows: (pk, parent pk, 1 if done else 0) of all items except root.
+    Items without parent pk are counted as children of root, as they are
+    shown on the first level.
 
-def show_items():
+    :returns: (done, total) arrays of subtree_progress().
     """
-    Shows items in terminal.
+    from array import array
+    parents = array('l', [-1]) * size
+    is_done = array('l', [0]) * size
+    # children that were not added to their parent yet
+    pending = array('l', [0]) * size
+    for pk, parent_pk, item_is_done in rows:
+        if parent_pk is None:
+            parent_pk = 0
+        parents[pk] = parent_pk
+        is_done[pk] = item_is_done
+        pending[parent_pk] += 1
+    done = array('l', [0]) * size
+    total = array('l', [0]) * size
+    ready = [pk for pk in xrange(1, size) if parents[pk] != -1 and not pending[pk]]
+    while ready:
+        pk = ready.pop()
+        parent_pk = parents[pk]
+        total[parent_pk] += 1 + total[pk]
+        done[parent_pk] += is_done[pk] + done[pk]
+        pending[parent_pk] -= 1
+        if not pending[parent_pk] and parent_pk != 0 and parents[parent_pk] != -1:
+            ready.append(parent_pk)
+    return done, total
+
+
+def render_tree(items, depth=None, root_pk=None, progress=None):
+    """
+    Yields lines with `items` and their subitems, subitems are tabulated
+    with 4 spaces per level.
+
+    Items are expected in order of parents and positions. If `root_pk` is
+    among `items` it is the only first level item, otherwise items whose
+    parent is not among `items` are first level. Only `depth` levels are
+    shown if it is given. With `progress` (done, total) items with subitems
+    are followed by numbers of their done and all subitems and done percentage.
+
+    The tree is walked with a stack, so deep trees do not hit recursion limit.
     """
-    items = load_items()
-    # select ids that are not first level
-    not_first_level = set()
     items_dict = {}
+    children = {}
     for i in items:
-        not_first_level = not_first_level.union(set(i.children))
         items_dict[i.pk] = i
-    for i in items:
-        if not i.pk in not_first_level:
-            show_one_item(i, items_dict)
+        children.setdefault(i.parent_pk, []).append(i)
+    if root_pk in items_dict:
+        first_level = [items_dict[root_pk]]
+    else:
+        first_level = sorted(i for i in items_dict.itervalues() if i.parent_pk not in items_dict)
+    stack = [(i, 0) for i in reversed(first_level)]
+    shown = set()
+    while stack:
+        item, level = stack.pop()
+        if item.pk in shown:
+            continue
+        shown.add(item.pk)
+        line = '    ' * level + str(item)
+        if progress is not None and progress[1][item.pk]:
+            done, total = progress[0][item.pk], progress[1][item.pk]
+            line += ' [{}/{} {}%]'.format(done, total, done * 100 // total)
+        yield line
+        if depth is None or level + 1 < depth:
+            stack.extend((child, level + 1) for child in reversed(children.get(item.pk, ())))
+
+
+def _write_lines(lines, stream=None):
+    """
+    Writes `lines` to `stream` (stdout by default) in chunks
+    instead of one write per line.
+    """
+    stream = stream or sys.stdout
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == BULK_BATCH_SIZE:
+            stream.write('\n'.join(chunk) + '\n')
+            chunk = []
+    if chunk:
+        stream.write('\n'.join(chunk) + '\n')
+
+
+def _next_to_db(file_name):
+    """
+    :returns: path of `file_name` in the directory of PROGRESS_DB_FILE_NAME.
+    """
+    return os.path.join(os.path.dirname(PROGRESS_DB_FILE_NAME), file_name)
+
+
+def _render_cache_file_name():
+    return _next_to_db(RENDER_CACHE_FILE_NAME.format(os.path.basename(PROGRESS_DB_FILE_NAME)))
+
+
+def _render_cache_key(revision, depth=None, root_pk=None, progress=False):
+    """
+    :returns: first line of the cache file for the view of the database
+    with `revision`. The database is identified by its real path and inode,
+    so a copy of it with the same revision does not match.
+    """
+    return '{} {} revision {} tree depth={} root={} progress={}\n'.format(
+        os.path.realpath(PROGRESS_DB_FILE_NAME), _file_id(PROGRESS_DB_FILE_NAME),
+        revision, depth, root_pk, bool(progress))
+
+
+def _read_render_cache(file_name, key):
+    """
+    :returns: output saved in `file_name` if it was saved with `key`, otherwise None.
+    """
+    try:
+        with open(file_name, 'rb') as f:
+            if f.readline() == key:
+                return f.read()
+    except IOError:
+        pass
+    return None
+
+
+def _write_render_cache(file_name, key, output):
+    """
+    Saves `output` with `key` to `file_name`, readers never see a partial file.
+    The cache is skipped if it can not be written.
+    """
+    temporary_file_name = '{}.{}'.format(file_name, os.getpid())
+    try:
+        with open(temporary_file_name, 'wb') as f:
+            f.write(key)
+            f.write(output)
+        os.rename(temporary_file_name, file_name)
+    except (IOError, OSError):
+        try:
+            os.remove(temporary_file_name)
+        except OSError:
+            pass
+
+
+def show_items(depth=None, root_pk=None, progress=False):
+    """
+    Shows items in terminal.
+
+    :param depth: number of levels to show, all if None.
+    :param root_pk: show only this item and its subitems.
+    :param progress: show numbers of done and all subitems of items,
+    see subtree_progress().
+
+    The output is saved in a cache file together with the database, the
+    revision of items and the options, while they are the same the file is
+    printed instead of loading items. The file is replaced by other views.
+    """
+    progress_store = get_progress_store()
+    revision = progress_store.revision()
+    file_name = _render_cache_file_name()
+    key = _render_cache_key(revision, depth, root_pk, progress)
+    output = None if revision is None else _read_render_cache(file_name, key)
+    if output is None:
+        lines = list(render_tree(
+            progress_store.tree_items(root_pk), depth, root_pk,
+            progress_store.progress() if progress else None))
+        output = '\n'.join(lines) + '\n' if lines else ''
+        if revision is not None:
+            _write_render_cache(file_name, key, output)
+    sys.stdout.write(output)
+
+
+def _search_terms(query):
+    """
+    :returns: FTS5 query that matches all words of `query`.
+    Words are quoted, so punctuation has no special meaning,
+    a trailing * matches words that start with the word.
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*')
+        if word:
+            terms.append('"' + word.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def search_items(query, is_done=None, order='rank', limit=None, read_only=False,
+                 store=None):
+    """
+    Yields items (ItemRow if `read_only`) with titles that contain
+    all words of `query`.
+
+    :param is_done: if True or False only done or not done items are returned.
+    :param order: 'rank' for the best matches first or 'pk'.
+    :param limit: maximal number of items.
+    """
+    item_store = store
+    store = store or get_store()
+    params = []
+    if _has_search_index(store):
+        match = _search_terms(query)
+        if not match:
+            return
+        sql = ("SELECT " + ITEM_COLUMNS_SQL + " FROM item_fts JOIN item ON item.pk=item_fts.rowid " +
+               "WHERE item_fts MATCH ? AND item.pk<>0")
+        params.append(match)
+    else:
+        sql = "SELECT " + ITEM_COLUMNS_SQL + " FROM item WHERE pk<>0"
+        for word in query.split():
+            sql += " AND title LIKE ?"
+            params.append('%' + word.rstrip('*') + '%')
+        order = 'pk'
+    if is_done is not None:
+        sql += " AND is_done=?"
+        params.append('TRUE' if is_done else 'FALSE')
+    sql += " ORDER BY rank" if order == 'rank' else " ORDER BY pk"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    for item in _fetch_in_batches(store.execute(sql, params), read_only, item_store):
+        yield item
+
+
+def search():
+    """
+    search [-d | -o] [--order rank|pk] [--limit N] QUERY
+    """
+    (opts, args) = _parse_args('search')
+    if not args:
+        sys.stderr.write('Error: nothing to search is specified\n')
+        sys.exit(1)
+    items = get_progress_store().search(' '.join(args), opts.is_done, opts.order, opts.limit)
+    _write_lines(
+        str(i) + (' [done]' if i.is_done == 'TRUE' else '') for i in items)
+
+
+def show():
+    """
+    show id [--depth N] [--progress]
+    """
+    (opts, args) = _parse_args('show')
+    if len(args) != 1 or not args[0].isdigit():
+        sys.stderr.write('Error: specify one item to show\n')
+        sys.exit(1)
+    show_items(opts.depth, int(args[0]), opts.progress)
+
+
+def stats():
+    """
+    stats [--since YYYY-MM-DD] [--until YYYY-MM-DD] [--by day|week|month]
+          [--format table|csv|png] [-o FILE]
+    """
+    (opts, args) = _parse_args('stats')
+    since = opts.since and _parse_day(opts.since)
+    until = opts.until and _parse_day(opts.until)
+    rows = get_progress_store().count_by_period(since, until, opts.by)
+    if opts.format == 'png':
+        file_name = opts.output or STATS_PNG_FILE_NAME
+        _write_png(rows, opts.by, file_name)
+        print "Saved {} periods to {}.".format(len(rows), file_name)
+        return
+    output = open(opts.output, 'wb') if opts.output else sys.stdout
+    try:
+        if opts.format == 'csv':
+            import csv
+            writer = csv.writer(output)
+            writer.writerow((opts.by, 'added', 'done'))
+            writer.writerows(rows)
+        else:
+            _write_lines(
+                ['{:<12}{:>8}{:>8}'.format(opts.by, 'added', 'done')] +
+                ['{:<12}{:>8}{:>8}'.format(*row) for row in rows],
+                output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+def tree():
+    """
+    [tree] [--depth N] [--root id] [--progress]
+    """
+    args = sys.argv[2:] if sys.argv[1:2] == ['tree'] else sys.argv[1:]
+    (opts, args) = _parse_args('tree', args)
+    show_items(opts.depth, opts.root_pk, opts.progress)
 
 
 def version():
@@ -418,61 +2541,1255 @@ def version():
     print '<{url}>'.format(url=__url__)
 
 
-def main():
-    # check if db exists and create it if confirmed
-    if not os.path.exists(PROGRESS_DB_FILE_NAME):
-        sys.stdout.write(
-            "{0} does not exist. Create? y/n [n] ".format(
-                PROGRESS_DB_FILE_NAME))
-        choice = raw_input().lower()
-        if choice == '' or choice == 'n':
-            return
+class ProgressStore(object):
+    """
+    Items of one database for programs that use progressio as a library.
+
+    Methods return data instead of printing it and raise ValueError
+    instead of exiting. Items are given like in commands: a pk, a string
+    like '12,15' or '20-40' or a list of them. Each call is a transaction,
+    calls in `with progress.transaction():` are one transaction.
+
+        with ProgressStore('progress.db') as progress:
+            item = progress.add('write tests')
+            progress.done(item.pk)
+            print progress.count()['done']
+
+    The database is created if it does not exist.
+    """
+
+    def __init__(self, file_name=None):
+        self.file_name = file_name or PROGRESS_DB_FILE_NAME
+        self.store = Store(self.file_name)
+        _upgrade_db(self.store)
+        _create_db_if_needed(self.store)
+
+    def close(self):
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def transaction(self):
+        return self.store.transaction()
+
+    def add(self, title, parent_pk=0):
+        """
+        :returns: new Item added after the last child of `parent_pk`.
+        """
+        return insert_item(title, parent_pk, self.store)
+
+    def get(self, pk):
+        """
+        :returns: Item with its children or None if it does not exist.
+        """
+        item = get_item(pk, self.store)
+        if item is not None:
+            item.children = get_children_pks(pk, self.store)
+        return item
+
+    def edit(self, pk, title):
+        edit_item(pk, title, self.store)
+
+    def done(self, pks, recursive=False):
+        """
+        :returns: number of items marked as done.
+        """
+        return mark_done(_parse_pks_or_raise(pks), recursive, self.store)
+
+    def active(self, pks, recursive=False):
+        """
+        :returns: number of items marked as not done.
+        """
+        return mark_active(_parse_pks_or_raise(pks), recursive, self.store)
+
+    def move(self, pks, parent_pk):
+        """
+        :returns: number of moved items.
+        """
+        return move_items(_parse_pks_or_raise(pks), parent_pk, self.store)
+
+    def delete(self, pks):
+        """
+        :returns: number of deleted items.
+        """
+        return delete_items(_parse_pks_or_raise(pks), self.store)
+
+    def count_existing(self, pks):
+        """
+        :returns: number of items among `pks` that exist.
+        """
+        condition, params = _pks_condition(_parse_pks_or_raise(pks))
+        return self.store.execute(
+            "SELECT COUNT(*) FROM item WHERE " + condition, params).fetchone()[0]
+
+    def items(self, is_done=False, order='pk', reverse=False, after=None, limit=None):
+        """
+        :returns: iterator of ItemRow, see iter_items().
+        """
+        return iter_items(is_done, order, reverse, after, limit, read_only=True,
+                          store=self.store)
+
+    def search(self, query, is_done=None, order='rank', limit=None):
+        """
+        :returns: iterator of ItemRow, see search_items().
+        """
+        return search_items(query, is_done, order, limit, read_only=True, store=self.store)
+
+    def count(self, root_pk=None):
+        """
+        :returns: dictionary with counts, see count_items().
+        """
+        return count_items(root_pk, self.store)
+
+    def count_done_between(self, since=None, until=None, root_pk=None):
+        return count_done_between(since, until, root_pk, self.store)
+
+    def count_by_period(self, since=None, until=None, by='day'):
+        """
+        :returns: list of (first day, added, done), see count_by_period().
+        """
+        return count_by_period(since, until, by, self.store)
+
+    def tree_items(self, root_pk=None):
+        """
+        :returns: iterator of ItemRow of items to do ordered by parents and
+        positions, only `root_pk` and its subitems if it is given.
+        """
+        query = ("SELECT " + ITEM_COLUMNS_SQL + " FROM item " +
+                 "WHERE is_done='FALSE' ORDER BY parent_pk, position")
+        params = ()
+        if root_pk is not None:
+            query = (SUBTREE_SQL.format(anchor='pk=?') +
+                     "SELECT " + ITEM_COLUMNS_SQL + " FROM item JOIN subtree USING(pk) " +
+                     "WHERE is_done='FALSE' ORDER BY parent_pk, position")
+            params = (root_pk,)
+        return _fetch_in_batches(self.store.execute(query, params), read_only=True)
+
+    def revision(self):
+        """
+        :returns: number that changes with every change of items,
+        None if it is not kept.
+        """
+        return get_revision(self.store)
+
+    def progress(self):
+        """
+        :returns: (done, total) arrays of subitems by pk, see subtree_progress().
+        """
+        return subtree_progress(self.store)
+
+    def import_items(self, records, parent_pk=0):
+        """
+        :returns: dictionary with counts, see insert_items().
+        """
+        return insert_items(records, parent_pk, self.store)
+
+    def export(self, stream, file_format='jsonl', root_pk=None, is_done=None, since=None,
+               until=None):
+        export_items(stream, file_format, root_pk, is_done, since, until, self.store)
+
+
+class _ProcessProgressStore(ProgressStore):
+    """
+    ProgressStore of PROGRESS_DB_FILE_NAME on the connection of the process,
+    see get_store(). Commands use it through get_progress_store().
+    """
+
+    def __init__(self):
+        pass
+
+    @property
+    def file_name(self):
+        return PROGRESS_DB_FILE_NAME
+
+    @property
+    def store(self):
+        return get_store()
+
+    def close(self):
+        pass
+
+
+_process_progress_store = _ProcessProgressStore()
+_journal_progress_store = None
+
+
+def get_progress_store():
+    """
+    :returns: ProgressStore that commands use for PROGRESS_DB_FILE_NAME,
+    JournalProgressStore if it ends with JOURNAL_EXTENSION. The database
+    is created if it does not exist.
+    """
+    global _journal_progress_store
+    if not PROGRESS_DB_FILE_NAME.endswith(JOURNAL_EXTENSION):
         _create_db_if_needed()
-        print "created %s file" % PROGRESS_DB_FILE_NAME
+        return _process_progress_store
+    if (_journal_progress_store is None or
+            _journal_progress_store.file_name != PROGRESS_DB_FILE_NAME):
+        _journal_progress_store = JournalProgressStore(PROGRESS_DB_FILE_NAME)
+    return _journal_progress_store
 
-    args = sys.argv
-    command = None
-    if len(args) > 1:
-        command = args[1]
 
-    if command == 'active':
-        active()
-        return
+def _exit_if_journal(command):
+    """
+    Exits if PROGRESS_DB_FILE_NAME is a journal, `command` needs SQLite.
+    """
+    if PROGRESS_DB_FILE_NAME.endswith(JOURNAL_EXTENSION):
+        sys.stderr.write('Error: {} works only with SQLite databases, {} is a journal\n'.format(
+            command, PROGRESS_DB_FILE_NAME))
+        sys.exit(1)
 
-    if command == 'add':
-        add()
-        return
 
-    if command == 'done':
-        done()
-        return
+def open_progress_store(file_name=None):
+    """
+    :returns: JournalProgressStore if `file_name` ends with JOURNAL_EXTENSION,
+    otherwise ProgressStore of a SQLite database.
+    """
+    if file_name and file_name.endswith(JOURNAL_EXTENSION):
+        return JournalProgressStore(file_name)
+    return ProgressStore(file_name)
 
-    if command == 'delete':
-        delete()
-        return
 
-    if command == 'count':
-        count()
-        return
+def _journal_escape(text):
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
 
-    if command in ['help', '-h', '--help', '-help']:
-        help()
-        return
 
-    if command == 'log':
-        log()
-        return
+def _journal_unescape(text):
+    import re
+    if '\\' not in text:
+        return text
+    return re.sub(r'\\(.)', lambda m: {'t': '\t', 'n': '\n'}.get(m.group(1), m.group(1)), text)
 
-    if command == 'move':
-        move()
-        return
 
-    if command in ['version', '-v', '--version']:
-        version()
-        return
+def _scan_lines(file_name, offset=0):
+    """
+    Yields (offset after the line, line without newline) for lines of
+    `file_name` after `offset`. The file is mapped to memory instead of
+    being read; a last line without newline is still being written and
+    is not yielded.
+    """
+    import mmap
+    with open(file_name, 'rb') as f:
+        if os.fstat(f.fileno()).st_size <= offset:
+            return
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            m.seek(offset)
+            while True:
+                line = m.readline()
+                if not line.endswith('\n'):
+                    return
+                yield m.tell(), line[:-1]
+        finally:
+            m.close()
+
+
+class JournalProgressStore(ProgressStore):
+    """
+    ProgressStore that keeps items in text files instead of SQLite.
+
+    Every change of an item appends a line to the journal `file_name`
+    (progress.journal), so writing does not depend on the number of items
+    and the file diffs well in version control. `file_name`.snapshot has
+    all items as of the last compaction. Items are kept in memory: they
+    are loaded from both files mapped to memory, and lines appended by
+    other processes are read before each call.
+
+    Journal lines have tab-separated fields, titles are the last ones:
+
+        add     pk  parent_pk  added_at  title
+        done    pk  done_at
+        active  pk
+        move    pk  parent_pk
+        edit    pk  title
+        delete  pk
+
+    When the journal has more than JOURNAL_COMPACT_EVENTS lines and more
+    lines than there are items, all items are written to a new snapshot
+    and the journal starts again. The first lines of both files have
+    a generation, a journal older than the snapshot is already in it.
+    """
+
+    def __init__(self, file_name=None):
+        self.file_name = file_name or 'progress' + JOURNAL_EXTENSION
+        self.snapshot_file_name = self.file_name + '.snapshot'
+        self._items = None
+        self._journal = None
+        self._pending = []
+        self._transaction_depth = 0
+        # creates the journal if it does not exist
+        with self.transaction():
+            pass
+
+    def close(self):
+        self._items = None
+
+    def _file_ids(self):
+        return _file_id(self.snapshot_file_name), _file_id(self.file_name)
+
+    def _load(self):
+        """
+        Reads all items from the snapshot and the journal.
+        """
+        self._items = {0: [0, u'root', None, 'TRUE', None, None, 0]}
+        self._children = {}
+        self._next_pk = 1
+        self._generation = 0
+        self._journal_generation = -1
+        self._journal_events = 0
+        self._offset = 0
+        self._loaded_file_ids = self._file_ids()
+        if self._loaded_file_ids[0] is not None:
+            lines = _scan_lines(self.snapshot_file_name)
+            for offset, line in lines:
+                self._generation = int(line.split(' ')[-1])
+                break
+            for offset, line in lines:
+                self._apply(line.split('\t'))
+            for children in self._children.itervalues():
+                children.sort(key=lambda pk: self._items[pk][6])
+        if self._loaded_file_ids[1] is not None:
+            self._read_journal()
+
+    def _read_journal(self):
+        """
+        Applies lines of the journal that were not read yet.
+        """
+        for offset, line in _scan_lines(self.file_name, self._offset):
+            if not self._offset:
+                self._journal_generation = int(line.split(' ')[-1])
+            elif self._journal_generation >= self._generation:
+                self._apply(line.split('\t'))
+                self._journal_events += 1
+            self._offset = offset
+
+    def _read(self):
+        """
+        Brings items in memory up to date with the files, they are read
+        again if a compaction in another process replaced them.
+        """
+        if self._items is None or self._loaded_file_ids != self._file_ids():
+            self._load()
+        else:
+            self._read_journal()
+
+    def _apply(self, fields):
+        """
+        Changes items in memory by a line of the snapshot or the journal.
+        Items are lists of ITEM_COLUMNS.
+        """
+        op, pk = fields[0], int(fields[1])
+        items = self._items
+        if op == 'item':
+            parent_pk, position, is_done, added_at, done_at, title = fields[2:]
+            items[pk] = [pk, _journal_unescape(title).decode('utf-8'), added_at or None,
+                         is_done, done_at or None, int(parent_pk), int(position)]
+            self._children.setdefault(int(parent_pk), []).append(pk)
+            self._next_pk = max(self._next_pk, pk + 1)
+        elif op == 'add':
+            items[pk] = [pk, _journal_unescape(fields[4]).decode('utf-8'), fields[3], 'FALSE',
+                         None, None, None]
+            self._append_child(int(fields[2]), pk)
+            self._next_pk = max(self._next_pk, pk + 1)
+        elif pk not in items:
+            return
+        elif op == 'done':
+            items[pk][3:5] = ['TRUE', fields[2]]
+        elif op == 'active':
+            items[pk][3] = 'FALSE'
+        elif op == 'move':
+            self._remove_child(pk)
+            self._append_child(int(fields[2]), pk)
+        elif op == 'edit':
+            items[pk][1] = _journal_unescape(fields[2]).decode('utf-8')
+        elif op == 'delete':
+            self._remove_child(pk)
+            del items[pk]
+
+    def _append_child(self, parent_pk, pk):
+        children = self._children.setdefault(parent_pk, [])
+        position = self._items[children[-1]][6] + 1 if children else 0
+        self._items[pk][5:7] = [parent_pk, position]
+        children.append(pk)
+
+    def _remove_child(self, pk):
+        children = self._children.get(self._items[pk][5], [])
+        if pk in children:
+            children.remove(pk)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Lines of changes made in the block are appended to the journal
+        at its end, other processes wait for it. Nothing is written if
+        the block raises.
+        """
+        import fcntl
+        if self._transaction_depth:
+            self._transaction_depth += 1
+            try:
+                yield
+            finally:
+                self._transaction_depth -= 1
+            return
+        while True:
+            journal = open(self.file_name, 'ab')
+            fcntl.flock(journal, fcntl.LOCK_EX)
+            # a compaction in another process could replace the file meanwhile
+            stat = os.fstat(journal.fileno())
+            if _file_id(self.file_name) == (stat.st_dev, stat.st_ino):
+                break
+            journal.close()
+        self._journal = journal
+        self._transaction_depth = 1
+        try:
+            self._read()
+            if self._journal_generation < self._generation:
+                self._start_journal()
+            yield
+            if self._pending:
+                self._journal.write(''.join(self._pending))
+                self._journal.flush()
+                self._journal_events += len(self._pending)
+                self._offset = self._journal.tell()
+                self._pending = []
+                if self._journal_events > max(JOURNAL_COMPACT_EVENTS, len(self._items)):
+                    self.compact()
+        except:
+            # changes in memory are dropped together with their lines
+            self._items = None
+            raise
+        finally:
+            self._pending = []
+            self._transaction_depth = 0
+            self._journal.close()
+            self._journal = None
+
+    def _write(self, *fields):
+        """
+        Applies a change to items in memory, its line is appended to the
+        journal when the transaction ends.
+        """
+        line = '\t'.join(
+            _journal_escape(field.encode('utf-8') if isinstance(field, unicode) else field)
+            if isinstance(field, basestring) else str(field)
+            for field in fields)
+        self._apply(line.split('\t'))
+        self._pending.append(line + '\n')
+
+    def _start_journal(self):
+        """
+        Replaces the journal with an empty one of the current generation,
+        the new file is locked before it replaces the locked old one.
+        """
+        import fcntl
+        temporary_file_name = '{}.{}'.format(self.file_name, os.getpid())
+        journal = open(temporary_file_name, 'ab')
+        fcntl.flock(journal, fcntl.LOCK_EX)
+        journal.write('progressio journal {}\n'.format(self._generation))
+        journal.flush()
+        os.fsync(journal.fileno())
+        os.rename(temporary_file_name, self.file_name)
+        self._journal.close()
+        self._journal = journal
+        self._journal_generation = self._generation
+        self._journal_events = 0
+        self._offset = journal.tell()
+        self._loaded_file_ids = self._file_ids()
+
+    def compact(self):
+        """
+        Writes all items to a new snapshot and starts the journal again.
+        """
+        with self.transaction():
+            self._generation += 1
+            temporary_file_name = '{}.{}'.format(self.snapshot_file_name, os.getpid())
+            with open(temporary_file_name, 'wb') as f:
+                f.write('progressio snapshot {}\n'.format(self._generation))
+                for pk, title, added_at, is_done, done_at, parent_pk, position in sorted(
+                        self._items.itervalues()):
+                    if pk != 0:
+                        f.write('\t'.join([
+                            'item', str(pk), str(parent_pk), str(position), is_done,
+                            added_at or '', done_at or '',
+                            _journal_escape(title.encode('utf-8'))]) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(temporary_file_name, self.snapshot_file_name)
+            self._start_journal()
+
+    def _select(self, pks, recursive=False):
+        """
+        :returns: sorted pks of existing items given like in commands and,
+        if `recursive`, of their subitems. Root is never selected.
+        """
+        items = self._items
+        selected = set()
+        for first, last in _parse_pks_or_raise(pks):
+            if last - first < len(items):
+                selected.update(pk for pk in xrange(first, last + 1) if pk in items)
+            else:
+                selected.update(pk for pk in items if first <= pk <= last)
+        if recursive:
+            stack = list(selected)
+            while stack:
+                for child in self._children.get(stack.pop(), ()):
+                    if child in items and child not in selected:
+                        selected.add(child)
+                        stack.append(child)
+        selected.discard(0)
+        return sorted(selected)
+
+    def _rows(self, root_pk=None):
+        """
+        :returns: items except root, only `root_pk` and its subitems if it is given.
+        """
+        if root_pk is None:
+            return [row for pk, row in self._items.iteritems() if pk != 0]
+        return [self._items[pk] for pk in self._select(root_pk, recursive=True)]
+
+    def add(self, title, parent_pk=0):
+        import time
+        with self.transaction():
+            parent_pk = int(parent_pk)
+            if parent_pk not in self._items:
+                raise ValueError('parent item {} does not exist'.format(parent_pk))
+            pk = self._next_pk
+            self._write('add', pk, parent_pk, time.strftime(DATE_FORMAT), title)
+            return Item(*self._items[pk], children=[])
+
+    def get(self, pk):
+        self._read()
+        row = self._items.get(int(pk))
+        if row is None:
+            return None
+        return Item(*row, children=list(self._children.get(row[0], ())))
+
+    def edit(self, pk, title):
+        with self.transaction():
+            pk = int(pk)
+            if pk == 0 or pk not in self._items:
+                raise ValueError('item {} does not exist'.format(pk))
+            self._write('edit', pk, title)
+
+    def done(self, pks, recursive=False):
+        import time
+        with self.transaction():
+            selected = self._select(pks, recursive)
+            if recursive:
+                # keep the time when subitems were done before
+                selected = [pk for pk in selected if self._items[pk][3] != 'TRUE']
+            done_at = time.strftime(DATE_FORMAT)
+            for pk in selected:
+                self._write('done', pk, done_at)
+            return len(selected)
+
+    def active(self, pks, recursive=False):
+        with self.transaction():
+            selected = self._select(pks, recursive)
+            for pk in selected:
+                if self._items[pk][3] == 'TRUE':
+                    self._write('active', pk)
+            return len(selected)
+
+    def move(self, pks, parent_pk):
+        with self.transaction():
+            parent_pk = int(parent_pk)
+            if parent_pk not in self._items:
+                raise ValueError('parent item {} does not exist'.format(parent_pk))
+            selected = [pk for pk in self._select(pks) if pk != parent_pk]
+            # an item can not become a subitem of itself
+            moved = set(selected)
+            seen = set()
+            ancestor = self._items[parent_pk][5]
+            while ancestor in self._items and ancestor not in seen:
+                if ancestor in moved:
+                    raise ValueError('item {} is a subitem of moved items'.format(parent_pk))
+                seen.add(ancestor)
+                ancestor = self._items[ancestor][5]
+            for pk in selected:
+                self._write('move', pk, parent_pk)
+            return len(selected)
+
+    def delete(self, pks):
+        with self.transaction():
+            selected = self._select(pks)
+            deleted = set(selected)
+            # subitems are moved to the nearest ancestor that is kept like in delete_items()
+            for pk in selected:
+                parent_pk = self._items[pk][5]
+                seen = set()
+                while parent_pk in deleted and parent_pk not in seen:
+                    seen.add(parent_pk)
+                    parent_pk = self._items[parent_pk][5]
+                if parent_pk in deleted:
+                    parent_pk = 0
+                for child in list(self._children.get(pk, ())):
+                    if child in self._items and child not in deleted:
+                        self._write('move', child, parent_pk)
+            for pk in selected:
+                self._write('delete', pk)
+            return len(selected)
+
+    def count_existing(self, pks):
+        self._read()
+        return len(self._select(pks))
+
+    def items(self, is_done=False, order='pk', reverse=False, after=None, limit=None):
+        if order not in ORDER_COLUMNS:
+            raise ValueError('items can not be ordered by {}'.format(order))
+        self._read()
+        column = ITEM_COLUMNS.index(order)
+        is_done = 'TRUE' if is_done else 'FALSE'
+        rows = [row for row in self._rows() if row[3] == is_done]
+        key = lambda row: (row[column], row[0])
+        if after is not None:
+            if int(after) not in self._items:
+                raise ValueError('item {} does not exist'.format(after))
+            after_key = key(self._items[int(after)])
+            rows = [row for row in rows
+                    if (key(row) < after_key if reverse else key(row) > after_key)]
+        rows.sort(key=key, reverse=reverse)
+        return iter([ItemRow(*row) for row in rows[:limit]])
+
+    def search(self, query, is_done=None, order='rank', limit=None):
+        """
+        :returns: iterator of ItemRow with titles that contain all words
+        of `query`, ordered by pk.
+        """
+        self._read()
+        words = [word.rstrip('*').lower() for word in _decode(query).split()]
+        if not words:
+            return iter([])
+        rows = sorted(
+            row for row in self._rows()
+            if (is_done is None or row[3] == ('TRUE' if is_done else 'FALSE')) and
+            all(word in row[1].lower() for word in words))
+        return iter([ItemRow(*row) for row in rows[:limit]])
+
+    def count(self, root_pk=None):
+        from datetime import date, timedelta
+        self._read()
+        today = date.today()
+        yesterday = (today - timedelta(days=1)).strftime(DAY_FORMAT)
+        today = today.strftime(DAY_FORMAT)
+        rows = self._rows(root_pk)
+        done_days = [row[4] and row[4][:10] for row in rows if row[3] == 'TRUE']
+        return {
+            'done': len(done_days),
+            'total': len(rows),
+            'done_today': done_days.count(today),
+            'done_yesterday': done_days.count(yesterday),
+        }
+
+    def count_done_between(self, since=None, until=None, root_pk=None):
+        self._read()
+        since = since and since.strftime(DAY_FORMAT)
+        until = until and until.strftime(DAY_FORMAT)
+        return sum(1 for row in self._rows(root_pk)
+                   if row[3] == 'TRUE' and row[4] and
+                   (since is None or row[4][:10] >= since) and
+                   (until is None or row[4][:10] <= until))
+
+    def count_by_period(self, since=None, until=None, by='day'):
+        from datetime import datetime, timedelta
+        if by not in PERIOD_SQL:
+            raise ValueError('items can not be counted by {}'.format(by))
+        self._read()
+        since = since and since.strftime(DAY_FORMAT)
+        until = until and until.strftime(DAY_FORMAT)
+        counts = {}
+        for row in self._rows():
+            for index, time in enumerate((row[2], row[4] if row[3] == 'TRUE' else None)):
+                if not time:
+                    continue
+                day = time[:10]
+                if since is not None and day < since or until is not None and day > until:
+                    continue
+                if by == 'month':
+                    day = day[:7] + '-01'
+                elif by == 'week':
+                    day = datetime.strptime(day, DAY_FORMAT)
+                    day = (day - timedelta(days=day.weekday())).strftime(DAY_FORMAT)
+                counts.setdefault(day, [0, 0])[index] += 1
+        return [(day, added, done) for day, (added, done) in sorted(counts.iteritems())]
+
+    def tree_items(self, root_pk=None):
+        self._read()
+        rows = sorted((row for row in self._rows(root_pk) if row[3] == 'FALSE'),
+                      key=lambda row: row[5:7])
+        return iter([ItemRow(*row) for row in rows])
+
+    def revision(self):
+        """
+        :returns: None, items are read from the journal anyway, so the
+        rendered tree is not cached.
+        """
+        return None
+
+    def progress(self):
+        self._read()
+        rows = [(row[0], row[5], row[3] == 'TRUE') for row in self._rows()]
+        size = max([0] + [max(pk, parent_pk) for pk, parent_pk, is_done in rows]) + 1
+        return _count_subtrees(size, rows)
+
+    def import_items(self, records, parent_pk=0):
+        """
+        :returns: dictionary with counts, see insert_items().
+        """
+        import time
+        with self.transaction():
+            parent_pk = int(parent_pk)
+            if parent_pk not in self._items:
+                raise ValueError('parent item {} does not exist'.format(parent_pk))
+            now = time.strftime(DATE_FORMAT)
+            counts = {'added': 0, 'done': 0, 'skipped': 0, 'unresolved': 0}
+            # file ids mapped to pks, parents may follow their children
+            pks = {}
+            added = []
+            for number, record in enumerate(records, 1):
+                if not record.get('title'):
+                    counts['skipped'] += 1
+                    continue
+                pk = self._next_pk + len(added)
+                if record.get('id') not in (None, ''):
+                    pks[unicode(record['id'])] = pk
+                added.append((pk, record, _record_dates(record, number),
+                              record.get('line', number)))
+            parents = {}
+            for pk, record, dates, line in added:
+                parent = record.get('parent')
+                parents[pk] = parent_pk
+                if parent not in (None, ''):
+                    if unicode(parent) in pks:
+                        parents[pk] = pks[unicode(parent)]
+                    else:
+                        counts['unresolved'] += 1
+            # only parents that follow their children can make a cycle,
+            # it is among added items, as insert_items() finds it
+            for pk, record, dates, line in added:
+                if parents[pk] < pk:
+                    continue
+                seen = set()
+                ancestor_pk = parents[pk]
+                while ancestor_pk != pk and ancestor_pk in parents and ancestor_pk not in seen:
+                    seen.add(ancestor_pk)
+                    ancestor_pk = parents[ancestor_pk]
+                if ancestor_pk == pk:
+                    raise ValueError('line {}: parent {} makes a cycle'.format(
+                        line, record['parent']))
+            for pk, record, (added_at, done_at), line in added:
+                self._write('add', pk, parents[pk], added_at or now, _decode(record['title']))
+                counts['added'] += 1
+                if _is_done_value(record.get('is_done')) == 'TRUE':
+                    self._write('done', pk, done_at or now)
+                    counts['done'] += 1
+            return counts
+
+    def export(self, stream, file_format='jsonl', root_pk=None, is_done=None, since=None,
+               until=None):
+        from datetime import timedelta
+        self._read()
+        column = 4 if is_done else 2
+        since = since and since.strftime(DAY_FORMAT)
+        until = until and (until + timedelta(days=1)).strftime(DAY_FORMAT)
+
+        def exported(row):
+            return ((is_done is None or row[3] == ('TRUE' if is_done else 'FALSE')) and
+                    (since is None or row[column] is not None and row[column] >= since) and
+                    (until is None or row[column] is not None and row[column] < until))
+
+        def tree_rows():
+            # depth-first like EXPORT_TREE_SQL, from items with missing parents too
+            if root_pk is not None:
+                first = [int(root_pk)]
+            else:
+                first = list(self._children.get(0, []))
+                for parent_pk in sorted(self._children):
+                    if parent_pk not in self._items:
+                        first.extend(self._children[parent_pk])
+            stack = [(pk, 0) for pk in reversed(first) if pk in self._items]
+            seen = set()
+            while stack:
+                pk, depth = stack.pop()
+                if pk in seen:
+                    continue
+                seen.add(pk)
+                row = self._items[pk]
+                yield depth, row[0], row[5], row[1], row[3], row[2], row[4], exported(row)
+                stack.extend((child, depth + 1) for child in reversed(self._children.get(pk, ()))
+                             if child in self._items)
+
+        if file_format == 'todotxt':
+            rows = _exported_depths(tree_rows())
+        else:
+            rows = ((0, row[0], row[5], row[1], row[3], row[2], row[4])
+                    for row in sorted(self._rows(root_pk)) if exported(row))
+        EXPORT_WRITERS[file_format](rows, stream, root_pk)
+
+
+class _Output(object):
+    """
+    Collects what a command prints, unicode is encoded to UTF-8.
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, s):
+        if isinstance(s, unicode):
+            s = s.encode('utf-8')
+        self.parts.append(s)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return ''.join(self.parts)
+
+
+def _runs_locally(args):
+    """
+    :returns: True if command `args` can not be run by the server
+    because it reads from the terminal, or should not be because its output
+    grows with the database: the server would keep all of it in memory
+    and send it at once, here it is written while items are read.
+    """
+    if not args:
+        return False
+    if args[0] in ('serve', 'export'):
+        return True
+    if args[0] == 'log' and not any(arg == '--limit' or arg.startswith('--limit=')
+                                    for arg in args[1:]):
+        return True
+    if args[0] == 'delete' and '-y' not in args and '--yes' not in args:
+        return True
+    return args[0] == 'import' and '-' in args[1:]
+
+
+def _exit_status(e):
+    """
+    :returns: exit status of SystemExit `e`, its message is written to stderr.
+    """
+    if isinstance(e.code, basestring):
+        sys.stderr.write(e.code + '\n')
+        return 1
+    return e.code or 0
+
+
+def _run_command(args):
+    """
+    Runs command `args` (arguments without the program name) in this process.
+
+    :returns: (exit status, output, error output).
+    """
+    out, err = _Output(), _Output()
+    saved = sys.argv, sys.stdout, sys.stderr
+    sys.argv = ['p'] + list(args)
+    sys.stdout, sys.stderr = out, err
+    status = 0
+    try:
+        _dispatch(sys.argv[1] if len(sys.argv) > 1 else None)
+    except SystemExit, e:
+        status = _exit_status(e)
+    except Exception:
+        import traceback
+        traceback.print_exc(file=err)
+        status = 1
+    finally:
+        sys.argv, sys.stdout, sys.stderr = saved
+    return status, out.getvalue(), err.getvalue()
+
+
+def _serve_request(request, cache):
+    """
+    :returns: reply of the server to `request`, a dictionary with command
+    `args`, absolute path `db` of its database and working directory `cwd`
+    of the client. Commands for other databases or directories are run
+    by the client, so relative paths in arguments mean the same.
+
+    Output of CACHED_COMMANDS is kept in `cache` while data_version
+    (changed by commits of other connections) and total_changes
+    (changed by commits of this one) stay the same, up to SERVER_CACHE_SIZE
+    bytes. Commands with --all read other databases and are never cached.
+    """
+    if not isinstance(request, dict):
+        return {'local': True}
+    args = request.get('args') or []
+    if (request.get('db') != os.path.realpath(PROGRESS_DB_FILE_NAME) or
+            request.get('cwd') != os.getcwd() or
+            not os.path.exists(PROGRESS_DB_FILE_NAME) or _runs_locally(args)):
+        return {'local': True}
+    key = None
+    if ((not args or args[0].startswith('-') or args[0] in CACHED_COMMANDS) and
+            not any(arg == '--all' or arg.startswith('--all=') for arg in args)):
+        store = get_store()
+        version = (store.file_id,
+                   store.execute("PRAGMA data_version").fetchone()[0],
+                   store.con.total_changes)
+        if cache.get('version') != version:
+            cache.clear()
+            cache.update(version=version, size=0)
+        key = tuple(args)
+        if key in cache:
+            return cache[key]
+    status, output, errors = _run_command(args)
+    reply = {'status': status, 'stdout': output, 'stderr': errors}
+    size = len(output) + len(errors)
+    if key is not None and not status and size <= SERVER_CACHE_OUTPUT_SIZE:
+        if cache['size'] + size > SERVER_CACHE_SIZE:
+            cache.clear()
+            cache.update(version=version, size=0)
+        cache[key] = reply
+        cache['size'] += size
+    return reply
+
+
+def _receive(con):
+    """
+    :returns: everything read from socket `con` until the other side stops sending.
+    """
+    chunks = []
+    while True:
+        chunk = con.recv(65536)
+        if not chunk:
+            return ''.join(chunks)
+        chunks.append(chunk)
+
+
+def serve():
+    """
+    serve
+
+    Runs commands sent by `p` through SOCKET_FILE_NAME next to the database
+    in this process, so the interpreter, the module and the database
+    connection are loaded once. Stops on Ctrl-C or SIGTERM.
+    """
+    import json
+    import signal
+    import socket
+    _exit_if_journal('serve')
+    socket_file_name = _next_to_db(SOCKET_FILE_NAME)
+    if os.path.exists(socket_file_name):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_file_name)
+        except socket.error:
+            # left by a server that was killed
+            os.remove(socket_file_name)
+        else:
+            sys.stderr.write('Error: server is already running on {}\n'.format(socket_file_name))
+            sys.exit(1)
+        finally:
+            probe.close()
+    # the handler is set before the socket file exists, so it is always removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    cache = {}
+    bound = False
+    try:
+        server.bind(socket_file_name)
+        bound = True
+        server.listen(16)
+        print "Serving {} on {}".format(PROGRESS_DB_FILE_NAME, socket_file_name)
+        sys.stdout.flush()
+        while True:
+            con = server.accept()[0]
+            try:
+                request = json.loads(_receive(con))
+                con.sendall(json.dumps(_serve_request(request, cache)))
+            except (socket.error, ValueError):
+                pass
+            finally:
+                con.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        # a failed bind leaves the file of another server
+        if bound and os.path.exists(socket_file_name):
+            os.remove(socket_file_name)
+
+
+def _forward(args):
+    """
+    Sends command `args` to the server started with `p serve`
+    and prints its output.
+
+    :returns: exit status of the command or None if there is no server
+    or the command has to run in this process.
+    """
+    import json
+    import socket
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(_next_to_db(SOCKET_FILE_NAME))
+        client.sendall(json.dumps({
+            'args': args,
+            'db': os.path.realpath(PROGRESS_DB_FILE_NAME),
+            'cwd': os.getcwd(),
+        }))
+        client.shutdown(socket.SHUT_WR)
+        reply = _receive(client)
+    except socket.error:
+        return None
+    finally:
+        client.close()
+    try:
+        reply = json.loads(reply)
+    except ValueError:
+        return None
+    if reply.get('local'):
+        return None
+    sys.stdout.write(reply['stdout'].encode('utf-8'))
+    sys.stderr.write(reply['stderr'].encode('utf-8'))
+    return reply['status']
+
+
+Command = namedtuple('Command', 'function options needs_db')
+
+ALL_OPTION = (('--all',), dict(dest='all_root', metavar='DIR'))
+RECURSIVE_OPTION = (('-r', '--recursive'), dict(dest='recursive', default=False, action='store_true'))
+DEPTH_OPTION = (('--depth',), dict(dest='depth', type='int'))
+PROGRESS_OPTION = (('--progress',), dict(dest='progress', default=False, action='store_true'))
+
+# command name: function, its optparse options as (flags, keywords)
+# and whether the database is created before running it
+COMMANDS = {
+    'active': Command(active, [RECURSIVE_OPTION], True),
+    'add': Command(add, [
+        (('-t', '--title'), dict(dest='title')),
+        (('-p', '--parent'), dict(dest='parent_pk')),
+    ], True),
+    'count': Command(count, [
+        (('-r', '--root'), dict(dest='root_pk', type='int')),
+        (('--since',), dict(dest='since')),
+        (('--until',), dict(dest='until')),
+        (('--rebuild',), dict(dest='rebuild', default=False, action='store_true')),
+        ALL_OPTION,
+    ], True),
+    'delete': Command(delete, [
+        (('-y', '--yes'), dict(dest='confirmed', default=False, action='store_true')),
+    ], True),
+    'done': Command(done, [RECURSIVE_OPTION], True),
+    'edit': Command(edit, [(('-t', '--title'), dict(dest='title'))], True),
+    'export': Command(export, [
+        (('-f', '--format'), dict(dest='file_format', choices=sorted(EXPORT_WRITERS))),
+        (('--root',), dict(dest='root_pk', type='int')),
+        (('-d', '--done'), dict(dest='is_done', action='store_true')),
+        (('--open',), dict(dest='is_done', action='store_false')),
+        (('--since',), dict(dest='since')),
+        (('--until',), dict(dest='until')),
+        (('-o', '--output'), dict(dest='output')),
+    ], True),
+    'fsck': Command(fsck, [
+        (('--repair',), dict(dest='repair', default=False, action='store_true')),
+    ], True),
+    'help': Command(help, [], False),
+    'import': Command(import_file, [
+        (('-f', '--format'), dict(dest='file_format', choices=IMPORT_READERS.keys())),
+        (('-p', '--parent'), dict(dest='parent_pk', type='int', default=0)),
+    ], True),
+    'log': Command(log, [
+        (('-d',), dict(dest='print_done', default=False, action='store_true')),
+        (('--order',), dict(dest='order', default='pk', choices=ORDER_COLUMNS)),
+        (('-r', '--reverse'), dict(dest='reverse', default=False, action='store_true')),
+        (('--limit',), dict(dest='limit', type='int')),
+        (('--after',), dict(dest='after', type='int')),
+        ALL_OPTION,
+    ], True),
+    'move': Command(move, [(('-p', '--parent'), dict(dest='new_parent_pk'))], True),
+    'search': Command(search, [
+        (('-d', '--done'), dict(dest='is_done', action='store_true')),
+        (('-o', '--open'), dict(dest='is_done', action='store_false')),
+        (('--order',), dict(dest='order', default='rank', choices=['rank', 'pk'])),
+        (('--limit',), dict(dest='limit', type='int')),
+    ], True),
+    'serve': Command(serve, [], False),
+    'stats': Command(stats, [
+        (('--since',), dict(dest='since')),
+        (('--until',), dict(dest='until')),
+        (('--by',), dict(dest='by', default='day', choices=sorted(PERIOD_SQL))),
+        (('--format',), dict(dest='format', default='table', choices=STATS_FORMATS)),
+        (('-o', '--output'), dict(dest='output')),
+    ], True),
+    'show': Command(show, [DEPTH_OPTION, PROGRESS_OPTION], True),
+    'tree': Command(tree, [
+        DEPTH_OPTION,
+        PROGRESS_OPTION,
+        (('--root',), dict(dest='root_pk', type='int')),
+    ], True),
+    'version': Command(version, [], False),
+}
+
+COMMAND_ALIASES = {
+    '-h': 'help',
+    '--help': 'help',
+    '-help': 'help',
+    '-v': 'version',
+    '--version': 'version',
+}
+
+_parsers = {}
+
+
+def _parse_args(name, args=None):
+    """
+    :returns: (options, arguments) of command `name` parsed from `args`,
+    sys.argv after the command by default.
+
+    The parser is built from COMMANDS once per process.
+    """
+    parser = _parsers.get(name)
+    if parser is None:
+        from optparse import OptionParser
+        parser = OptionParser()
+        for flags, keywords in COMMANDS[name].options:
+            parser.add_option(*flags, **keywords)
+        _parsers[name] = parser
+    return parser.parse_args(sys.argv[2:] if args is None else args)
+
+
+def _get_command(name):
+    """
+    :returns: Command `name`, `tree` for unknown names and options
+    given without a command.
+    """
+    name = COMMAND_ALIASES.get(name, name)
+    return COMMANDS.get(name, COMMANDS['tree'])
+
+
+def _dispatch(command):
+    """
+    Runs `command` with arguments from sys.argv.
+    """
+    _get_command(command).function()
+
+
+def _profile(function, dump_file_name=None):
+    """
+    Runs `function` collecting time of its statements and phases,
+    the report is written to stderr.
+
+    If `dump_file_name` is given cProfile statistics are saved to it.
+    """
+    global _profiler
+    _profiler = _Profiler()
+    stdout = sys.stdout
+    sys.stdout = _TimedOutput(stdout, _profiler)
+    profile = None
+    if dump_file_name:
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+    try:
+        with _profiler.phase('total'):
+            function()
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(dump_file_name)
+        sys.stdout = stdout
+        _profiler.report(sys.stderr)
+        _profiler = None
+
+
+def _profile_option():
+    """
+    Removes --profile[=FILE] from sys.argv.
+
+    :returns: FILE, '1' if the option has no file, value of
+    PROFILE_ENVIRONMENT_VARIABLE if there is no option.
+    """
+    value = os.environ.get(PROFILE_ENVIRONMENT_VARIABLE, '')
+    for arg in sys.argv[1:]:
+        if arg == '--profile' or arg.startswith('--profile='):
+            sys.argv.remove(arg)
+            value = arg.partition('=')[2] or '1'
+    return '' if value == '0' else value
+
+
+def _db_option():
+    """
+    Removes --db PATH (or --db=PATH) from sys.argv and makes PATH
+    the database of the command.
+    """
+    global PROGRESS_DB_FILE_NAME
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg == '--db' and i + 1 < len(args):
+            PROGRESS_DB_FILE_NAME = args[i + 1]
+            del sys.argv[i + 1:i + 3]
+            return
+        if arg.startswith('--db='):
+            PROGRESS_DB_FILE_NAME = arg.partition('=')[2]
+            del sys.argv[i + 1]
+            return
+
+
+def main(argv=None, stdout=None, stdin=None, stderr=None):
+    """
+    Runs command `argv` (arguments after the program name, from sys.argv
+    by default) with `stdout`, `stdin` and `stderr` instead of the ones of sys.
+
+    :returns: exit status of the command. main() may be called many times
+    in one process, the database connection is kept between the calls.
+    """
+    global PROGRESS_DB_FILE_NAME
+    saved = sys.argv, sys.stdout, sys.stdin, sys.stderr, PROGRESS_DB_FILE_NAME
+    sys.argv = sys.argv[:1] or ['p']
+    sys.argv += saved[0][1:] if argv is None else list(argv)
+    sys.stdout = stdout or sys.stdout
+    sys.stdin = stdin or sys.stdin
+    sys.stderr = stderr or sys.stderr
+    try:
+        _db_option()
+        profile = _profile_option()
+        if profile:
+            _profile(_main, None if profile == '1' else profile)
+        else:
+            _main()
+    except SystemExit, e:
+        return _exit_status(e)
+    finally:
+        sys.argv, sys.stdout, sys.stdin, sys.stderr, PROGRESS_DB_FILE_NAME = saved
+    return 0
+
+
+def _main():
+    # commands are run by the server if it is started, profiled ones run here
+    if (os.path.exists(_next_to_db(SOCKET_FILE_NAME)) and not _runs_locally(sys.argv[1:]) and
+            _profiler is None):
+        status = _forward(sys.argv[1:])
+        if status is not None:
+            if status:
+                sys.exit(status)
+            return
+
+    args = sys.argv
+    command = None
+    if len(args) > 1:
+        command = args[1]
+
+    # check if db exists and create it if confirmed,
+    # commands with --all read databases found under a directory
+    if (_get_command(command).needs_db and not os.path.exists(PROGRESS_DB_FILE_NAME) and
+            not any(arg == '--all' or arg.startswith('--all=') for arg in args[2:])):
+        sys.stdout.write(
+            "{0} does not exist. Create? y/n [n] ".format(
+                PROGRESS_DB_FILE_NAME))
+        choice = raw_input().lower()
+        if choice == '' or choice == 'n':
+            return
+        get_progress_store()
+        print "created %s file" % PROGRESS_DB_FILE_NAME
 
-    show_items()
+    _dispatch(command)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import unittest
+
+import os
+import sys
+from StringIO import StringIO
+
+sys.path.insert(0, "..")
+
+from progressio.progressio import (
+    ProgressStore, main, get_item, iter_items, search_items, PROGRESS_DB_FILE_NAME)
+
+
+class TestProgressStore(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+        self.progress = ProgressStore()
+
+    def tearDown(self):
+        self.progress.close()
+
+    def test_items(self):
+        project = self.progress.add('project')
+        task = self.progress.add('task', parent_pk=project.pk)
+        self.progress.add('other task', parent_pk=project.pk)
+        self.assertEqual((project.pk, task.pk, task.parent_pk), (1, 2, 1))
+        self.assertEqual(self.progress.get(1).children, [2, 3])
+        self.assertEqual(self.progress.done('2-3'), 2)
+        self.assertEqual(self.progress.active([3]), 1)
+        self.progress.edit(3, 'renamed task')
+        self.assertEqual([item.title for item in self.progress.items()],
+                         ['project', 'renamed task'])
+        self.assertEqual([item.pk for item in self.progress.items(is_done=True)], [2])
+        self.assertEqual([item.pk for item in self.progress.search('renamed')], [3])
+        self.assertEqual(self.progress.move(3, 0), 1)
+        self.assertEqual(self.progress.get(0).children, [1, 3])
+        counts = self.progress.count()
+        self.assertEqual((counts['done'], counts['total']), (1, 3))
+        done, total = self.progress.progress()
+        self.assertEqual((done[1], total[1]), (1, 1))
+        self.assertEqual(self.progress.delete('1-2'), 2)
+        self.assertEqual(self.progress.get(1), None)
+
+    def test_errors(self):
+        self.progress.add('project')
+        self.progress.add('task', parent_pk=1)
+        self.assertRaises(ValueError, self.progress.add, 'task', 5)
+        self.assertRaises(ValueError, self.progress.edit, 5, 'title')
+        self.assertRaises(ValueError, self.progress.move, 1, 2)
+        self.assertRaises(ValueError, self.progress.done, 'first')
+        self.assertRaises(ValueError, self.progress.done, [])
+
+    def test_transaction(self):
+        with self.progress.transaction():
+            for i in range(1000):
+                self.progress.add('item {}'.format(i))
+        self.assertEqual(self.progress.count()['total'], 1000)
+        try:
+            with self.progress.transaction():
+                self.progress.add('item')
+                self.progress.add('task', parent_pk=2000)
+        except ValueError:
+            pass
+        self.assertEqual(self.progress.count()['total'], 1000)
+
+    def test_database_file(self):
+        with ProgressStore('progress.other.db') as other:
+            other.add('other item')
+        with ProgressStore('progress.other.db') as other:
+            self.assertEqual([item.title for item in other.items()], ['other item'])
+        self.assertEqual(list(self.progress.items()), [])
+
+    def test_children_are_read_from_the_store_of_items(self):
+        self.progress.add('project')
+        self.progress.add('task', parent_pk=1)
+        with ProgressStore('progress.other.db') as other:
+            other.add('other project')
+            self.assertEqual(get_item(1, other.store).children, [])
+            self.assertEqual([item.children for item in iter_items(store=other.store)], [[]])
+            self.assertEqual([item.children for item in search_items('other', store=other.store)],
+                             [[]])
+
+
+class TestMain(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+
+    def run_main(self, argv, stdin=''):
+        stdout, stderr = StringIO(), StringIO()
+        status = main(argv, stdout, StringIO(stdin), stderr)
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def test_commands_in_one_process(self):
+        status, output, errors = self.run_main(['add', '-t', 'project'], stdin='y\n')
+        self.assertEqual(status, 0)
+        self.assertTrue(output.endswith('created progress.db file\nAdded item:\n1 - project\n'))
+        for i in range(100):
+            self.assertEqual(self.run_main(['add', '-t', 'task', '-p', '1'])[0], 0)
+        self.assertEqual(self.run_main(['done', '2-50'])[0], 0)
+        status, output, errors = self.run_main(['count'])
+        self.assertEqual(output.splitlines()[:2], ['done: 49', 'total items: 101'])
+        status, output, errors = self.run_main(['delete', '60-101'], stdin='y\n')
+        self.assertTrue(output.endswith('Deleted items 60-101 (42 found)\n'))
+        self.assertEqual(self.run_main(['--depth', '1']), (0, '1 - project\n', ''))
+
+    def test_failing_command_keeps_stdin_open(self):
+        stdin = sys.stdin
+        sys.stdin = StringIO('y\n')
+        try:
+            self.assertEqual(main(['add'], StringIO(), stderr=StringIO()), 1)
+            self.assertFalse(sys.stdin.closed)
+            self.assertEqual(main(['add', '-t', 'project'], StringIO(), stderr=StringIO()), 0)
+        finally:
+            sys.stdin = stdin
+
+    def test_errors_and_state_are_restored(self):
+        stdout, argv = sys.stdout, list(sys.argv)
+        self.assertEqual(self.run_main(['--db', 'progress.other.db', 'add', '-t', 'a'],
+                                       stdin='y\n')[0], 0)
+        self.assertEqual(self.run_main(['edit', '5', '-t', 'b'], stdin='y\n'),
+                         (1, 'progress.db does not exist. Create? y/n [n] '
+                             'created progress.db file\n',
+                          'Error: item 5 does not exist\n'))
+        self.assertEqual(self.run_main(['log', '--order', 'title'])[0], 2)
+        self.assertIs(sys.stdout, stdout)
+        self.assertEqual(sys.argv, argv)
+        from progressio import progressio
+        self.assertEqual(progressio.PROGRESS_DB_FILE_NAME, PROGRESS_DB_FILE_NAME)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+
+import os
+import sys
+import time
+import sqlite3
+import subprocess
+
+sys.path.insert(0, "..")
+
+from progressio.progressio import (
+    add, count_items, get_children_pks, rebuild_counters, get_store,
+    PROGRESS_DB_FILE_NAME)
+
+WORKERS = 8
+ITEMS_PER_WORKER = 25
+
+# adds items to parent 1 and moves every fifth to parent 2 and back
+WORKER_SCRIPT = """
+import sys
+sys.path.insert(0, '..')
+from progressio.progressio import add, move, done, get_store
+stdout, sys.stdout = sys.stdout, open('/dev/null', 'w')
+for i in range({items}):
+    title = 'worker %s item %s' % (sys.argv[1], i)
+    add(title, parent_pk=1)
+    if i % 5 == 0:
+        pk = get_store().execute("SELECT pk FROM item WHERE title=?", (title,)).fetchone()[0]
+        move([pk], 2)
+        move([pk], 1)
+        done([pk])
+""".format(items=ITEMS_PER_WORKER)
+
+
+class TestConcurrency(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+        add('parent')
+        add('other parent')
+
+    def test_parallel_adds_are_not_lost(self):
+        workers = [
+            subprocess.Popen([sys.executable, '-c', WORKER_SCRIPT, str(n)],
+                             stderr=subprocess.PIPE)
+            for n in range(WORKERS)]
+        for worker in workers:
+            errors = worker.stderr.read()
+            self.assertEqual(worker.wait(), 0, errors)
+        children = get_children_pks(1)
+        self.assertEqual(len(children), WORKERS * ITEMS_PER_WORKER)
+        positions = get_store().execute(
+            "SELECT COUNT(DISTINCT position) FROM item WHERE parent_pk=1").fetchone()[0]
+        self.assertEqual(positions, WORKERS * ITEMS_PER_WORKER)
+        counts = count_items()
+        rebuild_counters()
+        self.assertEqual(count_items(), counts)
+        self.assertEqual(counts['total'], WORKERS * ITEMS_PER_WORKER + 2)
+        self.assertEqual(counts['done'], WORKERS * ITEMS_PER_WORKER / 5)
+
+    def test_add_waits_for_lock(self):
+        """
+        A command waits while another connection writes.
+        """
+        con = sqlite3.connect(PROGRESS_DB_FILE_NAME, isolation_level=None)
+        con.execute("BEGIN IMMEDIATE")
+        p = subprocess.Popen(
+            "../progressio/progressio.py add -t waiting",
+            shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        time.sleep(0.5)
+        self.assertEqual(p.poll(), None)
+        con.execute("COMMIT")
+        con.close()
+        output, errors = p.communicate()
+        self.assertEqual(p.returncode, 0, errors)
+        self.assertEqual(output, 'Added item:\n3 - waiting\n')
+
+    def test_busy_timeout_is_configurable(self):
+        con = sqlite3.connect(PROGRESS_DB_FILE_NAME, isolation_level=None)
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            env = dict(os.environ, PROGRESSIO_BUSY_TIMEOUT='0.1')
+            p = subprocess.Popen(
+                "../progressio/progressio.py done 1", shell=True, env=env,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            output, errors = p.communicate()
+        finally:
+            con.execute("ROLLBACK")
+            con.close()
+        self.assertIn('Database error: database is locked', output)
+
+
+if __name__ == '__main__':
+    unittest.main()
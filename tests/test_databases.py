@@ -0,0 +1,110 @@
+import unittest
+
+import os
+import sys
+import shutil
+import sqlite3
+import subprocess
+
+sys.path.insert(0, "..")
+
+from progressio.progressio import find_databases, map_databases, count_items
+
+P = "../progressio/progressio.py"
+
+
+def p(args):
+    return subprocess.check_output(P + " " + args, stderr=subprocess.STDOUT, shell=True)
+
+
+class TestDatabases(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        Adds databases:
+
+        repos/first/progress.db: 1 - one (done), 2 - two
+        repos/second/nested/progress.db: 1 - three
+        repos/.git/progress.db is hidden
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+        if os.path.exists('repos'):
+            shutil.rmtree('repos')
+        for directory in ['repos/first', 'repos/second/nested', 'repos/.git']:
+            os.makedirs(directory)
+        subprocess.check_output("echo y | " + P + " --db repos/first/progress.db add -t one",
+                                shell=True)
+        p("--db repos/first/progress.db add -t two")
+        p("--db=repos/first/progress.db done 1")
+        subprocess.check_output(
+            "echo y | " + P + " add --db repos/second/nested/progress.db -t three", shell=True)
+        con = sqlite3.connect('repos/second/nested/progress.db')
+        con.execute("UPDATE item SET added_at='2100-01-01 00:00:00' WHERE pk=1")
+        con.commit()
+        con.close()
+        shutil.copy('repos/first/progress.db', 'repos/.git/progress.db')
+
+    def tearDown(self):
+        shutil.rmtree('repos')
+
+    def test_db_option(self):
+        self.assertFalse(os.path.exists('progress.db'))
+        self.assertEqual(p("--db repos/first/progress.db"), "2 - two\n")
+        self.assertTrue(os.path.exists('repos/first/progress.db.tree.cache'))
+        self.assertFalse(os.path.exists('progress.db'))
+
+    def test_find_and_map_databases(self):
+        file_names = find_databases('repos')
+        self.assertEqual(file_names, ['repos/first/progress.db',
+                                      'repos/second/nested/progress.db'])
+        results = map_databases(lambda store: count_items(store=store)['total'],
+                                file_names + ['repos/missing/progress.db'])
+        self.assertEqual(results[:2], [('repos/first/progress.db', 2, None),
+                                       ('repos/second/nested/progress.db', 1, None)])
+        self.assertEqual(results[2][:2], ('repos/missing/progress.db', None))
+        self.assertTrue(results[2][2])
+
+    def test_count_all(self):
+        lines = p("count --all repos").splitlines()
+        self.assertEqual(lines[0].split(), ['done', 'total', 'today', 'yesterday', 'database'])
+        self.assertEqual([line.split() for line in lines[1:]], [
+            ['1', '2', '1', '0', 'first'],
+            ['0', '1', '0', '0', 'second/nested'],
+            ['1', '3', '1', '0', 'total'],
+        ])
+        self.assertFalse(os.path.exists('progress.db'))
+
+    def test_old_databases_are_not_upgraded(self):
+        """
+        --all only reads databases, older ones are skipped.
+        """
+        os.mkdir('repos/old')
+        con = sqlite3.connect('repos/old/progress.db')
+        con.execute("CREATE TABLE item(" +
+                    "pk INTEGER PRIMARY KEY, children, title, added_at, is_done, done_at)")
+        con.execute("INSERT INTO item(pk, children, title, is_done) values(0, '', 'root', 1)")
+        con.commit()
+        con.close()
+        with open('repos/old/progress.db', 'rb') as f:
+            old = f.read()
+        process = subprocess.Popen(P + " count --all repos", shell=True,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, errors = process.communicate()
+        self.assertEqual(output.splitlines()[-1].split(), ['1', '3', '1', '0', 'total'])
+        self.assertTrue(errors.startswith('Error: repos/old/progress.db: skipped'))
+        self.assertEqual(sorted(os.listdir('repos/old')), ['progress.db'])
+        with open('repos/old/progress.db', 'rb') as f:
+            self.assertEqual(f.read(), old)
+
+    def test_log_all(self):
+        self.assertEqual(p("log --all repos"),
+                         "print done: False\nfirst: 2 - two\nsecond/nested: 1 - three\n")
+        self.assertEqual(p("log --all repos --order added_at -r --limit 1"),
+                         "print done: False\nsecond/nested: 1 - three\n")
+        self.assertEqual(p("log -d --all repos"), "print done: True\nfirst: 1 - one\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -63,6 +63,25 @@ class TestDelete(unittest.TestCase):
         # item is in database
         self.assertFalse(get_item(1) is None)
 
+    def test_range_is_deleted_after_one_confirmation(self):
+        # create progress.db
+        p = subprocess.Popen('../progressio/progressio.py', stdin=subprocess.PIPE)
+        p.communicate('y\n')
+
+        for n in range(4):
+            add('item {} to be deleted'.format(n))
+
+        p = subprocess.Popen(
+            '../progressio/progressio.py delete 1-3',
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            shell=True)
+        output = p.communicate('y\n')[0]
+        self.assertEqual(output.count('Do you really want'), 1)
+        self.assertTrue("Deleted items 1-3 (3 found)" in output)
+        self.assertTrue(get_item(3) is None)
+        self.assertFalse(get_item(4) is None)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -5,7 +5,7 @@ import sys
 
 sys.path.insert(0, "..")
 
-from progressio.progressio import add, load_items, done, get_item
+from progressio.progressio import add, load_items, done, get_item, parse_pks
 
 
 class TestDone(unittest.TestCase):
@@ -26,6 +26,21 @@ class TestDone(unittest.TestCase):
         i = get_item(pk)
         self.assertEqual(i.is_done, 'TRUE')
 
+    def test_done_list_and_ranges(self):
+        """
+        Several items and ranges of items are marked as done at once.
+        """
+        for n in range(6):
+            add('step {}'.format(n))
+        done(['1', '3-4', '6'])
+        self.assertEqual([i.pk for i in load_items()], [2, 5])
+        self.assertEqual(get_item(4).is_done, 'TRUE')
+
+    def test_parse_pks(self):
+        self.assertEqual(parse_pks(['12', '15,20-40']), [(12, 12), (15, 15), (20, 40)])
+        self.assertRaises(ValueError, parse_pks, ['40-20'])
+        self.assertRaises(ValueError, parse_pks, ['a'])
+
 
 if __name__ == '__main__':
     unittest.main()
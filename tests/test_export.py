@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import os
+import sys
+import json
+import time
+import subprocess
+from StringIO import StringIO
+
+sys.path.insert(0, "..")
+
+from progressio.progressio import (
+    get_item, export_items, insert_items, read_csv, read_jsonl,
+    read_todotxt)
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        Adds tree:
+
+        1 - project
+            2 - task (done)
+                3 - subtask
+            4 - another task
+        5 - other project
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+        insert_items([
+            {'id': 1, 'title': 'project'},
+            {'id': 2, 'parent': 1, 'title': u'task ✓', 'is_done': True},
+            {'id': 3, 'parent': 2, 'title': 'subtask'},
+            {'id': 4, 'parent': 1, 'title': 'another task'},
+            {'id': 5, 'title': 'other project'},
+        ])
+
+    def tearDown(self):
+        if os.path.exists('items.csv'):
+            os.remove('items.csv')
+
+    def export(self, *args, **kwargs):
+        stream = StringIO()
+        export_items(stream, *args, **kwargs)
+        return stream.getvalue()
+
+    def test_jsonl(self):
+        records = [json.loads(line) for line in self.export('jsonl').splitlines()]
+        self.assertEqual([record['id'] for record in records], [1, 2, 3, 4, 5])
+        self.assertEqual([record['parent'] for record in records], [None, 1, 2, 1, None])
+        self.assertEqual(records[1]['title'], u'task ✓')
+        self.assertEqual(records[1]['is_done'], True)
+        self.assertEqual(records[0]['done_at'], None)
+
+    def test_formats_are_imported_back(self):
+        for file_format, reader in [('jsonl', read_jsonl), ('csv', read_csv),
+                                    ('todotxt', read_todotxt)]:
+            lines = StringIO(self.export(file_format, root_pk=1))
+            insert_items(reader(lines), parent_pk=5)
+        # every import adds a copy of project with its 3 subitems
+        self.assertEqual(get_item(5).children, [6, 10, 14])
+        for pk in 6, 10, 14:
+            project = get_item(pk)
+            self.assertEqual(project.title, 'project')
+            self.assertEqual(len(project.children), 2)
+            task = get_item(project.children[0])
+            self.assertEqual(task.title, u'task ✓')
+            self.assertTrue(task.is_done)
+            self.assertEqual(get_item(task.children[0]).title, 'subtask')
+
+    def test_todotxt_keeps_tree_order(self):
+        day = time.strftime('%Y-%m-%d')
+        self.assertEqual(self.export('todotxt').decode('utf-8').splitlines(), [
+            day + ' project',
+            '    x {0} {0} task ✓'.format(day).decode('utf-8'),
+            '        {} subtask'.format(day),
+            '    {} another task'.format(day),
+            day + ' other project',
+        ])
+
+    def test_todotxt_depth_of_filtered_items(self):
+        day = time.strftime('%Y-%m-%d')
+        # subtask is indented under project, task is done and left out
+        self.assertEqual(self.export('todotxt', is_done=False).splitlines(), [
+            day + ' project',
+            '    {} subtask'.format(day),
+            '    {} another task'.format(day),
+            day + ' other project',
+        ])
+        lines = StringIO(self.export('todotxt', is_done=False, root_pk=1))
+        insert_items(read_todotxt(lines))
+        self.assertEqual(get_item(6).children, [7, 8])
+
+    def test_todotxt_items_with_missing_parent(self):
+        import sqlite3
+        con = sqlite3.connect('progress.db')
+        con.execute("DELETE FROM item WHERE pk=1")
+        con.commit()
+        con.close()
+        day = time.strftime('%Y-%m-%d')
+        self.assertEqual(self.export('todotxt').decode('utf-8').splitlines(), [
+            'x {0} {0} task ✓'.format(day).decode('utf-8'),
+            '    {} subtask'.format(day),
+            '{} another task'.format(day),
+            day + ' other project',
+        ])
+
+    def test_filters(self):
+        records = [json.loads(line) for line in self.export('jsonl', is_done=False).splitlines()]
+        self.assertEqual([record['id'] for record in records], [1, 3, 4, 5])
+        records = [json.loads(line) for line in self.export('jsonl', is_done=True).splitlines()]
+        self.assertEqual([record['id'] for record in records], [2])
+        records = [json.loads(line) for line in self.export('jsonl', root_pk=2).splitlines()]
+        self.assertEqual([(record['id'], record['parent']) for record in records],
+                         [(2, None), (3, 2)])
+
+    def test_command(self):
+        subprocess.check_output(
+            "../progressio/progressio.py export --open --root 1 -o items.csv", shell=True)
+        with open('items.csv') as f:
+            self.assertEqual([row['id'] for row in read_csv(f)], ['1', '3', '4'])
+        output = subprocess.check_output(
+            "../progressio/progressio.py export -f todotxt -d --until 2000-01-01", shell=True)
+        self.assertEqual(output, '')
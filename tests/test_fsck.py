@@ -0,0 +1,133 @@
+import unittest
+
+import os
+import sys
+import sqlite3
+import subprocess
+
+sys.path.insert(0, "..")
+
+from progressio.progressio import (
+    add, move, check_items, get_item, get_children_pks, count_items,
+    PROGRESS_DB_FILE_NAME, ProgressStore)
+
+
+def execute(*queries):
+    """
+    Changes the database bypassing progressio.
+    """
+    con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
+    for query in queries:
+        con.execute(query)
+    con.commit()
+    con.close()
+
+
+class TestFsck(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        Adds tree:
+
+        1 - project
+            2 - task
+                3 - subtask
+            4 - another task
+        5 - other project
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+        add('project')
+        add('task', parent_pk=1)
+        add('subtask', parent_pk=2)
+        add('another task', parent_pk=1)
+        add('other project')
+
+    def test_no_problems(self):
+        self.assertEqual(check_items(), [])
+        output = subprocess.check_output(
+            "../progressio/progressio.py fsck", stderr=subprocess.STDOUT, shell=True)
+        self.assertEqual(output, 'No problems found.\n')
+
+    def test_other_database(self):
+        with ProgressStore('progress.other.db') as progress:
+            progress.add('project')
+            progress.store.execute("UPDATE item SET parent_pk=1 WHERE pk=1")
+            self.assertEqual(len(check_items(store=progress.store)), 1)
+            check_items(repair=True, store=progress.store)
+            self.assertEqual(check_items(store=progress.store), [])
+            self.assertEqual(progress.get(0).children, [1])
+        self.assertEqual(check_items(), [])
+
+    def test_dangling_parent_and_cycle(self):
+        execute(
+            "DELETE FROM item WHERE pk=2",
+            "UPDATE item SET parent_pk=4 WHERE pk=1",
+        )
+        self.assertEqual(check_items(), [
+            'items 1, 4 form a cycle',
+            'item 3: parent 2 does not exist',
+        ])
+        p = subprocess.Popen(
+            "../progressio/progressio.py fsck", shell=True, stdout=subprocess.PIPE)
+        output = p.communicate()[0]
+        self.assertEqual(p.returncode, 1)
+        self.assertTrue(output.endswith('Found 2 problems, run `p fsck --repair` to fix them.\n'))
+        # nothing is changed without repair
+        self.assertEqual(get_item(1).parent_pk, 4)
+
+        check_items(repair=True)
+        self.assertEqual(get_children_pks(0), [5, 1, 3])
+        self.assertEqual(get_children_pks(1), [4])
+        self.assertEqual(check_items(), [])
+
+    def test_duplicate_positions_and_counters(self):
+        execute(
+            "UPDATE item SET position=0 WHERE parent_pk=1",
+            "UPDATE counters SET value=100 WHERE name='total'",
+        )
+        self.assertEqual(check_items(), [
+            'item 1: children have the same positions',
+            'counters of items are out of date',
+        ])
+        output = subprocess.check_output(
+            "../progressio/progressio.py fsck --repair", stderr=subprocess.STDOUT, shell=True)
+        self.assertTrue(output.endswith('Repaired 2 problems.\n'))
+        self.assertEqual(get_children_pks(1), [2, 4])
+        self.assertEqual(count_items()['total'], 5)
+        self.assertEqual(check_items(), [])
+
+    def test_search_index(self):
+        execute(
+            "INSERT INTO item_fts(item_fts, rowid, title) VALUES ('delete', 5, 'other project')")
+        self.assertEqual(check_items(), ['search index does not match titles'])
+        check_items(repair=True)
+        self.assertEqual(check_items(), [])
+
+    def test_delete_keeps_subitems(self):
+        subprocess.check_output("../progressio/progressio.py delete -y 1", shell=True)
+        self.assertEqual(get_children_pks(0), [5, 2, 4])
+        self.assertEqual(get_children_pks(2), [3])
+        self.assertEqual(count_items(0)['total'], 4)
+        self.assertEqual(check_items(), [])
+        subprocess.check_output("../progressio/progressio.py delete -y 2 5", shell=True)
+        self.assertEqual(get_children_pks(0), [4, 3])
+        self.assertEqual(check_items(), [])
+
+    def test_move_does_not_make_cycles(self):
+        p = subprocess.Popen(
+            "../progressio/progressio.py move 1 -p 3", shell=True,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, errors = p.communicate()
+        self.assertEqual(p.returncode, 1)
+        self.assertEqual(errors, 'Error: item 3 is a subitem of moved items\n')
+        self.assertEqual(get_item(1).parent_pk, 0)
+        # the new parent itself is skipped if it is among moved items
+        move(['4-5'], 4)
+        self.assertEqual(get_item(5).parent_pk, 4)
+        self.assertEqual(check_items(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+
+import os
+import sys
+import subprocess
+
+sys.path.insert(0, "..")
+
+from progressio.progressio import (
+    add, get_item, load_items, insert_items, read_todotxt,
+    _create_db_if_needed)
+
+
+class TestImport(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+        _create_db_if_needed()
+
+    def tearDown(self):
+        for f in ['items.txt', 'items.csv', 'items.jsonl']:
+            if os.path.exists(f):
+                os.remove(f)
+
+    def test_import_todotxt(self):
+        """
+        Indented lines become children, lines with `x` are done.
+        """
+        with open('items.txt', 'w') as f:
+            f.write(
+                "first\n"
+                "    child of first\n"
+                "        grandchild\n"
+                "x 2014-01-07 2014-01-01 done second\n"
+            )
+        output = subprocess.check_output(
+            '../progressio/progressio.py import items.txt',
+            stderr=subprocess.STDOUT,
+            shell=True)
+        self.assertTrue("Imported 4 items (1 done) from items.txt." in output)
+        self.assertEqual(get_item(1).children, [2])
+        self.assertEqual(get_item(2).children, [3])
+        self.assertEqual(get_item(0).children, [1, 4])
+        self.assertEqual(get_item(4).is_done, 'TRUE')
+        self.assertEqual(get_item(4).done_at, '2014-01-07 00:00:00')
+        self.assertEqual(get_item(4).added_at, '2014-01-01 00:00:00')
+
+    def test_import_csv_with_forward_parent(self):
+        """
+        Parents may be listed after their children.
+        """
+        with open('items.csv', 'w') as f:
+            f.write(
+                "id,parent,title,is_done\n"
+                "a,b,child,FALSE\n"
+                "b,,parent,FALSE\n"
+                "c,b,second child,TRUE\n"
+            )
+        output = subprocess.check_output(
+            '../progressio/progressio.py import items.csv',
+            stderr=subprocess.STDOUT,
+            shell=True)
+        self.assertTrue("Imported 3 items (1 done) from items.csv." in output)
+        self.assertEqual(get_item(2).children, [3, 1])
+
+    def test_import_jsonl_under_parent(self):
+        add('existing')
+        with open('items.jsonl', 'w') as f:
+            f.write(
+                '{"id": 1, "title": "imported"}\n'
+                '{"id": 2, "parent": 1, "title": "imported child"}\n'
+            )
+        subprocess.check_output(
+            '../progressio/progressio.py import -p 1 items.jsonl',
+            stderr=subprocess.STDOUT,
+            shell=True)
+        self.assertEqual(get_item(1).children, [2])
+        self.assertEqual(get_item(2).children, [3])
+        self.assertEqual(get_item(3).title, 'imported child')
+
+    def test_import_output_of_show(self):
+        """
+        Output of `p` can be imported back.
+        """
+        counts = insert_items(read_todotxt([
+            "1 - first\n",
+            "    3 - child\n",
+            "2 - second\n",
+        ]))
+        self.assertEqual(counts['added'], 3)
+        self.assertEqual(
+            [str(i) for i in load_items()],
+            ['1 - first', '2 - child', '3 - second'])
+        self.assertEqual(get_item(1).children, [2])
+
+    def test_unknown_dates_are_refused(self):
+        """
+        Nothing is imported if a date has an unknown format.
+        """
+        with open('items.csv', 'w') as f:
+            f.write(
+                "id,title,added_at\n"
+                "a,first,2014-01-07\n"
+                "b,second,03/04/2020\n"
+            )
+        p = subprocess.Popen('../progressio/progressio.py import items.csv', shell=True,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, errors = p.communicate()
+        self.assertEqual(p.returncode, 1)
+        self.assertEqual(errors, 'Error: line 3: unknown date "03/04/2020", ' +
+                         'expected YYYY-MM-DD or YYYY-MM-DD HH:MM:SS\n')
+        self.assertEqual(load_items(), [])
+        self.assertRaises(ValueError, insert_items, [{'title': 'a', 'done_at': 'yesterday'}])
+        insert_items([{'title': 'old', 'added_at': 'Sun Oct 18 15:00:00 2015 EEST'}])
+        self.assertEqual(get_item(1).added_at, '2015-10-18 15:00:00')
+
+    def test_parents_in_cycle_are_refused(self):
+        for records in [
+                [{'id': 'a', 'parent': 'b', 'title': 'A'}, {'id': 'b', 'parent': 'a', 'title': 'B'}],
+                [{'id': 'a', 'parent': 'a', 'title': 'A'}]]:
+            self.assertRaises(ValueError, insert_items, records)
+            self.assertEqual(load_items(), [])
+        try:
+            insert_items(list(read_todotxt(['first\n'])) + [
+                {'id': 'c', 'parent': 'd', 'title': 'C', 'line': 7},
+                {'id': 'd', 'parent': 'e', 'title': 'D'},
+                {'id': 'e', 'parent': 'c', 'title': 'E'}])
+            self.fail('cycle is imported')
+        except ValueError, e:
+            self.assertEqual(str(e), 'line 7: parent d makes a cycle')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+
+import os
+import sys
+from StringIO import StringIO
+
+sys.path.insert(0, "..")
+
+from progressio import progressio
+from progressio.progressio import (
+    JournalProgressStore, ProgressStore, main, open_progress_store)
+
+
+class TestJournalProgressStore(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+        self.progress = JournalProgressStore('progress.journal')
+
+    def read_journal(self):
+        with open('progress.journal') as f:
+            return f.read().splitlines()
+
+    def test_changes_are_appended(self):
+        project = self.progress.add('project')
+        self.progress.add('task\twith tab', parent_pk=project.pk)
+        self.progress.done(2)
+        self.progress.move(2, 0)
+        self.progress.delete(1)
+        lines = [line.split('\t') for line in self.read_journal()]
+        self.assertEqual(lines[0], ['progressio journal 0'])
+        self.assertEqual([line[:3] for line in lines[1:]], [
+            ['add', '1', '0'], ['add', '2', '1'], ['done', '2', self.progress.get(2).done_at],
+            ['move', '2', '0'], ['delete', '1']])
+        self.progress.add('subtask', parent_pk=2)
+        self.progress.add('other task')
+        self.progress.delete(2)
+        self.assertEqual(self.progress.get(0).children, [4, 3])
+        self.assertEqual(lines[2][4], 'task\\twith tab')
+
+    def test_items_are_loaded(self):
+        self.progress.add('project')
+        self.progress.add('task', parent_pk=1)
+        self.progress.edit(2, 'renamed task')
+        self.progress.done(1, recursive=True)
+        other = JournalProgressStore('progress.journal')
+        self.assertEqual(other.get(1).children, [2])
+        self.assertEqual(other.get(2).title, 'renamed task')
+        self.assertEqual([item.pk for item in other.items(is_done=True)], [1, 2])
+        # changes of one store are read by the other one
+        other.add('other project')
+        self.assertEqual(self.progress.get(0).children, [1, 3])
+        self.assertEqual(self.progress.add('last').pk, 4)
+
+    def test_compaction(self):
+        for i in range(10):
+            self.progress.add('item {}'.format(i))
+            self.progress.edit(i + 1, 'edited item {}'.format(i))
+        self.progress.compact()
+        self.assertEqual(self.read_journal(), ['progressio journal 1'])
+        with open('progress.journal.snapshot') as f:
+            self.assertEqual(len(f.read().splitlines()), 11)
+        self.progress.add('last')
+        other = JournalProgressStore('progress.journal')
+        self.assertEqual([item.title for item in other.items()][-2:],
+                         ['edited item 9', 'last'])
+        # the journal is compacted again when it grows longer than items
+        compact_events = progressio.JOURNAL_COMPACT_EVENTS
+        progressio.JOURNAL_COMPACT_EVENTS = 5
+        try:
+            for i in range(12):
+                other.edit(1, 'edited {}'.format(i))
+        finally:
+            progressio.JOURNAL_COMPACT_EVENTS = compact_events
+        self.assertEqual(self.read_journal()[0], 'progressio journal 2')
+        self.assertEqual(self.progress.get(1).title, 'edited 11')
+        self.assertEqual(self.progress.count()['total'], 11)
+
+    def test_partial_line_is_ignored(self):
+        self.progress.add('project')
+        with open('progress.journal', 'a') as f:
+            f.write('add\t2\t0\t2000-01-01 00:00:00\tbeing writ')
+        other = JournalProgressStore('progress.journal')
+        self.assertEqual(other.count()['total'], 1)
+
+    def test_same_results_as_progress_store(self):
+        def use(progress):
+            progress.add('project')
+            progress.add('task', parent_pk=1)
+            progress.add('other task', parent_pk=1)
+            results = [progress.done('2-3'), progress.active(3), progress.move(3, 0)]
+            self.assertRaises(ValueError, progress.move, 1, 2)
+            self.assertRaises(ValueError, progress.edit, 5, 'title')
+            counts = progress.import_items([{'id': 'a', 'title': 'imported', 'is_done': 'x'},
+                                            {'parent': 'a', 'title': 'subitem'}], 3)
+            for records in [[{'title': 'dated', 'added_at': 'yesterday'}],
+                            [{'id': 'b', 'parent': 'c', 'title': 'b', 'line': 2},
+                             {'id': 'c', 'parent': 'b', 'title': 'c'}]]:
+                self.assertRaises(ValueError, progress.import_items, records)
+            stream = StringIO()
+            progress.export(stream, 'csv', root_pk=1)
+            progress.export(stream, 'todotxt', is_done=False)
+            done, total = progress.progress()
+            return results + [
+                [tuple(row)[:2] + tuple(row)[5:] for row in progress.items(reverse=True)],
+                [row.pk for row in progress.search('task')],
+                counts, stream.getvalue().splitlines()[1:], list(done[:6]), list(total[:6]),
+                progress.delete(1), progress.count()['total'], progress.get(0).children]
+
+        with ProgressStore('progress.db') as progress:
+            expected = use(progress)
+        self.assertEqual(use(self.progress), expected)
+
+    def test_commands(self):
+        def run(*args):
+            stdout, stderr = StringIO(), StringIO()
+            status = main(['--db', 'progress.journal'] + list(args), stdout, StringIO('y\n'),
+                          stderr)
+            return status, stdout.getvalue(), stderr.getvalue()
+
+        self.assertEqual(run('add', '-t', 'project')[1], 'Added item:\n1 - project\n')
+        run('add', '-t', 'task', '-p', '1')
+        run('add', '-t', 'other')
+        run('done', '3')
+        self.assertEqual(run('tree', '--progress')[1], '1 - project [0/1 0%]\n    2 - task\n')
+        self.assertEqual(run('count')[1].splitlines()[:2], ['done: 1', 'total items: 3'])
+        self.assertEqual(run('log', '-d')[1], 'print done: True\n3 - other\n')
+        self.assertEqual(run('delete', '-y', '1-5')[1], 'Deleted items 1-5 (3 found)\n')
+        self.assertEqual(run('fsck'), (
+            1, '', 'Error: fsck works only with SQLite databases, progress.journal is a journal\n'))
+        self.assertFalse(os.path.exists('progress.db'))
+        self.assertEqual(self.read_journal()[-1].split('\t'), ['delete', '3'])
+
+    def test_open_progress_store(self):
+        self.assertIsInstance(open_progress_store('progress.other.journal'),
+                              JournalProgressStore)
+        with open_progress_store('progress.other.db') as progress:
+            self.assertNotIsInstance(progress, JournalProgressStore)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,9 +10,10 @@ import time
 sys.path.insert(0, "..")
 
 from progressio.progressio import (
-    add, get_item,
-    load_items, done,
-    PROGRESS_DB_FILE_NAME, DATE_FORMAT)
+    add, get_item, get_store,
+    load_items, iter_items, done, active, delete, move, insert_items,
+    count_items, count_done_between, rebuild_counters,
+    PROGRESS_DB_FILE_NAME, DATE_FORMAT, Item)
 
 
 class TestLoading(unittest.TestCase):
@@ -26,6 +27,23 @@ class TestLoading(unittest.TestCase):
         add('test')
         self.assertTrue(get_item(9999999) is None)
 
+    def test_read_only_items(self):
+        """
+        Read-only items are tuples with the same fields as Item.
+        """
+        add('test1')
+        add('subitem of test1', parent_pk=1)
+        row = list(iter_items(read_only=True))[1]
+        item = get_item(2)
+        self.assertTrue(isinstance(row, tuple))
+        self.assertEqual(str(row), str(item))
+        self.assertEqual(row.parent_pk, item.parent_pk)
+        self.assertFalse(hasattr(item, '__dict__'))
+
+    def test_children_str_keeps_order(self):
+        item = Item(1, 'test', children=[5, 3, 5, 4])
+        self.assertEqual(item.children_str, '5,3,4')
+
     def test_subitem_tabulated(self):
         add('test1')
         add('test2')
@@ -33,6 +51,31 @@ class TestLoading(unittest.TestCase):
         out, err = Popen(["../progressio/progressio.py"], stdout=PIPE).communicate()
         self.assertTrue('1 - test1\n    3 - subitem of test1' in out)
 
+    def test_tree_depth_and_root(self):
+        add('test1')
+        add('subitem of test1', parent_pk=1)
+        add('subsubitem of test1', parent_pk=2)
+        add('test2')
+        out, err = Popen(
+            ["../progressio/progressio.py", "--depth", "2"], stdout=PIPE).communicate()
+        self.assertEqual(out, '1 - test1\n    2 - subitem of test1\n4 - test2\n')
+        out, err = Popen(
+            ["../progressio/progressio.py", "tree", "--root", "2"], stdout=PIPE).communicate()
+        self.assertEqual(out, '2 - subitem of test1\n    3 - subsubitem of test1\n')
+
+    def test_deep_tree(self):
+        """
+        Trees deeper than recursion limit are shown.
+        """
+        depth = sys.getrecursionlimit() + 100
+        insert_items(
+            {'id': n, 'parent': n - 1 if n else None, 'title': 'level {}'.format(n)}
+            for n in range(depth))
+        out, err = Popen(["../progressio/progressio.py"], stdout=PIPE).communicate()
+        lines = out.splitlines()
+        self.assertEqual(len(lines), depth)
+        self.assertEqual(lines[-1], '    ' * (depth - 1) + '{0} - level {1}'.format(depth, depth - 1))
+
     def test_count(self):
         add('test1')
         add('test2')
@@ -88,7 +131,63 @@ class TestLoading(unittest.TestCase):
             shell=True)
         print output
         self.assertTrue("done yesterday: 1" in output)
+
+    def test_count_done_in_range(self):
+        """
+        Items done in a range of days are counted.
+        """
+        add('done long ago')
+        add('done recently')
+        con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
+        con.execute(
+            "UPDATE item SET is_done='TRUE', done_at='2014-01-07 11:30:00' WHERE pk=1")
+        con.execute(
+            "UPDATE item SET is_done='TRUE', done_at='2014-02-01 00:00:00' WHERE pk=2")
+        con.commit()
+        con.close()
+        output = subprocess.check_output(
+            '../progressio/progressio.py count --since 2014-01-01 --until 2014-01-31',
+            stderr=subprocess.STDOUT,
+            shell=True)
+        self.assertTrue("done from 2014-01-01 to 2014-01-31: 1" in output)
         
+    def test_counters_follow_changes(self):
+        """
+        Counters kept by triggers are the same as counted again.
+        """
+        def counters():
+            store = get_store()
+            return (sorted(store.execute("SELECT name, value FROM counters")),
+                    sorted(store.execute("SELECT day, added, done FROM item_per_day " +
+                                         "WHERE added OR done")))
+        for title in ['first', 'second', 'third', 'fourth']:
+            add(title)
+        insert_items([{'title': 'imported', 'is_done': 'x', 'done_at': '2014-01-07'}])
+        done(['1-3'])
+        active(2)
+        move([3], 1)
+        delete(4, confirmed=True)
+        self.assertEqual(count_items()['total'], 4)
+        self.assertEqual(count_items()['done'], 3)
+        self.assertEqual(count_items()['done_today'], 2)
+        self.assertEqual(count_done_between(), 3)
+        kept = counters()
+        rebuild_counters()
+        self.assertEqual(counters(), kept)
+
+    def test_count_rebuild(self):
+        add('item')
+        con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
+        con.execute("UPDATE counters SET value=10")
+        con.commit()
+        con.close()
+        output = subprocess.check_output(
+            '../progressio/progressio.py count --rebuild',
+            stderr=subprocess.STDOUT,
+            shell=True)
+        self.assertTrue("total items: 1" in output)
+        self.assertTrue("done: 0" in output)
+
     def test_log(self):
         add('test1')
         add('test2')
@@ -107,6 +206,31 @@ class TestLoading(unittest.TestCase):
         out, err = Popen(["../progressio/progressio.py", "log", "-d"], stdout=PIPE).communicate()
         self.assertTrue(items[0].title in out)
 
+    def test_log_pages(self):
+        """
+        Log is shown in pages that start after a given item.
+        """
+        for n in range(5):
+            add('item {}'.format(n))
+        con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
+        con.execute("UPDATE item SET added_at='2014-01-01 00:00:00' WHERE pk IN (2, 4)")
+        con.commit()
+        con.close()
+
+        out, err = Popen(
+            ["../progressio/progressio.py", "log", "--order", "added_at", "--limit", "2"],
+            stdout=PIPE).communicate()
+        self.assertTrue('2 - item 1\n4 - item 3\nnext page: --after 4' in out)
+
+        out, err = Popen(
+            ["../progressio/progressio.py", "log", "--order", "added_at",
+             "--limit", "2", "--after", "4"],
+            stdout=PIPE).communicate()
+        self.assertTrue('1 - item 0\n3 - item 2\nnext page: --after 3' in out)
+
+        pks = [i.pk for i in iter_items(order='added_at', reverse=True, after=3)]
+        self.assertEqual(pks, [1, 4, 2])
+
 
 if __name__ == '__main__':
     unittest.main()
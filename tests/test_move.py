@@ -8,7 +8,7 @@ from subprocess import call, Popen, PIPE
 sys.path.insert(0, "..")
 
 from progressio.progressio import (
-    PROGRESS_DB_FILE_NAME, Item)
+    PROGRESS_DB_FILE_NAME, Item, get_item)
 
 
 class TestMove(unittest.TestCase):
@@ -57,6 +57,49 @@ class TestMove(unittest.TestCase):
         self.assertFalse(2 in item1.children)
         self.assertTrue(2 in item2.children)
 
+    def test_move_several_items(self):
+        """
+        Several items are moved at once and keep their order.
+        """
+        p = Popen('../progressio/progressio.py', stdin=PIPE)
+        p.communicate('y\n')
+
+        for title in ['parent', 'child', 'a', 'b', 'c']:
+            call(
+                '../progressio/progressio.py add -t "{}"'.format(title),
+                stdout=PIPE, shell=True)
+        call(
+            '../progressio/progressio.py add -p 1 -t "first child"',
+            stdout=PIPE, shell=True)
+
+        call(
+            '../progressio/progressio.py move 3-5 2 -p 1',
+            stdout=PIPE, shell=True)
+
+        self.assertEqual(get_item(1).children, [6, 2, 3, 4, 5])
+        self.assertEqual(get_item(0).children, [1])
+
+    def test_move_reports_moved_items(self):
+        """
+        Only items that exist and are not the new parent are reported as moved.
+        """
+        p = Popen('../progressio/progressio.py', stdin=PIPE)
+        p.communicate('y\n')
+        for title in ['parent', 'a', 'b']:
+            call(
+                '../progressio/progressio.py add -t "{}"'.format(title),
+                stdout=PIPE, shell=True)
+
+        p = Popen('../progressio/progressio.py move 2-9 -p 1', stdout=PIPE, shell=True)
+        self.assertEqual(p.communicate()[0], 'Items 2-9 moved to 1 (2 moved).\n')
+        for args in ['9 -p 1', '1 -p 1']:
+            p = Popen('../progressio/progressio.py move ' + args,
+                      stdout=PIPE, stderr=PIPE, shell=True)
+            output, errors = p.communicate()
+            self.assertEqual(p.returncode, 1)
+            self.assertEqual(output, '')
+            self.assertTrue(errors.endswith('not found or the same as the new parent\n'))
+
 
 if __name__ == '__main__':
     unittest.main()
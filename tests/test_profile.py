@@ -0,0 +1,61 @@
+import unittest
+
+import os
+import sys
+import pstats
+import subprocess
+
+sys.path.insert(0, "..")
+
+from progressio.progressio import add
+
+
+def run(command, **environment):
+    env = dict(os.environ, **environment)
+    p = subprocess.Popen(
+        command, shell=True, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return p.communicate()
+
+
+class TestProfile(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+        add('first')
+        add('second', parent_pk=1)
+
+    def test_profile_option(self):
+        """
+        Output is not changed, the report is written to stderr.
+        """
+        output, errors = run("../progressio/progressio.py --profile")
+        self.assertEqual(output, '1 - first\n    2 - second\n')
+        self.assertTrue(errors.startswith('profile: total '))
+        self.assertIn('FROM item', errors)
+
+    def test_profile_option_after_command(self):
+        output, errors = run("../progressio/progressio.py show 1 --profile")
+        self.assertEqual(output, '1 - first\n    2 - second\n')
+        self.assertIn('WITH RECURSIVE', errors)
+
+    def test_profile_environment_variable(self):
+        """
+        Value of the variable that is not 1 is a file for cProfile statistics.
+        """
+        output, errors = run("../progressio/progressio.py count", PROGRESSIO_PROFILE='progress.prof')
+        self.assertIn('total items: 2', output)
+        self.assertTrue(errors.startswith('profile: total '))
+        stats = pstats.Stats('progress.prof')
+        self.assertTrue(stats.total_calls > 0)
+
+    def test_no_profile(self):
+        output, errors = run("../progressio/progressio.py", PROGRESSIO_PROFILE='0')
+        self.assertEqual(errors, '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+import os
+import sys
+import subprocess
+
+sys.path.insert(0, "..")
+
+from progressio.progressio import (
+    add, done, delete, edit, search_items)
+
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+        add('fix login page')
+        add('write docs for login')
+        add('release version 0.4')
+
+    def search(self, query, **kwargs):
+        return [i.pk for i in search_items(query, **kwargs)]
+
+    def test_search(self):
+        self.assertEqual(sorted(self.search('login')), [1, 2])
+        self.assertEqual(self.search('login docs'), [2])
+        self.assertEqual(self.search('rel*'), [3])
+        self.assertEqual(self.search('0.4'), [3])
+
+    def test_search_done_and_open(self):
+        done(1)
+        self.assertEqual(self.search('login', is_done=True), [1])
+        self.assertEqual(self.search('login', is_done=False), [2])
+
+    def test_index_follows_edit_and_delete(self):
+        edit(3, 'publish version 0.4')
+        self.assertEqual(self.search('release'), [])
+        self.assertEqual(self.search('publish'), [3])
+        delete(3, confirmed=True)
+        self.assertEqual(self.search('publish'), [])
+
+    def test_search_cli(self):
+        done(1)
+        output = subprocess.check_output(
+            '../progressio/progressio.py search --order pk login',
+            stderr=subprocess.STDOUT,
+            shell=True)
+        self.assertEqual(output, '1 - fix login page [done]\n2 - write docs for login\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import unittest
+
+import os
+import sys
+import time
+import subprocess
+
+sys.path.insert(0, "..")
+
+from progressio import progressio
+from progressio.progressio import (
+    add, count_items, _forward, _serve_request, SOCKET_FILE_NAME)
+
+
+class TestServe(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files and start the server.
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+        add('first')
+        self.server = subprocess.Popen(
+            ['../progressio/progressio.py', 'serve'], stdout=subprocess.PIPE)
+        for _ in range(100):
+            if os.path.exists(SOCKET_FILE_NAME):
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        if self.server.returncode is None:
+            self.server.terminate()
+            self.server.wait()
+
+    def test_commands_are_run_by_server(self):
+        output = subprocess.check_output(
+            "../progressio/progressio.py add -t second",
+            stderr=subprocess.STDOUT,
+            shell=True)
+        self.assertEqual(output, 'Added item:\n2 - second\n')
+        output = subprocess.check_output(
+            "../progressio/progressio.py",
+            stderr=subprocess.STDOUT,
+            shell=True)
+        self.assertEqual(output, '1 - first\n2 - second\n')
+
+    def test_client_forwards_to_server(self):
+        """
+        Status is returned only if the command was run by the server.
+        """
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            self.assertEqual(_forward(['version']), 0)
+            self.assertEqual(_forward(['delete', '1']), None)
+        finally:
+            sys.stdout = stdout
+
+    def test_other_database_runs_locally(self):
+        """
+        --db of another database is not run by the server of progress.db.
+        """
+        output = subprocess.check_output(
+            "echo y | ../progressio/progressio.py --db progress.other.db add -t other",
+            shell=True)
+        self.assertTrue(output.endswith('Added item:\n1 - other\n'))
+        self.assertEqual(count_items()['total'], 1)
+        request = {'args': ['version'], 'db': os.path.realpath('progress.db')}
+        self.assertEqual(_serve_request(dict(request, cwd=os.getcwd()), {})['status'], 0)
+        self.assertEqual(_serve_request(dict(request, cwd='/'), {}), {'local': True})
+        self.assertEqual(_serve_request(['version'], {}), {'local': True})
+
+    def test_large_output_is_written_by_client(self):
+        """
+        export and log without --limit are not kept by the server.
+        """
+        add('second')
+        request = {'db': os.path.realpath('progress.db'), 'cwd': os.getcwd()}
+        for args in (['export'], ['export', '-f', 'todotxt'], ['log', '-d']):
+            self.assertEqual(_serve_request(dict(request, args=args), {}), {'local': True})
+        reply = _serve_request(dict(request, args=['log', '--limit', '1']), {})
+        self.assertEqual(reply['stdout'], 'print done: False\n1 - first\nnext page: --after 1\n')
+        output = subprocess.check_output(
+            "../progressio/progressio.py export -f todotxt", shell=True)
+        self.assertEqual(output.splitlines()[-1].split()[-1], 'second')
+        output = subprocess.check_output("../progressio/progressio.py log", shell=True)
+        self.assertEqual(output, 'print done: False\n1 - first\n2 - second\n')
+
+    def test_cache_is_limited_by_size(self):
+        request = {'db': os.path.realpath('progress.db'), 'cwd': os.getcwd()}
+        cache = {}
+        limits = progressio.SERVER_CACHE_SIZE, progressio.SERVER_CACHE_OUTPUT_SIZE
+        progressio.SERVER_CACHE_SIZE, progressio.SERVER_CACHE_OUTPUT_SIZE = 15, 10
+        try:
+            _serve_request(dict(request, args=['show', '1']), cache)
+            self.assertEqual(cache['size'], len('1 - first\n'))
+            _serve_request(dict(request, args=['search', 'first']), cache)
+            self.assertEqual(sorted(key for key in cache if isinstance(key, tuple)),
+                             [('search', 'first')])
+            # larger than one output
+            _serve_request(dict(request, args=['log', '--limit', '1']), cache)
+            self.assertNotIn(('log', '--limit', '1'), cache)
+        finally:
+            progressio.SERVER_CACHE_SIZE, progressio.SERVER_CACHE_OUTPUT_SIZE = limits
+
+    def test_cached_tree_is_updated_after_change(self):
+        """
+        Changes made without the server are seen by it.
+        """
+        output = subprocess.check_output("../progressio/progressio.py", shell=True)
+        self.assertEqual(output, '1 - first\n')
+        add('second')
+        output = subprocess.check_output("../progressio/progressio.py", shell=True)
+        self.assertEqual(output, '1 - first\n2 - second\n')
+
+    def test_all_databases_are_not_cached(self):
+        os.mkdir('progress.repos')
+        try:
+            subprocess.check_output(
+                "echo y | ../progressio/progressio.py --db progress.repos/progress.db add -t a",
+                shell=True)
+            output = subprocess.check_output(
+                "../progressio/progressio.py log --all progress.repos", shell=True)
+            self.assertEqual(output, 'print done: False\n.: 1 - a\n')
+            subprocess.check_output(
+                "../progressio/progressio.py --db progress.repos/progress.db add -t b",
+                shell=True)
+            output = subprocess.check_output(
+                "../progressio/progressio.py log --all progress.repos", shell=True)
+            self.assertEqual(output, 'print done: False\n.: 1 - a\n.: 2 - b\n')
+        finally:
+            import shutil
+            shutil.rmtree('progress.repos')
+
+    def test_exit_status_is_returned(self):
+        p = subprocess.Popen(
+            "../progressio/progressio.py show", shell=True,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, errors = p.communicate()
+        self.assertEqual(p.returncode, 1)
+        self.assertEqual(errors, 'Error: specify one item to show\n')
+
+    def test_socket_is_removed_on_stop(self):
+        self.server.terminate()
+        self.server.wait()
+        self.assertFalse(os.path.exists(SOCKET_FILE_NAME))
+        output = subprocess.check_output("../progressio/progressio.py", shell=True)
+        self.assertEqual(output, '1 - first\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import unittest
+
+import os
+import sys
+import sqlite3
+import subprocess
+
+sys.path.insert(0, "..")
+
+from progressio.progressio import (
+    add, done, active, get_item, count_items, load_items, edit,
+    get_revision, subtree_progress, move, PROGRESS_DB_FILE_NAME, _render_cache_key,
+    get_store)
+
+
+class TestShow(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        Adds tree:
+
+        1 - project
+            2 - task
+                3 - subtask
+            4 - another task
+        5 - other project
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+        add('project')
+        add('task', parent_pk=1)
+        add('subtask', parent_pk=2)
+        add('another task', parent_pk=1)
+        add('other project')
+
+    def test_show_branch(self):
+        output = subprocess.check_output(
+            "../progressio/progressio.py show 2",
+            stderr=subprocess.STDOUT,
+            shell=True)
+        self.assertEqual(output, '2 - task\n    3 - subtask\n')
+
+    def test_show_branch_of_done_item(self):
+        """
+        Subitems of a done item are shown without it.
+        """
+        done(1)
+        output = subprocess.check_output(
+            "../progressio/progressio.py show 1 --depth 1",
+            stderr=subprocess.STDOUT,
+            shell=True)
+        self.assertEqual(output, '2 - task\n4 - another task\n')
+
+    def test_count_branch(self):
+        done(3)
+        counts = count_items(root_pk=1)
+        self.assertEqual(counts['total'], 4)
+        self.assertEqual(counts['done'], 1)
+        self.assertEqual(counts['done_today'], 1)
+        self.assertEqual(count_items(root_pk=0)['total'], 5)
+
+    def test_done_and_active_recursive(self):
+        done(3)
+        done_at = get_item(3).done_at
+        output = subprocess.check_output(
+            "../progressio/progressio.py done -r 1",
+            stderr=subprocess.STDOUT,
+            shell=True)
+        self.assertTrue('Marking item 1 and subitems as done.' in output)
+        self.assertEqual([i.pk for i in load_items()], [5])
+        self.assertEqual(get_item(3).done_at, done_at)
+
+        active(2, recursive=True)
+        self.assertEqual([i.pk for i in load_items()], [2, 3, 5])
+
+    def test_tree_is_printed_from_cache(self):
+        """
+        Cache file is used while items do not change.
+        """
+        output = subprocess.check_output("../progressio/progressio.py show 2", shell=True)
+        self.assertEqual(output, '2 - task\n    3 - subtask\n')
+        self.assertTrue(os.path.exists('progress.db.tree.cache'))
+        with open('progress.db.tree.cache', 'wb') as f:
+            f.write(_render_cache_key(get_revision(), root_pk=2))
+            f.write('cached\n')
+        output = subprocess.check_output("../progressio/progressio.py show 2", shell=True)
+        self.assertEqual(output, 'cached\n')
+        # other views replace the file
+        output = subprocess.check_output("../progressio/progressio.py show 9", shell=True)
+        self.assertEqual(output, '')
+        output = subprocess.check_output("../progressio/progressio.py show 2", shell=True)
+        self.assertEqual(output, '2 - task\n    3 - subtask\n')
+        self.assertEqual([f for f in os.listdir('.') if f.endswith('.cache')],
+                         ['progress.db.tree.cache'])
+
+    def test_progress_of_items_without_parent(self):
+        """
+        Items with NULL parent are counted as children of root.
+        """
+        done(['3'])
+        con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
+        con.execute("UPDATE item SET parent_pk=NULL WHERE pk=2")
+        con.commit()
+        con.close()
+        done_counts, totals = subtree_progress()
+        self.assertEqual([(done_counts[pk], totals[pk]) for pk in range(6)],
+                         [(1, 5), (0, 1), (1, 1), (0, 0), (0, 0), (0, 0)])
+        output = subprocess.check_output(
+            "../progressio/progressio.py tree --progress", shell=True)
+        self.assertIn('2 - task [1/1 100%]\n', output)
+
+    def test_copy_of_database_is_not_shown_from_cache(self):
+        """
+        A copy changed as many times as the database shows its own items,
+        also when it replaces the database.
+        """
+        import shutil
+        get_store().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        shutil.copy(PROGRESS_DB_FILE_NAME, 'progress.copy.db')
+        for db in (PROGRESS_DB_FILE_NAME, 'progress.copy.db'):
+            subprocess.check_output(
+                "../progressio/progressio.py --db {0} add -t 'item of {0}'".format(db),
+                shell=True)
+        for db in (PROGRESS_DB_FILE_NAME, 'progress.copy.db'):
+            output = subprocess.check_output(
+                "../progressio/progressio.py --db {} --depth 1".format(db), shell=True)
+            self.assertEqual(output.splitlines()[-1], '6 - item of {}'.format(db))
+        os.rename('progress.copy.db', PROGRESS_DB_FILE_NAME)
+        output = subprocess.check_output("../progressio/progressio.py --depth 1", shell=True)
+        self.assertEqual(output.splitlines()[-1], '6 - item of progress.copy.db')
+
+    def test_cache_is_rebuilt_after_change(self):
+        output = subprocess.check_output("../progressio/progressio.py", shell=True)
+        self.assertEqual(output.splitlines()[0], '1 - project')
+        edit(1, 'renamed project')
+        output = subprocess.check_output("../progressio/progressio.py", shell=True)
+        self.assertEqual(output.splitlines()[0], '1 - renamed project')
+        # change made by another program
+        con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
+        con.execute("UPDATE item SET is_done='TRUE' WHERE pk=5")
+        con.commit()
+        con.close()
+        output = subprocess.check_output("../progressio/progressio.py --depth 1", shell=True)
+        self.assertEqual(output, '1 - renamed project\n')
+
+    def test_subtree_progress(self):
+        done(['3'])
+        done_counts, totals = subtree_progress()
+        self.assertEqual([(done_counts[pk], totals[pk]) for pk in range(6)],
+                         [(1, 5), (1, 3), (1, 1), (0, 0), (0, 0), (0, 0)])
+        # counts are kept until items change
+        self.assertIs(subtree_progress()[1], totals)
+        move(['2'], 5)
+        done_counts, totals = subtree_progress()
+        self.assertEqual([(done_counts[pk], totals[pk]) for pk in range(6)],
+                         [(1, 5), (0, 1), (1, 1), (0, 0), (0, 0), (1, 2)])
+
+    def test_tree_progress(self):
+        done(['3'])
+        output = subprocess.check_output("../progressio/progressio.py --progress", shell=True)
+        self.assertEqual(output, '1 - project [1/3 33%]\n'
+                                 '    2 - task [1/1 100%]\n'
+                                 '    4 - another task\n'
+                                 '5 - other project\n')
+        output = subprocess.check_output(
+            "../progressio/progressio.py show 1 --depth 1 --progress", shell=True)
+        self.assertEqual(output, '1 - project [1/3 33%]\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+import os
+import sys
+import subprocess
+import time
+
+sys.path.insert(0, "..")
+
+from progressio.progressio import add
+
+# runs main() with arguments and prints modules that were imported
+LOADED_MODULES_SCRIPT = """
+import sys
+sys.path.insert(0, '..')
+sys.argv = ['p'] + sys.argv[1:]
+from progressio import progressio
+stdout = sys.stdout
+sys.stdout = open('/dev/null', 'w')
+progressio.main()
+sys.stdout = stdout
+print ' '.join(sorted(sys.modules))
+"""
+
+
+# milliseconds `p` may take over the start of the interpreter,
+# see benchmarks/startup.py
+STARTUP_BUDGET = 15
+
+
+def start_time(args, runs=5):
+    """
+    :returns: the shortest time in ms of `runs` runs of `args`.
+    """
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(runs):
+            start = time.time()
+            subprocess.check_call([sys.executable] + args, stdout=devnull)
+            times.append((time.time() - start) * 1000)
+    return min(times)
+
+
+def loaded_modules(*args):
+    output = subprocess.check_output(
+        [sys.executable, '-c', LOADED_MODULES_SCRIPT] + list(args))
+    return output.split()
+
+
+class TestStartup(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+        add('item')
+
+    def test_help_and_version_do_not_load_sqlite(self):
+        for command in ['help', 'version', '-v']:
+            modules = loaded_modules(command)
+            self.assertNotIn('sqlite3', modules)
+            self.assertNotIn('datetime', modules)
+            self.assertNotIn('optparse', modules)
+
+    def test_help_does_not_create_db(self):
+        os.remove('progress.db')
+        output = subprocess.check_output("../progressio/progressio.py help", shell=True)
+        self.assertTrue(output.startswith('usage:'))
+        self.assertFalse(os.path.exists('progress.db'))
+
+    def test_start_time_is_within_budget(self):
+        """
+        `p` imports the module, so it is not compiled on every start.
+        """
+        import py_compile
+        py_compile.compile('../progressio/progressio.py')
+        interpreter = start_time(['-c', 'pass'])
+        for command in ['version', 'help']:
+            self.assertLess(start_time(['../progressio/p', command]) - interpreter,
+                            STARTUP_BUDGET)
+
+    def test_tree_loads_only_what_it_needs(self):
+        modules = loaded_modules()
+        self.assertIn('sqlite3', modules)
+        self.assertNotIn('json', modules)
+        self.assertNotIn('socket', modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
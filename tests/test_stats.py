@@ -0,0 +1,86 @@
+import unittest
+
+import os
+import sys
+import subprocess
+from datetime import date
+
+sys.path.insert(0, "..")
+
+from progressio.progressio import add, done, active, get_store, count_by_period
+
+
+def set_dates(pk, added_at, done_at=None):
+    store = get_store()
+    with store.transaction():
+        store.execute(
+            "UPDATE item SET added_at=?, done_at=? WHERE pk=?", (added_at, done_at, pk))
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        Adds items:
+
+        1 - added on Monday 2014-01-06, done on Wednesday 2014-01-08
+        2 - added on 2014-01-08, done on 2014-02-03
+        3 - added on 2014-01-12
+        4 - added on 2014-02-03, done and marked active again
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+        for title in ['first', 'second', 'third', 'fourth']:
+            add(title)
+        done([1, 2, 4])
+        active(4)
+        set_dates(1, '2014-01-06 10:00:00', '2014-01-08 12:00:00')
+        set_dates(2, '2014-01-08 11:00:00', '2014-02-03 09:00:00')
+        set_dates(3, '2014-01-12 23:59:59')
+        set_dates(4, '2014-02-03 08:00:00', '2014-02-03 10:00:00')
+
+    def test_by_day(self):
+        self.assertEqual(count_by_period(), [
+            ('2014-01-06', 1, 0),
+            ('2014-01-08', 1, 1),
+            ('2014-01-12', 1, 0),
+            ('2014-02-03', 1, 1),
+        ])
+
+    def test_by_week_and_month(self):
+        self.assertEqual(count_by_period(by='week'), [
+            ('2014-01-06', 3, 1),
+            ('2014-02-03', 1, 1),
+        ])
+        self.assertEqual(count_by_period(by='month'), [
+            ('2014-01-01', 3, 1),
+            ('2014-02-01', 1, 1),
+        ])
+
+    def test_range(self):
+        self.assertEqual(count_by_period(date(2014, 1, 8), date(2014, 1, 12)), [
+            ('2014-01-08', 1, 1),
+            ('2014-01-12', 1, 0),
+        ])
+
+    def test_csv(self):
+        output = subprocess.check_output(
+            "../progressio/progressio.py stats --by month --format csv",
+            stderr=subprocess.STDOUT,
+            shell=True)
+        self.assertEqual(output, 'month,added,done\r\n2014-01-01,3,1\r\n2014-02-01,1,1\r\n')
+
+    def test_table(self):
+        output = subprocess.check_output(
+            "../progressio/progressio.py stats --by week --since 2014-02-01",
+            stderr=subprocess.STDOUT,
+            shell=True)
+        self.assertEqual(output.splitlines(), [
+            'week           added    done',
+            '2014-02-03         1       1',
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
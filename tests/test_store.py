@@ -0,0 +1,61 @@
+import unittest
+
+import os
+import sys
+
+sys.path.insert(0, "..")
+
+from progressio.progressio import (
+    add, get_item, get_store, _create_db_if_needed)
+
+
+class TestStore(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+
+    def test_connection_is_reused(self):
+        """
+        Commands share one connection per process.
+        """
+        add('first')
+        store = get_store()
+        add('second')
+        self.assertTrue(get_store() is store)
+
+    def test_reconnect_when_file_is_replaced(self):
+        """
+        A removed db file is not used through an old connection.
+        """
+        add('item in old file')
+        store = get_store()
+        os.remove('progress.db')
+        _create_db_if_needed()
+        self.assertFalse(get_store() is store)
+        self.assertTrue(get_item(1) is None)
+
+    def test_transaction_is_rolled_back_on_error(self):
+        _create_db_if_needed()
+        store = get_store()
+        try:
+            with store.transaction():
+                store.execute("INSERT INTO item(title) values(?)", ('lost',))
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertTrue(get_item(1) is None)
+
+    def test_title_with_quotes(self):
+        """
+        Titles are passed as bound parameters.
+        """
+        add("it's \"quoted\"")
+        self.assertEqual(get_item(1).title, "it's \"quoted\"")
+
+
+if __name__ == '__main__':
+    unittest.main()
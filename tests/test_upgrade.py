@@ -0,0 +1,123 @@
+import unittest
+
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, "..")
+
+from progressio.progressio import (
+    get_item, load_items, count_items, get_store, _create_db_if_needed,
+    PROGRESS_DB_FILE_NAME, SCHEMA_VERSION)
+
+
+def create_old_db(rows):
+    """
+    Creates db in the format of version 0.3 with `rows`:
+    (pk, children, title, is_done).
+    """
+    con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
+    con.execute(
+        "CREATE TABLE item(" +
+        "pk INTEGER PRIMARY KEY, children, title, added_at, is_done DEFAULT FALSE, done_at)")
+    con.executemany(
+        "INSERT INTO item(pk, children, title, is_done) values(?, ?, ?, ?)", rows)
+    con.commit()
+    con.close()
+
+
+class TestUpgrade(unittest.TestCase):
+    def setUp(self):
+        """
+        Clean up old progress files.
+        """
+        filelist = [f for f in os.listdir(".") if f.startswith("progress.")]
+        for f in filelist:
+            os.remove(f)
+
+    def test_children_column_is_converted(self):
+        """
+        Children strings are converted to parents and positions.
+        """
+        create_old_db([
+            (0, '1,3', 'root', 1),
+            (1, '4,2', 'first', 'FALSE'),
+            (2, '', 'second', 'FALSE'),
+            (3, '', 'third', 'FALSE'),
+            (4, '', 'fourth', 'FALSE'),
+            (5, '', 'not listed anywhere', 'FALSE'),
+        ])
+        self.assertEqual(get_item(0).children, [1, 3, 5])
+        self.assertEqual(get_item(1).children, [4, 2])
+        self.assertEqual(get_item(2).parent_pk, 1)
+        self.assertEqual(len(load_items()), 5)
+
+    def test_item_with_two_parents_keeps_first(self):
+        create_old_db([
+            (0, '1,2', 'root', 1),
+            (1, '3', 'first', 'FALSE'),
+            (2, '3', 'second', 'FALSE'),
+            (3, '', 'child', 'FALSE'),
+        ])
+        self.assertEqual(get_item(3).parent_pk, 1)
+        self.assertEqual(get_item(2).children, [])
+
+    def test_old_dates_are_converted(self):
+        """
+        Dates in the format of version 0.3 are converted to sortable ones.
+        """
+        create_old_db([
+            (0, '1', 'root', 1),
+            (1, '', 'done', 'TRUE'),
+        ])
+        con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
+        con.execute(
+            "UPDATE item SET added_at='Mon Jan 06 10:00:00 2014 EET', " +
+            "done_at='Tue Jan 07 11:30:00 2014 EET' WHERE pk=1")
+        con.commit()
+        con.close()
+        item = get_item(1)
+        self.assertEqual(item.added_at, '2014-01-06 10:00:00')
+        self.assertEqual(item.done_at, '2014-01-07 11:30:00')
+        self.assertEqual(count_items()['done'], 1)
+
+    def test_old_db_reaches_current_version(self):
+        """
+        Version is recorded, new indexes and WAL are enabled after upgrade.
+        """
+        create_old_db([
+            (0, '1', 'root', 1),
+            (1, '', 'item', 'FALSE'),
+        ])
+        store = get_store()
+        version = store.execute("SELECT version FROM schema_version").fetchone()[0]
+        self.assertEqual(version, SCHEMA_VERSION)
+        indexes = [row[1] for row in store.execute("PRAGMA index_list(item)")]
+        self.assertIn('item_is_done', indexes)
+        self.assertIn('item_added_at', indexes)
+        self.assertEqual(store.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        self.assertEqual(get_item(1).title, 'item')
+
+    def test_unknown_layout_is_not_upgraded(self):
+        """
+        Only the layout of version 0.3 is recognized without schema_version.
+        """
+        con = sqlite3.connect(PROGRESS_DB_FILE_NAME)
+        con.execute("CREATE TABLE item(pk INTEGER PRIMARY KEY, parent_pk, title)")
+        con.commit()
+        con.close()
+        self.assertRaises(sqlite3.DatabaseError, get_store)
+
+    def test_new_db_has_current_version(self):
+        """
+        New database is created with the current schema.
+        """
+        _create_db_if_needed()
+        store = get_store()
+        version = store.execute("SELECT version FROM schema_version").fetchone()[0]
+        self.assertEqual(version, SCHEMA_VERSION)
+        self.assertEqual(store.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+
+
+if __name__ == '__main__':
+    unittest.main()